@@ -0,0 +1,87 @@
+"""
+Compare the latest benchmark run against an earlier one and fail on regressions.
+Usage:
+    python -m benchmarks.compare
+    python -m benchmarks.compare --baseline 1a2b3c4 --threshold 0.1
+
+Runs are only compared with runs of the same scale and size.  By default the
+baseline is the run before the latest one; --baseline picks the most recent
+run at that commit instead.  Exits with status 1 if any metric got slower by
+more than --threshold (and by more than --min-seconds, to ignore noise on
+tiny timings).
+"""
+import argparse
+import json
+import os
+import sys
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+
+
+def _same_dataset(a, b):
+    return (a["scale"], a["rows"], a["seed"]) == (b["scale"], b["rows"], b["seed"])
+
+
+def find_baseline(history, latest, commit=None):
+    earlier = [
+        r for r in history if r is not latest and _same_dataset(r, latest)
+    ]
+    if commit:
+        earlier = [r for r in earlier if (r["commit"] or "").startswith(commit)]
+    return earlier[-1] if earlier else None
+
+
+def compare(baseline, latest, threshold, min_seconds):
+    """[(metric, before, after, ratio, regressed)] for metrics in both runs."""
+    rows = []
+    for name, after in latest["metrics"].items():
+        before = baseline["metrics"].get(name)
+        if before is None:
+            continue
+        ratio = after / before if before else float("inf")
+        regressed = ratio > 1 + threshold and after - before > min_seconds
+        rows.append((name, before, after, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--baseline", default=None, help="Compare against this commit")
+    parser.add_argument(
+        "--threshold", type=float, default=0.15, help="Allowed slowdown, eg 0.15 for 15%%"
+    )
+    parser.add_argument("--min-seconds", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    with open(args.history, encoding="utf-8") as f:
+        history = json.load(f)
+
+    latest_by_dataset = {}
+    for run in history:
+        latest_by_dataset[(run["scale"], run["rows"], run["seed"])] = run
+
+    failed = False
+    for latest in latest_by_dataset.values():
+        baseline = find_baseline(history, latest, args.baseline)
+        label = f"{latest['scale']} ({latest['rows']} rows)"
+        if baseline is None:
+            print(f"{label}: no baseline run to compare with")
+            continue
+        print(
+            f"{label}: {baseline['commit']} ({baseline['time']}) -> {latest['commit']} ({latest['time']})"
+        )
+        for name, before, after, ratio, regressed in compare(
+            baseline, latest, args.threshold, args.min_seconds
+        ):
+            flag = "REGRESSION" if regressed else ""
+            print(f"  {before:>9.3f}s {after:>9.3f}s {ratio - 1:>+7.1%}  {name} {flag}")
+            failed = failed or regressed
+
+    if failed:
+        print(f"Some metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
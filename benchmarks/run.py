@@ -0,0 +1,257 @@
+"""
+Benchmark the loader, the report queries and the renderers on synthetic data.
+Usage:
+    python -m benchmarks.run --scales county,state
+    python -m benchmarks.run --scales county --rows 2e5 --repeat 5 --skip-load
+
+For each scale a synthetic EBD file is generated and loaded into the
+benchmark database (see benchmarks/settings.py) with the statements from
+ebird-create-db-and-load-ebd.sql.  Then every query method behind the report
+tables, `add_table`, `_render_table` and the LaTeX build are timed, taking the
+best of --repeat runs, and the results are appended to the history file.
+Use `python -m benchmarks.compare` to check the latest run for regressions.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from pylatex import Fragment  # noqa: E402
+
+from ebirdcore import sql_utils  # noqa: E402
+from ebirdcore.challenges import checklist_counts  # noqa: E402
+from ebirdcore.latex_utils import add_table  # noqa: E402
+from ebirdcore.management.commands.year_end_report_html import _render_table  # noqa: E402
+from ebirdcore.report_artifact import ReportArtifact  # noqa: E402
+from ebirdcore.synthetic import CUT_FIELDS, SCALES, SyntheticEBD  # noqa: E402
+from ebirdcore.utils import parse_region_code  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADER_SQL = os.path.join(BASE_DIR, "ebird-create-db-and-load-ebd.sql")
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+
+# The report region for each scale's synthetic data.
+SCALE_REGIONS = {"county": "US-DC-001", "state": "US-MD", "country": "US"}
+
+# Synthetic observers have no eBird profile to look their names up from.
+OBSERVER_NAME_FUNC = """
+CREATE or REPLACE FUNCTION get_observer_name(varchar) RETURNS varchar AS
+$$ select concat('Observer ', $1) $$
+    LANGUAGE SQL
+    IMMUTABLE
+    RETURNS NULL ON NULL INPUT
+"""
+
+
+def loader_statements():
+    """(create table, copy column list, post-load statements) from the loader script."""
+    with open(LOADER_SQL, encoding="utf-8") as f:
+        text = f.read()
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"--[^\n]*", "", text)
+    create = re.search(r'CREATE TABLE "ebird"\s*\(.*?\n\);', text, re.S).group(0)
+    columns = re.search(r"COPY \"ebird\" ' \|\|\s*'\((.*?)\) '", text, re.S).group(1)
+    post = text.split("END $$;", 1)[1]
+    statements = [s.strip() for s in post.split(";") if s.strip()]
+    return create, columns, statements
+
+
+def _cut(path):
+    """The loader's `cut -f`, in Python where `cut` isn't available."""
+    if shutil.which("cut"):
+        fields = ",".join(str(f) for f in CUT_FIELDS)
+        proc = subprocess.Popen(["cut", "-f", fields, path], stdout=subprocess.PIPE)
+        while block := proc.stdout.read(1 << 20):
+            yield block
+        proc.wait()
+        return
+    idx = [f - 1 for f in CUT_FIELDS]
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            yield ("\t".join(parts[i] for i in idx) + "\n").encode("utf-8")
+
+
+def load(path, metrics):
+    create, columns, statements = loader_statements()
+    with connection.cursor() as cursor:
+        cursor.execute('drop table if exists "ebird"')
+        cursor.execute(create)
+        t0 = time.perf_counter()
+        with cursor.copy(
+            f'COPY "ebird" ({columns}) FROM STDIN '
+            "WITH (FORMAT CSV, HEADER, QUOTE E'\\5', ENCODING 'UTF8', DELIMITER E'\\t')"
+        ) as copy:
+            for block in _cut(path):
+                copy.write(block)
+        metrics["load.copy"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for sql in statements:
+            cursor.execute(sql)
+        metrics["load.post"] = time.perf_counter() - t0
+        cursor.execute(OBSERVER_NAME_FUNC)
+
+
+def best_of(repeat, f):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ret = f()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ret
+
+
+def bench_queries(artifact, repeat, metrics):
+    def compute(key):
+        # Each table is timed with its own scans, not the memoized ones.
+        checklist_counts.cache_clear()
+        artifact.compute_table(key)
+
+    total = 0.0
+    for key in artifact.specs:
+        elapsed, _ = best_of(repeat, lambda: compute(key))
+        metrics[f"query.{key}"] = elapsed
+        total += elapsed
+    metrics["query.total"] = total
+
+
+def bench_renderers(artifact, repeat, metrics):
+    tables = [artifact.table(key) for key in artifact.specs]
+
+    def latex():
+        doc = Fragment()
+        for title, subtitle, description, column_desc, vals in tables:
+            add_table(doc, column_desc, vals)
+        return doc.dumps()
+
+    def html():
+        return [_render_table(t[3], t[4]) for t in tables]
+
+    metrics["render.add_table"], _ = best_of(repeat, latex)
+    metrics["render.html_table"], _ = best_of(repeat, html)
+
+
+def bench_latex(artifact, repeat, metrics, workdir):
+    if not (shutil.which("latexmk") or shutil.which("pdflatex")):
+        print("No LaTeX installed, skipping the PDF build")
+        return
+    artifact_path = os.path.join(workdir, "report.json")
+    artifact.save(artifact_path)
+
+    def build():
+        build_dir = tempfile.mkdtemp(dir=workdir)
+        call_command(
+            "year_end_report",
+            region=artifact.region_code,
+            year=artifact.year,
+            artifact=artifact_path,
+            offline=True,
+            output=os.path.join(workdir, "report"),
+            build_dir=build_dir,
+        )
+
+    metrics["latex.build"], _ = best_of(repeat, build)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_history(path, run):
+    history = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            history = json.load(f)
+    history.append(run)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=1)
+
+
+def run_scale(scale, rows, seed, repeat, skip_load, workdir):
+    generator = SyntheticEBD(rows=rows, scale=scale, seed=seed)
+    region_code = SCALE_REGIONS[scale]
+    year = generator.last_year
+    metrics = {}
+
+    if not skip_load:
+        path = os.path.join(workdir, f"ebd_{scale}.txt")
+        t0 = time.perf_counter()
+        generator.write(path)
+        metrics["generate"] = time.perf_counter() - t0
+        load(path, metrics)
+        os.remove(path)
+
+    artifact = ReportArtifact(parse_region_code(region_code), year)
+    bench_queries(artifact, repeat, metrics)
+    bench_renderers(artifact, repeat, metrics)
+    bench_latex(artifact, repeat, metrics, workdir)
+
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "database": settings.DATABASES["default"]["NAME"],
+        "scale": scale,
+        "rows": generator.rows,
+        "seed": seed,
+        "region": region_code,
+        "year": year,
+        "metrics": metrics,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scales", default="county", help=f"Comma-separated ({', '.join(SCALES)})")
+    parser.add_argument("--rows", type=float, default=None, help="Rows per scale (default depends on scale)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Time each step this many times, keep the best")
+    parser.add_argument("--skip-load", action="store_true", help="Reuse the data already loaded")
+    parser.add_argument("--history", default=HISTORY)
+    args = parser.parse_args(argv)
+
+    if settings.DATABASES["default"]["NAME"] == "ebirddb":
+        sys.exit("Refusing to benchmark against the main ebirddb database")
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    for scale in scales:
+        if scale not in SCALES:
+            sys.exit(f"Unknown scale {scale}")
+
+    # Every repeat has to reach the database.
+    sql_utils.use_query_cache = False
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            run = run_scale(scale, args.rows, args.seed, args.repeat, args.skip_load, workdir)
+            append_history(args.history, run)
+            print(f"{scale} ({run['rows']} rows):")
+            for name, seconds in run["metrics"].items():
+                print(f"  {seconds:>9.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
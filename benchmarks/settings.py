@@ -0,0 +1,20 @@
+"""
+Settings for the benchmark suite: the project settings, pointed at a scratch
+database that the benchmarks are free to drop and reload.
+
+The database must exist and have PostGIS available, eg
+    createdb -U postgres ebirddb_bench
+"""
+import os
+
+from ebirddb.settings import *  # noqa: F401,F403
+from ebirddb.settings import DATABASES
+
+DATABASES = {
+    "default": {
+        **DATABASES["default"],
+        "NAME": os.environ.get("EBIRD_BENCH_DB", "ebirddb_bench"),
+        "HOST": os.environ.get("EBIRD_BENCH_HOST", DATABASES["default"]["HOST"]),
+        "PORT": os.environ.get("EBIRD_BENCH_PORT", DATABASES["default"]["PORT"]),
+    }
+}
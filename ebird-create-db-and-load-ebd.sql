@@ -114,6 +114,62 @@ create index ebird_locality_doy_idx ON "ebird" (locality_id asc, observation_doy
 create index ebird_common_name_idx ON "ebird" (common_name asc);
 create index ebird_breeding_category_idx ON "ebird" (breeding_category) WHERE breeding_category is not NULL;
 create index ebird_observer_idx ON "ebird" (observer_id asc);
+-- For the rows edited since a year-to-date refresh (ebirdcore/ytd.py).
+create index ebird_last_edited_idx ON "ebird" (last_edited_date);
 CREATE INDEX ON "ebird" (sampling_event_identifier);
 
+-- One row per checklist (each observer of a shared checklist has their own), with its number of countable
+-- species, for the single-list records.  Rebuilt by ebird-load-ebd.sql after adding data.
+DROP TABLE IF EXISTS "ebird_checklist";
+CREATE TABLE "ebird_checklist" AS
+select SAMPLING_EVENT_IDENTIFIER,
+       OBSERVER_ID,
+       min(COUNTRY_CODE)                                  as COUNTRY_CODE,
+       min(STATE_CODE)                                    as STATE_CODE,
+       min(COUNTY_CODE)                                   as COUNTY_CODE,
+       min(OBSERVATION_DATE)                              as OBSERVATION_DATE,
+       min(LOCALITY)                                      as LOCALITY,
+       min(PROTOCOL_CODE)                                 as PROTOCOL_CODE,
+       min(DURATION_MINUTES)                              as DURATION_MINUTES,
+       min(EFFORT_DISTANCE_KM)                            as EFFORT_DISTANCE_KM,
+       count(distinct COMMON_NAME) filter (
+           where (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+             and not (approved = 'f' and reviewed = 't')
+             and (exotic_code is null or exotic_code in ('N'))
+           )                                              as SPECIES_COUNT
+from "ebird"
+group by SAMPLING_EVENT_IDENTIFIER, OBSERVER_ID;
+
+create index ebird_checklist_species_idx ON "ebird_checklist" (species_count desc);
+create index ebird_checklist_state_species_idx ON "ebird_checklist" (state_code, species_count desc);
+create index ebird_checklist_county_species_idx ON "ebird_checklist" (county_code, species_count desc);
+ANALYZE "ebird_checklist";
+
+-- One row per country, state and county, for looking up and listing regions without scanning "ebird".
+DROP TABLE IF EXISTS "ebird_region";
+CREATE TABLE "ebird_region" AS
+select case when grouping(STATE_CODE) = 1 then COUNTRY_CODE
+            when grouping(COUNTY_CODE) = 1 then STATE_CODE
+            else COUNTY_CODE end                          as REGION_CODE,
+       case when grouping(STATE_CODE) = 1 then 'country'
+            when grouping(COUNTY_CODE) = 1 then 'state'
+            else 'county' end                             as REGION_TYPE,
+       case when grouping(STATE_CODE) = 1 then null
+            when grouping(COUNTY_CODE) = 1 then COUNTRY_CODE
+            else STATE_CODE end                           as PARENT_CODE,
+       min(COUNTRY)                                       as COUNTRY,
+       case when grouping(STATE_CODE) = 0 then min(STATE) end   as STATE,
+       case when grouping(COUNTY_CODE) = 0 then min(COUNTY) end as COUNTY,
+       count(*)                                           as N_ROWS,
+       count(distinct OBSERVER_ID)                        as N_OBSERVERS,
+       min(OBSERVATION_DATE)                              as FIRST_DATE,
+       max(OBSERVATION_DATE)                              as LAST_DATE
+from "ebird"
+group by grouping sets ((COUNTRY_CODE), (COUNTRY_CODE, STATE_CODE), (COUNTRY_CODE, STATE_CODE, COUNTY_CODE));
+
+DELETE FROM "ebird_region" WHERE REGION_CODE is null or REGION_CODE = '';
+create unique index ebird_region_code_idx ON "ebird_region" (region_code);
+create index ebird_region_parent_idx ON "ebird_region" (parent_code, region_code);
+ANALYZE "ebird_region";
+
 VACUUM ANALYZE "ebird";
@@ -0,0 +1,172 @@
+"""
+Bulk fetch of query results into NumPy arrays via binary COPY.
+
+    data = fetch_arrays(
+        "select latitude, longitude, observation_date, observation_count from ebird "
+        "where county_code = 'US-DC-001'"
+    )
+    data["latitude"], data["observation_date"]  # float64 and int32 arrays
+
+`fetch_arrays` runs `COPY (query) TO STDOUT (FORMAT BINARY)` and decodes the
+stream with a structured big-endian dtype in one `np.frombuffer` per block of
+data, so no Python object is created per row.  Every row of a COPY BINARY
+stream of fixed-width columns has the same layout, which is what makes that
+possible; text columns aren't supported (encode them as integers in the query,
+or use `sql_utils.iter_query`).
+
+Values are returned in native byte order:
+
+- dates are int32 days since 2000-01-01 (`PG_EPOCH`; see `to_datetime64`),
+- timestamps are int64 microseconds since 2000-01-01,
+- times are int32 seconds since midnight,
+- numeric is cast to float8 by the query.
+
+NULLs are replaced server-side by the type's minimum for integers (-1 for
+times), NaN for floats, `NULL_DATE` for dates and false for booleans.
+"""
+import logging
+
+import numpy as np
+from django.db import connection
+
+from .explain import capture_plan
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+PG_EPOCH = np.datetime64("2000-01-01", "D")
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# Postgres type oid: (type, big-endian dtype, NULL replacement).
+FIXED_WIDTH_TYPES = {
+    16: ("bool", ">?", "false"),
+    20: ("int8", ">i8", str(np.iinfo(np.int64).min)),
+    21: ("int2", ">i2", str(np.iinfo(np.int16).min)),
+    23: ("int4", ">i4", str(np.iinfo(np.int32).min)),
+    700: ("float4", ">f4", "'NaN'"),
+    701: ("float8", ">f8", "'NaN'"),
+    1082: ("date", ">i4", "'-infinity'"),
+    1114: ("timestamp", ">i8", "'-infinity'"),
+    1184: ("timestamptz", ">i8", "'-infinity'"),
+}
+NUMERIC_OID = 1700
+TIME_OID = 1083
+
+# '-infinity'::date in COPY BINARY.
+NULL_DATE = np.iinfo(np.int32).min
+
+# Decode this many bytes of COPY data at a time.
+BLOCK_BYTES = 64 << 20
+
+
+def to_datetime64(days):
+    """int32 days since 2000-01-01 as datetime64[D] (NaT for NULL_DATE)."""
+    days = np.asarray(days)
+    out = PG_EPOCH + days.astype("timedelta64[D]")
+    out[days == NULL_DATE] = np.datetime64("NaT")
+    return out
+
+
+def _columns(sql):
+    """[(name, type oid)] of the query's result."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"select * from ({sql}) q limit 0")
+        return [(d.name, d.type_code) for d in cursor.description]
+
+
+def _copy_query(sql, columns):
+    """Wrap `sql` so every column is fixed width and never NULL; return the
+    query and its columns' resulting types."""
+    exprs = []
+    copy_columns = []
+    for i, (name, oid) in enumerate(columns):
+        col = f'q."{name}"'
+        if oid == NUMERIC_OID:
+            col, oid = f"{col}::float8", 701
+        elif oid == TIME_OID:
+            col, oid = f"coalesce(extract(epoch from {col})::int4, -1)", 23
+        if oid not in FIXED_WIDTH_TYPES:
+            raise ValueError(
+                f"Column {name} (type oid {oid}) isn't fixed width; cast or encode it in the query"
+            )
+        pg_type, _, null = FIXED_WIDTH_TYPES[oid]
+        # The cast keeps eg -2147483648 (a bigint literal) from widening the column.
+        col = f"coalesce({col}, {null})::{pg_type}"
+        exprs.append(f'{col} as "c{i}"')
+        copy_columns.append((name, oid))
+    return f"select {', '.join(exprs)} from ({sql}) q", copy_columns
+
+
+def row_dtype(columns):
+    """The big-endian layout of one COPY BINARY row: a field count, then a
+    length and a value per column."""
+    fields = [("_n", ">i2")]
+    for i, (name, oid) in enumerate(columns):
+        fields.append((f"_len{i}", ">i4"))
+        fields.append((name, FIXED_WIDTH_TYPES[oid][1]))
+    return np.dtype(fields)
+
+
+def _decode(buf, dtype, out_dtype, ncols):
+    """Decode the whole rows at the start of `buf`; return (array, bytes used)."""
+    n = len(buf) // dtype.itemsize
+    rows = np.frombuffer(buf, dtype=dtype, count=n)
+    if n and not (rows["_n"] == ncols).all():
+        raise RuntimeError("Unexpected COPY row layout (a NULL or variable-width value?)")
+    out = np.empty(n, dtype=out_dtype)
+    for name in out_dtype.names:
+        out[name] = rows[name]
+    return out, n * dtype.itemsize
+
+
+def fetch_arrays(sql):
+    """Run `sql` and return its result as a NumPy structured array, one field
+    per column, decoded straight from a binary COPY stream."""
+    copy_sql, columns = _copy_query(sql, _columns(sql))
+    dtype = row_dtype(columns)
+    out_dtype = np.dtype(
+        [(name, dtype[name].newbyteorder("=")) for name, _ in columns]
+    )
+    ncols = len(columns)
+
+    with span("copy", cat="query", sql=sql) as args:
+        capture_plan(sql, args.get("parent"))
+        result = _fetch(copy_sql, dtype, out_dtype, ncols)
+        args["rows"] = len(result)
+        args["bytes"] = result.nbytes
+    return result
+
+
+def _fetch(copy_sql, dtype, out_dtype, ncols):
+    parts = []
+    buf = bytearray()
+    header_done = False
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY ({copy_sql}) TO STDOUT (FORMAT BINARY)") as copy:
+            for block in copy:
+                buf += block
+                if not header_done:
+                    if len(buf) < 19:
+                        continue
+                    if bytes(buf[:11]) != PGCOPY_SIGNATURE:
+                        raise RuntimeError("Not a COPY BINARY stream")
+                    ext_len = int.from_bytes(buf[15:19], "big")
+                    if len(buf) < 19 + ext_len:
+                        continue
+                    del buf[: 19 + ext_len]
+                    header_done = True
+                if len(buf) >= BLOCK_BYTES:
+                    arr, used = _decode(buf, dtype, out_dtype, ncols)
+                    parts.append(arr)
+                    del buf[:used]
+
+    # What's left is whole rows followed by the -1 trailer.
+    if buf[-2:] != b"\xff\xff":
+        raise RuntimeError("Truncated COPY BINARY stream")
+    del buf[-2:]
+    arr, used = _decode(buf, dtype, out_dtype, ncols)
+    if used != len(buf):
+        raise RuntimeError("Unexpected COPY row layout (a NULL or variable-width value?)")
+    parts.append(arr)
+
+    return np.concatenate(parts) if len(parts) > 1 else parts[0]
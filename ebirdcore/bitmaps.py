@@ -0,0 +1,696 @@
+"""
+Species bitmaps: life, year and month list leaderboards computed in process.
+
+Many report tables are set operations over (observer, species, period):
+year lists, month life lists, everyone's year and month lists, month ticks
+and month closeouts.  Rather than one nested `group by` per table,
+`species_bitmaps()` extracts the distinct (observer, species, year, month)
+tuples of a region once, with the date each was first seen, and the tables
+are then computed with NumPy:
+
+- a species set is a row of uint64 words, one bit per species id,
+- unions are `np.bitwise_or.reduceat` over the bits sorted by (group, word),
+- counts are popcounts through a uint8 lookup table,
+- a 12-bit month mask per (observer, species) gives month ticks.
+
+Standings as of an earlier date (the "Chg" columns, or any other date) come
+from a `FirstSeenLog`: the date each observer first reached each entry of a
+list, sorted by (observer, date), so counts as of any date are one binary
+search per observer instead of a recount.
+
+Big days work the same way from `DayLists`, the species count of every
+(observer, date) and of every date for everyone.
+
+The extractions are cached like `execute_query` results.  Observer names and
+their sort order come from `get_observer_name` in the database, so ties are
+broken exactly as the SQL versions did.
+
+Inside `with sweep(region_where_clause, last_year):` a year-end `as_of` (eg
+for a backfill of one report per year) is answered by cutting a single
+extraction up to `last_year` off at that year, instead of extracting again.
+Inside `with pin(...)`, extractions maintained elsewhere (`ebirdcore.ytd`)
+are used as they are.
+"""
+import contextlib
+import logging
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.db import connection
+
+from . import sql_utils
+from .binary_copy import PG_EPOCH, fetch_arrays
+from .explain import capture_plan
+from .instrumentation import span
+from .sql_utils import FakeColumn, query_cache
+
+logger = logging.getLogger(__name__)
+
+POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+SOURCE_TABLE = "_species_bitmap_src"
+DAYS_TABLE = "_day_lists_src"
+
+
+def popcount(bitmaps):
+    """Number of set bits in each row of a 2-d uint64 array."""
+    bitmaps = np.ascontiguousarray(bitmaps)
+    return POPCOUNT8[bitmaps.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def fmt_change(n):
+    """A "Chg" cell, as the SQL leaderboards format it."""
+    if n > 0:
+        return f"+{n}"
+    if n == 0:
+        return "-"
+    return str(n)
+
+
+# Below any date the logs hold.
+NULL_DAYS = -(1 << 31)
+
+
+def _date_days(d):
+    """A "yyyy-mm-dd" string as days since 2000-01-01, like `fetch_arrays` dates."""
+    return (np.datetime64(d, "D") - PG_EPOCH).astype(int)
+
+
+def _to_date(days):
+    return (PG_EPOCH + np.timedelta64(int(days), "D")).item()
+
+
+def _year_end_days(year):
+    return _date_days(f"{year}-12-31")
+
+
+class FirstSeenLog:
+    """The date each observer first reached each entry of a list (a species,
+    or a species closed out in all 12 months), sorted by (observer, date).
+
+    `counts(as_of)` is every observer's list size on a date; `history(dates)`
+    stacks those for several dates, eg for rank charts.
+    """
+
+    # Dates are packed below the observer id in one sort key.
+    DATE_BITS = 32
+
+    def __init__(self, obs, dates, n_obs):
+        self.n_obs = n_obs
+        self.keys = np.sort(self._key(obs, dates))
+        self.starts = np.searchsorted(self.keys, self._key(np.arange(n_obs), NULL_DAYS))
+
+    def _key(self, obs, days):
+        return (np.asarray(obs, dtype=np.int64) << self.DATE_BITS) + (
+            np.asarray(days, dtype=np.int64) - NULL_DAYS
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def counts(self, as_of=None):
+        """List size per observer id, counting entries reached by `as_of`
+        (a "yyyy-mm-dd" string; all of them if None)."""
+        if as_of is None:
+            return np.diff(np.append(self.starts, len(self.keys)))
+        ends = np.searchsorted(
+            self.keys, self._key(np.arange(self.n_obs), _date_days(as_of)), side="right"
+        )
+        return ends - self.starts
+
+    def history(self, dates):
+        """List sizes per (date, observer id)."""
+        return np.stack([self.counts(d) for d in dates])
+
+
+class SpeciesBitmaps:
+    """The distinct (observer, species, year, month) tuples of a region.
+
+    `obs`, `sp`, `year`, `month` and `first_seen` (days since 2000-01-01) are
+    parallel arrays, one entry per tuple; `observers`, `observer_names` and
+    `species` map ids back to names, and `name_rank` orders observer ids by
+    name as the database sorts them.
+    """
+
+    def __init__(self, observers, observer_names, name_rank, species, rows):
+        self.observers = observers
+        self.observer_names = observer_names
+        self.name_rank = np.asarray(name_rank, dtype=np.int64)
+        self.species = species
+        self.obs = rows["obs"].astype(np.int64)
+        self.sp = rows["sp"].astype(np.int64)
+        self.year = rows["year"].astype(np.int64)
+        self.month = rows["month"].astype(np.int64)
+        self.first_seen = rows["first_seen"].astype(np.int64)
+        self.n_words = (len(species) + 63) // 64
+
+    def until(self, year):
+        """The same tuples, up to the end of `year`."""
+        keep = self.year <= year
+        rows = {
+            "obs": self.obs[keep],
+            "sp": self.sp[keep],
+            "year": self.year[keep],
+            "month": self.month[keep],
+            "first_seen": self.first_seen[keep],
+        }
+        return SpeciesBitmaps(
+            self.observers, self.observer_names, self.name_rank, self.species, rows
+        )
+
+    def periods(self, by_month):
+        """(period per tuple, labels by period, column name): years, or
+        months as "yyyy-mm"."""
+        if by_month:
+            return (
+                self.year * 12 + (self.month - 1),
+                lambda p: f"{p // 12:04d}-{p % 12 + 1:02d}",
+                "Month",
+            )
+        return self.year, int, "Year"
+
+    # Building blocks
+
+    def select(self, year=None, month=None, since_year=None):
+        """Boolean mask of the tuples matching the filters."""
+        mask = np.ones(len(self.obs), dtype=bool)
+        if year is not None:
+            mask &= self.year == year
+        if since_year is not None:
+            mask &= self.year >= since_year
+        if month is not None:
+            mask &= self.month == month
+        return mask
+
+    def bitmaps(self, keys, mask):
+        """(unique keys, species bitmap per key) over the masked tuples.
+
+        Only the result is allocated full width: the tuples' bits are OR-ed
+        per (key, word) cell, so scratch memory is a few words per tuple.
+        """
+        keys, sp = keys[mask], self.sp[mask]
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        words = np.zeros((len(uniq), self.n_words), dtype=np.uint64)
+        if not len(keys):
+            return uniq, words
+        cell = inverse * self.n_words + (sp >> 6)
+        order = np.argsort(cell, kind="stable")
+        cell = cell[order]
+        bits = np.left_shift(np.uint64(1), (sp[order] & 63).astype(np.uint64))
+        start = np.flatnonzero(np.concatenate([[True], cell[1:] != cell[:-1]]))
+        words.reshape(-1)[cell[start]] = np.bitwise_or.reduceat(bits, start)
+        return uniq, words
+
+    def counts(self, keys, mask, size):
+        """Distinct species per key, as a dense array of `size`."""
+        uniq, bm = self.bitmaps(keys, mask)
+        out = np.zeros(size, dtype=np.int64)
+        out[uniq] = popcount(bm)
+        return out
+
+    def month_masks(self, mask):
+        """(observer, species, 12-bit mask of months seen) over the masked tuples."""
+        n_sp = len(self.species)
+        pair = self.obs[mask] * n_sp + self.sp[mask]
+        bits = np.left_shift(1, self.month[mask] - 1)
+        uniq, inverse = np.unique(pair, return_inverse=True)
+        months = np.zeros(len(uniq), dtype=np.int64)
+        np.bitwise_or.at(months, inverse, bits)
+        return uniq // n_sp, uniq % n_sp, months
+
+    def first_seen_log(self, mask):
+        """A `FirstSeenLog` of when each observer first saw each species,
+        over the masked tuples."""
+        n_sp = len(self.species)
+        pair = self.obs[mask] * n_sp + self.sp[mask]
+        uniq, inverse = np.unique(pair, return_inverse=True)
+        first = np.full(len(uniq), np.iinfo(np.int64).max)
+        np.minimum.at(first, inverse, self.first_seen[mask])
+        return FirstSeenLog(uniq // n_sp, first, len(self.observers))
+
+    def closed_out(self, by_year=False):
+        """(observer, year, species) of every species an observer has seen in
+        all 12 months: over all years (year is None), or within one year."""
+        n_sp = len(self.species)
+        y0 = int(self.year.min()) if len(self.year) else 0
+        year = self.year - y0 if by_year else np.zeros_like(self.year)
+        n_years = int(year.max()) + 1 if len(year) else 1
+        key = (self.obs * n_years + year) * n_sp + self.sp
+        uniq, inverse = np.unique(key, return_inverse=True)
+        months = np.zeros(len(uniq), dtype=np.int64)
+        np.bitwise_or.at(months, inverse, np.left_shift(1, self.month - 1))
+        done = uniq[months == 0xFFF]
+        obs_year = done // n_sp
+        return (
+            obs_year // n_years,
+            obs_year % n_years + y0 if by_year else None,
+            done % n_sp,
+        )
+
+    def closeout_log(self, mask):
+        """A `FirstSeenLog` of when each observer closed out each species,
+        ie first saw it in the last of the 12 months, over the masked tuples."""
+        n_sp = len(self.species)
+        key = (self.obs[mask] * n_sp + self.sp[mask]) * 12 + self.month[mask] - 1
+        uniq, inverse = np.unique(key, return_inverse=True)
+        first = np.full(len(uniq), np.iinfo(np.int64).max)
+        np.minimum.at(first, inverse, self.first_seen[mask])
+        pair, inverse, n_months = np.unique(
+            uniq // 12, return_inverse=True, return_counts=True
+        )
+        closed = np.zeros(len(pair), dtype=np.int64)
+        np.maximum.at(closed, inverse, first)
+        done = n_months == 12
+        return FirstSeenLog(pair[done] // n_sp, closed[done], len(self.observers))
+
+    def leaderboard(self, values, limit, sort="desc", extra=()):
+        """Rows of (observer name, value, *extra) for observers with a value,
+        ordered by value then name, like `order by 2 desc, 1 asc`."""
+        who = np.nonzero(values)[0]
+        v = values[who]
+        order = np.lexsort((self.name_rank[who], v if sort == "asc" else -v))[:limit]
+        return [
+            (self.observer_names[who[i]], int(v[i]), *(e[who[i]] for e in extra))
+            for i in order
+        ]
+
+    def standings(self, log, limit, as_of=None, prev_as_of=None, sort="desc"):
+        """`leaderboard` rows from a `FirstSeenLog` as of a date, with the
+        change since `prev_as_of` if given."""
+        totals = log.counts(as_of)
+        extra = ()
+        if prev_as_of is not None:
+            extra = ([fmt_change(n) for n in totals - log.counts(prev_as_of)],)
+        return self.leaderboard(totals, limit, sort, extra)
+
+    # Report tables
+
+    def top_year_lists(
+        self,
+        limit=10,
+        year=None,
+        month=None,
+        last_x_years=None,
+        sort="desc",
+        as_of=None,
+        prev_as_of=None,
+        species_label="Species",
+        started_on_or_after_year=None,
+    ):
+        """Species per observer, optionally as of an earlier date than the
+        extraction's and with the change since `prev_as_of`.
+
+        With `started_on_or_after_year`, only observers whose first list entry
+        in the region is from that year or later count (the "Rookies").
+        """
+        since_year = None
+        if year is not None and last_x_years:
+            since_year, year = year - last_x_years + 1, None
+        elif year is not None:
+            month = None
+        mask = self.select(year=year, month=month, since_year=since_year)
+        if started_on_or_after_year is not None:
+            first_year = np.full(len(self.observers), np.iinfo(np.int64).max)
+            np.minimum.at(first_year, self.obs, self.year)
+            mask &= first_year[self.obs] >= started_on_or_after_year
+        cols = [FakeColumn("Observer", None), FakeColumn(species_label, None)]
+        if as_of is None and prev_as_of is None:
+            totals = self.counts(self.obs, mask, len(self.observers))
+            return cols, self.leaderboard(totals, limit, sort)
+        if prev_as_of is not None:
+            cols.append(FakeColumn("Chg", None))
+        log = self.first_seen_log(mask)
+        return cols, self.standings(log, limit, as_of, prev_as_of, sort)
+
+    def everyone_lists(self, by_month, limit=10):
+        """Birders and species per year (or per "yyyy-mm"), most species first."""
+        period, label, name = self.periods(by_month)
+        mask = np.ones(len(self.obs), dtype=bool)
+        periods, bm = self.bitmaps(period, mask)
+        species = popcount(bm)
+        pairs = np.unique(period * len(self.observers) + self.obs)
+        _, birders = np.unique(pairs // len(self.observers), return_counts=True)
+        order = np.lexsort((periods, -species))[:limit]
+        cols = [
+            FakeColumn(name, None),
+            FakeColumn("Birders", None),
+            FakeColumn("Species", None),
+        ]
+        return cols, [
+            (label(periods[i]), int(birders[i]), int(species[i])) for i in order
+        ]
+
+    def top_period_lists(self, by_month, limit=10):
+        """Each observer's biggest years (or months), most species first."""
+        period, label, name = self.periods(by_month)
+        n_periods = int(period.max()) + 1 if len(period) else 1
+        mask = np.ones(len(self.obs), dtype=bool)
+        keys, bm = self.bitmaps(self.obs * n_periods + period, mask)
+        species = popcount(bm)
+        obs, periods = keys // n_periods, keys % n_periods
+        order = np.lexsort((self.name_rank[obs], periods, -species))[:limit]
+        cols = [
+            FakeColumn("Observer", None),
+            FakeColumn(name, None),
+            FakeColumn("Species", None),
+        ]
+        return cols, [
+            (self.observer_names[obs[i]], label(periods[i]), int(species[i]))
+            for i in order
+        ]
+
+    def total_month_ticks(self, limit=10):
+        """Distinct (month of year, species) per observer."""
+        mask = np.ones(len(self.obs), dtype=bool)
+        obs, _, months = self.month_masks(mask)
+        ticks = np.zeros(len(self.observers), dtype=np.int64)
+        np.add.at(ticks, obs, POPCOUNT8[months & 0xFF] + POPCOUNT8[months >> 8])
+        avg = [
+            (Decimal(int(t)) / 12).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+            for t in ticks
+        ]
+        cols = [
+            FakeColumn("Observer", None),
+            FakeColumn("Ticks", None),
+            FakeColumn("Avg Per Mo.", None),
+        ]
+        return cols, self.leaderboard(ticks, limit, extra=(avg,))
+
+    def top_month_closeouts(self, limit=10, year=None, as_of=None, prev_as_of=None):
+        """Species seen in all 12 months, per observer."""
+        cols = [FakeColumn("Observer", None), FakeColumn("Species", None)]
+        if prev_as_of is not None:
+            cols.append(FakeColumn("Chg", None))
+        log = self.closeout_log(self.select(year=year))
+        return cols, self.standings(log, limit, as_of, prev_as_of)
+
+
+    def top_month_closeouts_best_years(self, limit=10):
+        """Species closed out within one year, per observer and year."""
+        obs, year, _ = self.closed_out(by_year=True)
+        n_years = int(year.max()) + 1 if len(year) else 1
+        keys, counts = np.unique(obs * n_years + year, return_counts=True)
+        obs, year = keys // n_years, keys % n_years
+        order = np.lexsort((year, self.name_rank[obs], -counts))[:limit]
+        cols = [
+            FakeColumn("Observer", None),
+            FakeColumn("Year", None),
+            FakeColumn("Species", None),
+        ]
+        return cols, [
+            (self.observer_names[obs[i]], int(year[i]), int(counts[i])) for i in order
+        ]
+
+    def month_closeout_birds(self, sort="desc", num_to_credit=2):
+        """The species someone has seen in all 12 months, with how many have,
+        and their names if `num_to_credit` or fewer."""
+        obs, _, sp = self.closed_out()
+        birders = {}
+        for o, s in zip(obs.tolist(), sp.tolist()):
+            birders.setdefault(s, []).append(o)
+        rows = []
+        for s, who in birders.items():
+            names = None
+            if len(who) <= num_to_credit:
+                who.sort(key=lambda o: self.name_rank[o])
+                names = ", ".join(self.observer_names[o] for o in who)
+            rows.append((self.species[s], len(who), names))
+        sign = 1 if sort == "asc" else -1
+        rows.sort(key=lambda r: (sign * r[1], r[0]))
+        cols = [
+            FakeColumn("Species", None),
+            FakeColumn("#", None),
+            FakeColumn("Birders", None),
+        ]
+        return cols, rows
+
+
+class DayLists:
+    """Species per (observer, date), and birders and species per date.
+
+    Dates are days since 2000-01-01; observer ids and names are as in
+    `SpeciesBitmaps`.
+    """
+
+    def __init__(self, observers, observer_names, name_rank, days, everyone):
+        self.observers = observers
+        self.observer_names = observer_names
+        self.name_rank = np.asarray(name_rank, dtype=np.int64)
+        self.days = days
+        self.everyone = everyone
+
+    def until(self, year):
+        """The same days, up to the end of `year`."""
+        end = _year_end_days(year)
+        return DayLists(
+            self.observers,
+            self.observer_names,
+            self.name_rank,
+            self.days[self.days["date"] <= end],
+            self.everyone[self.everyone["date"] <= end],
+        )
+
+    def top_day_lists(self, limit=10):
+        """The biggest days, most species first."""
+        obs, date, species = (
+            self.days[k].astype(np.int64) for k in ("obs", "date", "species")
+        )
+        order = np.lexsort((self.name_rank[obs], date, -species))[:limit]
+        cols = [
+            FakeColumn("Observer", None),
+            FakeColumn("Date", None),
+            FakeColumn("Species", None),
+        ]
+        return cols, [
+            (self.observer_names[obs[i]], _to_date(date[i]), int(species[i]))
+            for i in order
+        ]
+
+    def everyone_day_lists(self, limit=10):
+        """The dates with the most species seen by everyone."""
+        date, birders, species = (
+            self.everyone[k].astype(np.int64) for k in ("date", "birders", "species")
+        )
+        order = np.lexsort((date, -species))[:limit]
+        cols = [
+            FakeColumn("Date", None),
+            FakeColumn("Birders", None),
+            FakeColumn("Species", None),
+        ]
+        return cols, [
+            (_to_date(date[i]), int(birders[i]), int(species[i])) for i in order
+        ]
+
+
+def list_filters(region_where_clause, as_of):
+    """The where-clause of the observations that count towards lists."""
+    return f"""
+    {region_where_clause}
+    and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+    and not (approved = 'f' and reviewed = 't')
+    and (exotic_code is null or exotic_code in ('N'))
+    and observation_date <= '{as_of}'
+"""
+
+
+def _observers(cursor, table):
+    """(observer ids, names, rank by name) of the observers in `table`, by id."""
+    cursor.execute(
+        f"""
+select observer_id,
+       get_observer_name(observer_id),
+       rank() over (order by get_observer_name(observer_id))
+from {table}
+group by observer_id
+order by observer_id
+"""
+    )
+    rows = cursor.fetchall()
+    return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+
+
+def _create_source(cursor, table, sql):
+    """Save the result of `sql`, a scan of `ebird`, as temp table `table`."""
+    with span("query", cat="query", sql=sql) as args:
+        capture_plan(sql, args.get("parent"))
+        cursor.execute(f"create temp table {table} as {sql}")
+
+
+def extract_species(region_where_clause, as_of, with_media):
+    """Query the region's `SpeciesBitmaps` (see `species_bitmaps`)."""
+    media = " AND has_media = 't'" if with_media else ""
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop table if exists {SOURCE_TABLE}")
+        _create_source(
+            cursor,
+            SOURCE_TABLE,
+            f"""
+select observer_id,
+       common_name,
+       extract(year from observation_date)::int2  as year,
+       extract(month from observation_date)::int2 as month,
+       min(observation_date)                      as first_seen
+from ebird
+where {list_filters(region_where_clause, as_of)}
+  {media}
+group by 1, 2, 3, 4
+"""
+        )
+        observers, names, name_rank = _observers(cursor, SOURCE_TABLE)
+        cursor.execute(
+            f"select common_name from {SOURCE_TABLE} group by 1 order by 1"
+        )
+        species = [r[0] for r in cursor.fetchall()]
+
+    # Ids are positions in the sorted lists above.
+    rows = fetch_arrays(
+        f"""
+select (dense_rank() over (order by observer_id))::int4 - 1 as obs,
+       (dense_rank() over (order by common_name))::int4 - 1 as sp,
+       year, month, first_seen
+from {SOURCE_TABLE}
+"""
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop table {SOURCE_TABLE}")
+    return SpeciesBitmaps(observers, names, name_rank, species, rows)
+
+
+def extract_days(region_where_clause, as_of):
+    """Query the region's `DayLists` (see `day_lists`)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop table if exists {DAYS_TABLE}")
+        _create_source(
+            cursor,
+            DAYS_TABLE,
+            f"""
+select observer_id,
+       observation_date,
+       count(distinct common_name)::int4 as species
+from ebird
+where {list_filters(region_where_clause, as_of)}
+group by 1, 2
+"""
+        )
+        observers, names, name_rank = _observers(cursor, DAYS_TABLE)
+
+    days = fetch_arrays(
+        f"""
+select (dense_rank() over (order by observer_id))::int4 - 1 as obs,
+       observation_date as date,
+       species
+from {DAYS_TABLE}
+"""
+    )
+    everyone = fetch_arrays(
+        f"""
+select observation_date as date,
+       count(distinct observer_id)::int4 as birders,
+       count(distinct common_name)::int4 as species
+from ebird
+where {list_filters(region_where_clause, as_of)}
+group by 1
+"""
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop table {DAYS_TABLE}")
+    return DayLists(observers, names, name_rank, days, everyone)
+
+
+@query_cache.memoize()
+def _cached_extract(region_where_clause, as_of, with_media):
+    return extract_species(region_where_clause, as_of, with_media)
+
+
+@query_cache.memoize()
+def _cached_extract_days(region_where_clause, as_of):
+    return extract_days(region_where_clause, as_of)
+
+
+def _load(region_where_clause, as_of, with_media):
+    if sql_utils.use_query_cache:
+        return _cached_extract(region_where_clause, as_of, with_media)
+    return extract_species(region_where_clause, as_of, with_media)
+
+
+def _load_days(region_where_clause, as_of):
+    if sql_utils.use_query_cache:
+        return _cached_extract_days(region_where_clause, as_of)
+    return extract_days(region_where_clause, as_of)
+
+
+# Extractions kept up to date elsewhere, see `pin`: {(key, where clause, as_of): object}.
+_pinned = {}
+
+# The active `sweep`: {"region": where clause, "last_year": int, "extracted": {}}.
+_sweep = None
+
+
+@contextlib.contextmanager
+def pin(region_where_clause, as_of, extractions):
+    """Serve `extractions` of the region as of `as_of` instead of querying
+    them: {("species", with_media): SpeciesBitmaps, ("days",): DayLists}."""
+    keys = [(key, region_where_clause, as_of) for key in extractions]
+    _pinned.update(zip(keys, extractions.values()))
+    try:
+        yield
+    finally:
+        for key in keys:
+            _pinned.pop(key, None)
+
+
+@contextlib.contextmanager
+def sweep(region_where_clause, last_year):
+    """Answer year-end requests for the region up to `last_year` from one
+    extraction each (see the module docstring)."""
+    global _sweep
+    _sweep = {"region": region_where_clause, "last_year": last_year, "extracted": {}}
+    try:
+        yield
+    finally:
+        _sweep = None
+
+
+def _from_sweep(key, region_where_clause, as_of, load):
+    """The swept extraction `key` cut off at `as_of`, or None if the sweep
+    doesn't cover it.  `load(as_of)` extracts it on first use."""
+    if _sweep is None or _sweep["region"] != region_where_clause:
+        return None
+    year, _, rest = str(as_of).partition("-")
+    if rest != "12-31" or not year.isdigit() or int(year) > _sweep["last_year"]:
+        return None
+    extracted = _sweep["extracted"]
+    if key not in extracted:
+        extracted[key] = load(f"{_sweep['last_year']}-12-31")
+    return extracted[key].until(int(year))
+
+
+def _get(key, region_where_clause, as_of, load):
+    pinned = _pinned.get((key, region_where_clause, as_of))
+    if pinned is not None:
+        return pinned
+    swept = _from_sweep(key, region_where_clause, as_of, load)
+    if swept is not None:
+        return swept
+    return load(as_of)
+
+
+def species_bitmaps(region_where_clause, as_of, with_media=False):
+    """The region's `SpeciesBitmaps` up to `as_of` (only tuples with media if
+    `with_media`), extracted once and then served from the query cache."""
+    return _get(
+        ("species", with_media),
+        region_where_clause,
+        as_of,
+        lambda as_of: _load(region_where_clause, as_of, with_media),
+    )
+
+
+def day_lists(region_where_clause, as_of):
+    """The region's `DayLists` up to `as_of`, cached like `species_bitmaps`."""
+    return _get(
+        ("days",),
+        region_where_clause,
+        as_of,
+        lambda as_of: _load_days(region_where_clause, as_of),
+    )
@@ -0,0 +1,185 @@
+"""
+Checklist challenges: a set of taxa plus a rule for what a checklist needs.
+
+Every registered challenge is scored from one query: for each checklist in
+the region with a species of any challenge, its number of species of each
+challenge's set.  Adding a challenge to `CHALLENGES` adds a column, not a
+query.  Rules:
+
+- "all": the checklist has every species of the set,
+- "n": it has at least `n` species of the set,
+- "most": checklists are ranked by how many species of the set they have.
+
+"all" and "n" challenges list the qualifying checklists of a year, or count
+them per observer over all time; "most" challenges rank checklists.
+"""
+import functools
+import logging
+
+from ebirdcore.sql_utils import FakeColumn, execute_query
+
+logger = logging.getLogger(__name__)
+
+CHECKLIST_URL = "https://ebird.org/checklist/"
+
+
+class TaxonSet:
+    """Species by exact common name, or by the last word of the name (eg
+    "Warbler" for every "... Warbler")."""
+
+    def __init__(self, names=(), suffixes=()):
+        self.names = tuple(names)
+        self.suffixes = tuple(suffixes)
+
+    def matches(self, common_name):
+        if common_name in self.names:
+            return True
+        return any(common_name.endswith(f" {s}") for s in self.suffixes)
+
+    def sql(self):
+        clauses = []
+        if self.names:
+            names_sql = ", ".join("'{}'".format(n.replace("'", "''")) for n in self.names)
+            clauses.append(f"common_name in ({names_sql})")
+        clauses += [f"common_name like '% {s}'" for s in self.suffixes]
+        return "(" + " or ".join(clauses or ["false"]) + ")"
+
+
+class Challenge:
+    def __init__(self, title, taxa, rule, n=None, count_label="Species"):
+        if rule not in ("all", "n", "most"):
+            raise ValueError(f"Unknown challenge rule {rule!r}")
+        if rule == "all" and taxa.suffixes:
+            raise ValueError('An "all" challenge needs a set of names')
+        if rule == "n" and not n:
+            raise ValueError('An "n" challenge needs n')
+        self.title = title
+        self.taxa = taxa
+        self.rule = rule
+        self.n = len(taxa.names) if rule == "all" else n
+        self.count_label = count_label
+
+
+CHALLENGES = {
+    "woodpecker_clean_sweep": Challenge(
+        "Woodpecker Clean Sweeps",
+        TaxonSet(
+            names=[
+                "Downy Woodpecker",
+                "Hairy Woodpecker",
+                "Yellow-bellied Sapsucker",
+                "Northern Flicker",
+                "Pileated Woodpecker",
+                "Red-bellied Woodpecker",
+                "Red-headed Woodpecker",
+            ]
+        ),
+        "all",
+    ),
+    "warbler_single_list": Challenge(
+        "Warbler-a-palooza",
+        TaxonSet(
+            names=["Ovenbird"],
+            suffixes=["Warbler", "Parula", "Redstart", "Yellowthroat", "Waterthrush"],
+        ),
+        "most",
+        count_label="Warblers",
+    ),
+}
+
+
+@functools.lru_cache(maxsize=8)
+def checklist_counts(region_where_clause, as_of):
+    """((observer id, observer name, checklist id, date, locality, *counts))
+    of every checklist with a species of any registered challenge, where
+    counts are its species of each challenge's set, in `CHALLENGES` order.
+
+    Memoized, so the tables of every challenge share one scan even with the
+    query cache off.
+    """
+    taxa = " or ".join(c.taxa.sql() for c in CHALLENGES.values())
+    counts = ",\n       ".join(
+        f"count(distinct common_name) filter (where {c.taxa.sql()})"
+        for c in CHALLENGES.values()
+    )
+    sql = f"""
+select observer_id,
+       get_observer_name(observer_id),
+       SAMPLING_EVENT_IDENTIFIER,
+       min(OBSERVATION_DATE),
+       min(locality),
+       {counts}
+from ebird
+where {region_where_clause}
+  and ({taxa})
+  and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+  and not (approved = 'f' and reviewed = 't')
+  and (exotic_code is null or exotic_code in ('N'))
+  and observation_date <= '{as_of}'
+group by observer_id, SAMPLING_EVENT_IDENTIFIER
+"""
+    _, vals = execute_query(sql)
+    return tuple(vals)
+
+
+def _scored(name, checklists, year):
+    """[(count, observer id, observer name, checklist id, date, locality)] of
+    the checklists that qualify for challenge `name`."""
+    challenge = CHALLENGES[name]
+    column = 5 + list(CHALLENGES).index(name)
+    scored = []
+    for row in checklists:
+        observer_id, observer, checklist_id, date, locality = row[:5]
+        if year is not None and date.year != year:
+            continue
+        count = row[column]
+        if count and (challenge.rule == "most" or count >= challenge.n):
+            scored.append((count, observer_id, observer, checklist_id, date, locality))
+    return scored
+
+
+def challenge_table(name, region_where_clause, as_of, year=None, limit=20):
+    """The (title, subtitle, description, columns, rows) of a challenge."""
+    challenge = CHALLENGES[name]
+    if year is not None:
+        title = f"{year} {challenge.title}"
+        subtitle = str(year)
+    else:
+        title = f"All-Time {challenge.title}"
+        subtitle = "All Time"
+    logger.debug(f"Generating {title}...")
+    scored = _scored(name, checklist_counts(region_where_clause, as_of), year)
+
+    if challenge.rule == "most":
+        scored.sort(key=lambda c: (-c[0], c[4], c[2], c[3]))
+        cols = ["Observer", "Date", "Locality", "_Url1", challenge.count_label]
+        rows = [
+            (observer, date, locality, f"{CHECKLIST_URL}{checklist_id}", count)
+            for count, _, observer, checklist_id, date, locality in scored[:limit]
+        ]
+    elif year is not None:
+        scored.sort(key=lambda c: (c[4], c[2], c[3]))
+        cols = ["Observer", "Date", "Locality", "_Url1"]
+        rows = [
+            (observer, date, locality, f"{CHECKLIST_URL}{checklist_id}")
+            for count, _, observer, checklist_id, date, locality in scored[:limit]
+        ]
+    else:
+        # Per observer id (namesakes are different observers): number of
+        # qualifying checklists and the latest one.
+        by_observer = {}
+        for count, observer_id, observer, checklist_id, date, locality in scored:
+            n, _, last = by_observer.get(observer_id, (0, observer, None))
+            if last is None or (date, checklist_id) > last:
+                last = (date, checklist_id)
+            by_observer[observer_id] = (n + 1, observer, last)
+        ranked = sorted(
+            by_observer.items(),
+            key=lambda kv: (-kv[1][0], -kv[1][2][0].toordinal(), kv[1][1], kv[0]),
+        )
+        cols = ["Observer", "Count", "Last Date", "_Url2"]
+        rows = [
+            (observer, n, last_date, f"{CHECKLIST_URL}{checklist_id}")
+            for _, (n, observer, (last_date, checklist_id)) in ranked[:limit]
+        ]
+    return title, subtitle, None, [FakeColumn(c, None) for c in cols], rows
@@ -0,0 +1,205 @@
+"""
+EXPLAIN capture for report queries (`--explain`).
+
+While a capture is active every `execute_query` call is also run under
+`EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`.  Plans are keyed by the report
+table that issued them (eg "year_in_review#0") rather than by SQL text, so a
+run can be compared with one for another year or region.  Each plan is checked
+for sequential scans of `ebird`, sorts/hashes/aggregates that spilled to disk
+and row estimates that were off by more than `ESTIMATE_FACTOR`.
+"""
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ESTIMATE_FACTOR = 10
+# Ignore estimate misses on tiny nodes; 1 vs 15 rows never matters.
+ESTIMATE_MIN_ROWS = 1000
+# A query whose execution time changed by less than this isn't reported.
+DIFF_MIN_MS = 50
+DIFF_RATIO = 1.5
+
+
+def iter_nodes(node, depth=0):
+    yield depth, node
+    for child in node.get("Plans", ()):
+        yield from iter_nodes(child, depth + 1)
+
+
+def _node_label(node):
+    label = node["Node Type"]
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def plan_flags(plan):
+    """Problems worth a look in one `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` plan."""
+    flags = []
+    for _, node in iter_nodes(plan["Plan"]):
+        label = _node_label(node)
+        loops = node.get("Actual Loops", 1) or 1
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "ebird":
+            flags.append(f"seq scan: {label}")
+        if node.get("Sort Space Type") == "Disk":
+            spill = f"{node.get('Sort Method')}, {node.get('Sort Space Used')} kB"
+        elif node.get("Hash Batches", 1) > 1:
+            spill = f"{node['Hash Batches']} hash batches"
+        elif node.get("Disk Usage"):
+            spill = f"{node['Disk Usage']} kB on disk"
+        else:
+            # Buffer counts include the node's children.
+            temp = node.get("Temp Written Blocks", 0) - sum(
+                child.get("Temp Written Blocks", 0) for child in node.get("Plans", ())
+            )
+            spill = f"{temp} temp blocks written" if temp > 0 else None
+        if spill:
+            flags.append(f"spill: {label} ({spill})")
+
+        planned = node.get("Plan Rows", 0) * loops
+        actual = node.get("Actual Rows", 0) * loops
+        if max(planned, actual) >= ESTIMATE_MIN_ROWS:
+            ratio = max(planned, 1) / max(actual, 1)
+            if ratio >= ESTIMATE_FACTOR or ratio <= 1 / ESTIMATE_FACTOR:
+                flags.append(
+                    f"estimate: {label} planned {planned:.0f} rows, got {actual:.0f}"
+                )
+    return flags
+
+
+def plan_shape(plan):
+    """Indented node labels, which is what changes when the planner changes its mind."""
+    return [
+        "  " * depth + _node_label(node) for depth, node in iter_nodes(plan["Plan"])
+    ]
+
+
+class ExplainCapture:
+    def __init__(self):
+        self.plans = {}
+        self._counts = {}
+        # Set by `finish_capture` when there was a baseline to compare with.
+        self.baseline = None
+        self.changes = None
+
+    def record(self, sql, label, key=None):
+        """Explain `sql` as the next query of `label`, or as `key` if given."""
+        from django.db import connection
+
+        if key is None:
+            label = label or "query"
+            n = self._counts.get(label, 0)
+            self._counts[label] = n + 1
+            key = f"{label}#{n}"
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        plan = plan[0]
+        self.plans[key] = {
+            "sql_hash": hashlib.sha1(sql.encode("utf-8")).hexdigest()[:12],
+            "sql": sql,
+            "execution_ms": plan.get("Execution Time"),
+            "planning_ms": plan.get("Planning Time"),
+            "flags": plan_flags(plan),
+            "shape": plan_shape(plan),
+            "plan": plan,
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"plans": self.plans}, f, indent=1, default=str)
+        logger.info(f'Saved query plans "{path}"')
+
+    def summary(self):
+        lines = []
+        total = sum(p["execution_ms"] or 0 for p in self.plans.values())
+        lines.append(f"{len(self.plans)} queries explained, {total:.0f} ms executing")
+        for key, p in sorted(
+            self.plans.items(), key=lambda kv: -(kv[1]["execution_ms"] or 0)
+        ):
+            if p["flags"]:
+                lines.append(f"{p['execution_ms']:>9.1f} ms  {key}")
+                lines.extend(f"             {flag}" for flag in p["flags"])
+        return "\n".join(lines)
+
+    def report(self):
+        """The summary, then what changed since the baseline (if any)."""
+        lines = [self.summary()]
+        if self.changes is not None:
+            lines.append(f"\n{len(self.changes)} plan changes since {self.baseline}")
+            lines.extend(self.changes)
+        return "\n".join(lines)
+
+
+def load_plans(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["plans"]
+
+
+def diff_plans(before, after):
+    """Describe what changed between two runs' plans, slowest changes first."""
+    changes = []
+    for key in sorted(set(before) | set(after)):
+        if key not in after:
+            changes.append((0, f"{key}: no longer run"))
+            continue
+        if key not in before:
+            changes.append((after[key]["execution_ms"] or 0, f"{key}: new query"))
+            continue
+        a, b = before[key], after[key]
+        ms_a, ms_b = a["execution_ms"] or 0, b["execution_ms"] or 0
+        lines = []
+        if abs(ms_b - ms_a) >= DIFF_MIN_MS and (
+            max(ms_a, ms_b) / max(min(ms_a, ms_b), 0.001) >= DIFF_RATIO
+        ):
+            lines.append(f"{ms_a:.1f} ms -> {ms_b:.1f} ms")
+        if a["shape"] != b["shape"]:
+            lines.append("plan changed:")
+            lines.extend(f"  - {s}" for s in a["shape"] if s not in b["shape"])
+            lines.extend(f"  + {s}" for s in b["shape"] if s not in a["shape"])
+        lines.extend(f"  fixed: {f}" for f in a["flags"] if f not in b["flags"])
+        lines.extend(f"  new: {f}" for f in b["flags"] if f not in a["flags"])
+        if lines:
+            changes.append((abs(ms_b - ms_a), f"{key}: " + "\n    ".join(lines)))
+    return [text for _, text in sorted(changes, key=lambda c: -c[0])]
+
+
+_capture = None
+
+
+def capture_plan(sql, label=None):
+    """Explain `sql` if a capture is active; called by `execute_query`."""
+    if _capture is not None:
+        _capture.record(sql, label)
+
+
+def start_capture():
+    global _capture
+    _capture = ExplainCapture()
+    return _capture
+
+
+def finish_capture(path, baseline=None):
+    """Stop capturing, save the plans to `path` and return the capture.
+
+    When a baseline plans file is given (or `path` already holds one) the
+    capture's `changes` are set from it; its `report()` is for the command to
+    write out."""
+    global _capture
+    capture, _capture = _capture, None
+    if capture is None:
+        return None
+    if baseline is None and os.path.exists(path):
+        baseline = path
+    if baseline:
+        capture.baseline = baseline
+        capture.changes = diff_plans(load_plans(baseline), capture.plans)
+    capture.save(path)
+    return capture
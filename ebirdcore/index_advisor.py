@@ -0,0 +1,200 @@
+"""
+Index advice for the report workload (`index_advisor`).
+
+The workload is the set of report queries that read `ebird`, as captured by
+`--explain` (see `ebirdcore.explain`).  To evaluate a candidate index, it is
+built, the workload is re-run under EXPLAIN ANALYZE, and the index is dropped
+again.  Candidates that make the workload at least `MIN_GAIN` faster are the
+winners.  `apply` then builds the winners one by one and keeps each only if
+it still helps with the ones before it.
+
+Most report queries filter on a region column, the countable categories and
+`observation_date`, and read only `observer_id` and `common_name` besides.
+So the candidates are partial indexes on the countable rows, one set per
+region level the workload filters on, covering those columns.  A BRIN index
+on `observation_date` is also tried.  Index-only scans need an up-to-date
+visibility map, so VACUUM "ebird" before measuring.
+"""
+import logging
+import re
+import time
+
+from django.db import DatabaseError, connection
+
+from .explain import ExplainCapture, iter_nodes
+
+logger = logging.getLogger(__name__)
+
+MIN_GAIN = 0.05
+
+# Same as the list filters of the report queries, so the planner can prove a
+# query only needs rows of the partial index.
+COUNTABLE = """(category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+    and not (approved = 'f' and reviewed = 't')
+    and (exotic_code is null or exotic_code in ('N'))"""
+
+READS_EBIRD = re.compile(r"\bfrom\s+ebird\b", re.IGNORECASE)
+REGION_LEVEL = re.compile(r"\b(country|state|county)_code\s*=", re.IGNORECASE)
+
+
+class Candidate:
+    def __init__(self, name, definition):
+        self.name = name
+        self.definition = definition
+
+    def sql(self):
+        return f'create index {self.name} ON "ebird" {self.definition}'
+
+
+def workload(plans):
+    """{key: sql} of the captured queries (see `ExplainCapture.plans`) that
+    read `ebird`."""
+    return {key: p["sql"] for key, p in plans.items() if READS_EBIRD.search(p["sql"])}
+
+
+def candidates(queries):
+    """The candidate indexes for the region levels `queries` filter on."""
+    levels = sorted(
+        {level.lower() for sql in queries.values() for level in REGION_LEVEL.findall(sql)}
+    )
+    ret = []
+    for level in levels:
+        col = f"{level}_code"
+        ret += [
+            Candidate(
+                f"ebird_{level}_date_cover_idx",
+                f"({col}, observation_date) INCLUDE (observer_id, common_name) WHERE {COUNTABLE}",
+            ),
+            Candidate(
+                f"ebird_{level}_date_media_cover_idx",
+                f"({col}, observation_date) INCLUDE (observer_id, common_name, has_media) WHERE {COUNTABLE}",
+            ),
+            Candidate(
+                f"ebird_{level}_observer_cover_idx",
+                f"({col}, observer_id, observation_date) INCLUDE (common_name) WHERE {COUNTABLE}",
+            ),
+        ]
+    ret.append(Candidate("ebird_date_brin_idx", "USING BRIN (observation_date)"))
+    return ret
+
+
+def existing_indexes():
+    """{name: size in bytes} of the indexes on `ebird`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+select indexname, pg_relation_size(quote_ident(indexname)::regclass)
+from pg_indexes
+where tablename = 'ebird' and schemaname = current_schema()
+"""
+        )
+        return dict(cursor.fetchall())
+
+
+def measure(queries, repeat=1):
+    """Plans of `queries` (as `ExplainCapture.plans`), keeping the fastest of
+    `repeat` runs of each.  Queries that fail are left out."""
+    best = {}
+    for _ in range(repeat):
+        capture = ExplainCapture()
+        for key, sql in queries.items():
+            try:
+                capture.record(sql, None, key=key)
+            except DatabaseError as e:
+                logger.warning(f"{key}: {e}")
+                continue
+            plan = capture.plans[key]
+            if key not in best or plan["execution_ms"] < best[key]["execution_ms"]:
+                best[key] = plan
+    return best
+
+
+def total_ms(plans):
+    return sum(p["execution_ms"] or 0 for p in plans.values())
+
+
+def index_use(plans, name):
+    """(queries using index `name`, of which with index-only scans)."""
+    used = index_only = 0
+    for p in plans.values():
+        nodes = [
+            node for _, node in iter_nodes(p["plan"]["Plan"]) if node.get("Index Name") == name
+        ]
+        used += bool(nodes)
+        index_only += any(node["Node Type"] == "Index Only Scan" for node in nodes)
+    return used, index_only
+
+
+def used_indexes(plans):
+    return {
+        node["Index Name"]
+        for p in plans.values()
+        for _, node in iter_nodes(p["plan"]["Plan"])
+        if node.get("Index Name")
+    }
+
+
+def build(candidate):
+    """Create `candidate`; return (seconds to build, size in bytes)."""
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(candidate.sql())
+        seconds = time.perf_counter() - start
+        cursor.execute("select pg_relation_size(%s::regclass)", [candidate.name])
+        (size,) = cursor.fetchone()
+    return seconds, size
+
+
+def drop(candidate):
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop index if exists {candidate.name}")
+
+
+def evaluate(queries, candidate, baseline_ms, repeat=1):
+    """Build `candidate`, time `queries` with it, drop it again."""
+    logger.info(f"Evaluating {candidate.name}...")
+    seconds, size = build(candidate)
+    try:
+        plans = measure(queries, repeat)
+    finally:
+        drop(candidate)
+    ms = total_ms(plans)
+    used, index_only = index_use(plans, candidate.name)
+    return {
+        "candidate": candidate,
+        "build_s": seconds,
+        "bytes": size,
+        "ms": ms,
+        "gain": (baseline_ms - ms) / baseline_ms if baseline_ms else 0,
+        "used": used,
+        "index_only": index_only,
+    }
+
+
+def winners(results, min_gain=MIN_GAIN):
+    """The results of candidates used by the workload and at least `min_gain`
+    faster than the baseline, best first."""
+    return sorted(
+        (r for r in results if r["used"] and r["gain"] >= min_gain),
+        key=lambda r: -r["gain"],
+    )
+
+
+def apply(queries, results, baseline, min_gain=MIN_GAIN, repeat=1):
+    """Build the winning `results`, best first, keeping each one only if the
+    workload is still `min_gain` faster with it.  Returns (kept candidates,
+    plans with them)."""
+    kept = []
+    current = baseline
+    for r in results:
+        candidate = r["candidate"]
+        logger.info(f"Applying {candidate.name}...")
+        build(candidate)
+        plans = measure(queries, repeat)
+        if total_ms(plans) <= total_ms(current) * (1 - min_gain):
+            kept.append(candidate)
+            current = plans
+        else:
+            logger.info(f"{candidate.name} doesn't help on top of {len(kept)} others")
+            drop(candidate)
+    return kept, current
@@ -0,0 +1,200 @@
+"""
+Timing of report sections, tables and queries.
+
+During a run (between `start_run` and `finish_run`) every `execute_query` call
+and every section computed or rendered is recorded as a span on the run's
+`Tracer`.  Outside a run, eg in the web process, spans aren't recorded.  At the end of a run the report
+commands print a summary (slowest queries, time per section and the largest
+`pg_stat_statements` deltas, when that extension is installed) and save the
+spans as a Chrome trace, viewable in chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PG_STAT_COLUMNS = (
+    "calls",
+    "total_exec_time",
+    "rows",
+    "shared_blks_hit",
+    "shared_blks_read",
+    "temp_blks_written",
+)
+
+
+class NullTracer:
+    """Records nothing; the tracer outside a run."""
+
+    active = False
+
+    @contextmanager
+    def span(self, name, cat="section", **args):
+        yield args
+
+
+class Tracer:
+    """Collects nested spans as Chrome trace "complete" events."""
+
+    active = True
+
+    def __init__(self):
+        self.events = []
+        self.t0 = time.perf_counter()
+        self.pg_stats_before = None
+        self.pg_stats = None
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name, cat="section", **args):
+        """Time the block; the yielded dict is stored as the event's args."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        if stack:
+            args.setdefault("parent", stack[-1])
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": cat,
+                    "ph": "X",
+                    "ts": round((start - self.t0) * 1e6),
+                    "dur": round((end - start) * 1e6),
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args,
+                }
+            )
+
+    def spans(self, cat):
+        return [e for e in self.events if e["cat"] == cat]
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": self.events, "displayTimeUnit": "ms"},
+                f,
+                default=str,
+            )
+        logger.info(f'Saved trace "{path}"')
+
+    def summary(self, limit=15):
+        lines = []
+        queries = self.spans("query")
+        hits = sum(1 for e in queries if e["args"].get("cache") == "hit")
+        total_ms = sum(e["dur"] for e in queries) / 1000
+        lines.append(
+            f"{len(queries)} queries in {total_ms:.0f} ms ({hits} cache hits)"
+        )
+        lines.append(f"{'ms':>9} {'rows':>7} {'bytes':>9} {'cache':>5}  table")
+        for e in sorted(queries, key=lambda e: -e["dur"])[:limit]:
+            a = e["args"]
+            lines.append(
+                f"{e['dur'] / 1000:>9.1f} {a.get('rows', '-'):>7} {a.get('bytes', '-'):>9} "
+                f"{a.get('cache', '-'):>5}  {a.get('parent', '')}"
+            )
+
+        sections = {}
+        for e in self.spans("section") + self.spans("render"):
+            key = (e["name"], e["cat"])
+            sections[key] = sections.get(key, 0) + e["dur"]
+        if sections:
+            lines.append("")
+            lines.append(f"{'ms':>9}  section")
+            for (name, cat), dur in sorted(sections.items(), key=lambda kv: -kv[1]):
+                lines.append(f"{dur / 1000:>9.1f}  {name} ({cat})")
+
+        if self.pg_stats:
+            lines.append("")
+            lines.append(
+                f"{'exec ms':>9} {'calls':>6} {'rows':>8} {'blks read':>9} {'temp':>7}  pg_stat_statements"
+            )
+            for d in self.pg_stats[:limit]:
+                lines.append(
+                    f"{d['total_exec_time']:>9.1f} {d['calls']:>6} {d['rows']:>8} "
+                    f"{d['shared_blks_read']:>9} {d['temp_blks_written']:>7}  {d['query'][:60]}"
+                )
+        return "\n".join(lines)
+
+
+_tracer = NullTracer()
+
+
+def span(name, cat="section", **args):
+    return _tracer.span(name, cat=cat, **args)
+
+
+def tracing():
+    """Whether spans are being recorded, ie a run is active."""
+    return _tracer.active
+
+
+def pg_stat_statements_snapshot():
+    """{queryid: stats} for this database, or None without pg_stat_statements."""
+    from django.db import DatabaseError, connection
+
+    cols = ", ".join(PG_STAT_COLUMNS)
+    sql = f"""
+select queryid, query, {cols}
+from pg_stat_statements
+where dbid = (select oid from pg_database where datname = current_database())
+"""
+    try:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(sql)
+            except DatabaseError:
+                # Before Postgres 13 the column was total_time.
+                cursor.execute(sql.replace("total_exec_time", "total_time"))
+            return {
+                row[0]: dict(zip(("query",) + PG_STAT_COLUMNS, row[1:]))
+                for row in cursor.fetchall()
+            }
+    except DatabaseError as e:
+        logger.debug(f"pg_stat_statements unavailable: {e}")
+        return None
+
+
+def pg_stat_statements_deltas(before, after):
+    deltas = []
+    for queryid, stats in after.items():
+        prev = before.get(queryid)
+        d = {
+            col: stats[col] - (prev[col] if prev else 0) for col in PG_STAT_COLUMNS
+        }
+        if d["calls"]:
+            d["query"] = " ".join(stats["query"].split())
+            deltas.append(d)
+    return sorted(deltas, key=lambda d: -d["total_exec_time"])
+
+
+def start_run():
+    """Start a new trace for a report run."""
+    global _tracer
+    _tracer = Tracer()
+    _tracer.pg_stats_before = pg_stat_statements_snapshot()
+    return _tracer
+
+
+def finish_run(trace_path=None):
+    """Stop tracing, save the trace to `trace_path` and return the tracer,
+    whose `summary()` the command writes out."""
+    global _tracer
+    tracer = _tracer
+    _tracer = NullTracer()
+    if tracer.pg_stats_before is not None:
+        after = pg_stat_statements_snapshot()
+        if after is not None:
+            tracer.pg_stats = pg_stat_statements_deltas(tracer.pg_stats_before, after)
+    if trace_path:
+        tracer.save(trace_path)
+    return tracer
@@ -1,6 +1,19 @@
 from ebirdcore.utils import get_checklist_url
-from ebirdcore.sql_utils import fmt, fmtrow, format_list_of_names
+from ebirdcore.sql_utils import (
+    as_columns,
+    column_values,
+    fmt,
+    fmt_column,
+    fmtrow,
+    format_list_of_names,
+    rank_column,
+)
+import hashlib
+import json
 import logging
+import os
+import shutil
+import subprocess
 from pylatex.base_classes.containers import Environment
 from pylatex.basic import SmallText
 from pylatex.package import Package
@@ -45,6 +58,8 @@ from pylatex.utils import NoEscape, bold, escape_latex, italic
 cache = Cache("cachedir")
 logger = logging.getLogger(__name__)
 
+LATEX_BUILD_DIR = "latex_build"
+
 
 def get_tabular_format(i, d):
     if i == 0:
@@ -137,6 +152,38 @@ def add_tables_in_default_formatter(
     data_table.add_row(fmtrow)
 
 
+def _table_body(column_desc, vals, rank_by_colidx, header_row, hline_every):
+    """The rows of a table as one LaTeX string, equivalent to calling
+    `add_tables_in_default_formatter` on every row.
+
+    Columns are formatted and escaped a column at a time, and only string
+    columns go through `fmt`.
+    """
+    vals = as_columns(vals, len(column_desc))
+    visible = [i for i, d in enumerate(column_desc) if not d.name.startswith("_")]
+    columns = [
+        [escape_latex(str(v)) for v in fmt_column(column_values(vals, i))]
+        for i in visible
+    ]
+
+    if (
+        rank_by_colidx is not None
+        and columns
+        and hasattr(header_row[0], "startswith")
+        and header_row[0].startswith("Observer")
+    ):
+        ranks = rank_column(column_values(vals, visible[rank_by_colidx]))
+        # "~" is the escaped non-breaking space.
+        columns[0] = [f"{rank}.~{v}" for rank, v in zip(ranks, columns[0])]
+
+    lines = []
+    for rowidx, cells in enumerate(zip(*columns)):
+        if hline_every and rowidx and rowidx % hline_every == 0:
+            lines.append(r"\hline")
+        lines.append("&".join(cells) + r"\\")
+    return NoEscape("%\n".join(lines))
+
+
 def add_tables_in(
     doc,
     table_rets,
@@ -284,9 +331,19 @@ def add_table(
             # data_table.add_empty_row()
             data_table.end_table_header()
 
+        if add_item_f is add_tables_in_default_formatter:
+            body = _table_body(column_desc, vals, rank_by_colidx, header_row, hline_every)
+            if body:
+                data_table.append(body)
+            doc.append(NoEscape(r"\hline"))
+            return
+
         rank = 0
         sort_val = [None, None]
         for rowidx, row in enumerate(vals):
+            # A rule after every `hline_every` rows, except after the last.
+            if hline_every and rowidx and rowidx % hline_every == 0:
+                doc.append(NoEscape(r"\hline"))
             add_item_f(
                 data_table,
                 row,
@@ -297,11 +354,6 @@ def add_table(
                 sort_val,
             )
 
-            if hline_every:
-                # breakpoint()
-                if rowidx < len(vals) - 1 and rowidx % hline_every == hline_every - 1:
-                    doc.append(NoEscape(r"\hline"))
-
         doc.append(NoEscape(r"\hline"))
 
 
@@ -310,3 +362,92 @@ def add_section_description(doc, desc):
         with doc.create(FlushLeft()):
             doc.append(desc)
             doc.append(VerticalSpace("1pt"))
+
+
+def _write_if_changed(path, content, hashes, key):
+    """Write `content` to `path` unless its hash matches `hashes[key]`."""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if hashes.get(key) == digest and os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    hashes[key] = digest
+    return True
+
+
+def generate_pdf_incremental(doc, fragments, filename_base, build_dir=None):
+    """Compile `doc` with each (name, Fragment) in `fragments` `\\input` from
+    its own .tex file, and copy the result to `filename_base`.pdf.
+
+    Everything is written to a persistent build directory, and only when its
+    content hash changed, so latexmk can reuse the aux files of earlier runs.
+    If no fragment changed and the PDF is there, LaTeX isn't run at all.
+    """
+    build_dir = build_dir or os.path.join(
+        LATEX_BUILD_DIR, os.path.basename(filename_base)
+    )
+    manifest_path = os.path.join(build_dir, "hashes.json")
+    hashes = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            hashes = json.load(f)
+
+    changed = []
+    for name, fragment in fragments:
+        fragment._propagate_packages()
+        for package in fragment.packages:
+            doc.packages.add(package)
+        if _write_if_changed(
+            os.path.join(build_dir, "sections", f"{name}.tex"),
+            fragment.dumps(),
+            hashes,
+            name,
+        ):
+            changed.append(name)
+        doc.append(NoEscape(r"\input{sections/" + name + "}"))
+    if _write_if_changed(
+        os.path.join(build_dir, "report.tex"), doc.dumps(), hashes, "report"
+    ):
+        changed.append("report")
+
+    pdf_path = os.path.join(build_dir, "report.pdf")
+    if changed or not os.path.exists(pdf_path):
+        logger.info(f"Compiling PDF; changed: {', '.join(changed) or 'none'}")
+        _compile_latex(build_dir, "report")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(hashes, f, indent=1)
+    else:
+        logger.info("No section changed; skipping LaTeX.")
+
+    shutil.copyfile(pdf_path, filename_base + ".pdf")
+
+
+def _compile_latex(build_dir, jobname):
+    # Images are referenced relative to the working directory.
+    env = dict(os.environ)
+    env["TEXINPUTS"] = os.getcwd() + os.pathsep + env.get("TEXINPUTS", "")
+    compilers = [
+        ["latexmk", "-pdf", "-interaction=nonstopmode", f"{jobname}.tex"],
+        # Without latexmk, a second pass fills in the table of contents.
+        ["pdflatex", "-interaction=nonstopmode", f"{jobname}.tex"],
+    ]
+    for command in compilers:
+        passes = 2 if command[0] == "pdflatex" else 1
+        try:
+            for _ in range(passes):
+                subprocess.run(
+                    command,
+                    cwd=build_dir,
+                    env=env,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+        except FileNotFoundError:
+            continue
+        except subprocess.CalledProcessError as e:
+            print(e.output.decode(errors="replace"))
+            raise
+        return
+    raise RuntimeError("No LaTeX compiler found; install latexmk or pdflatex.")
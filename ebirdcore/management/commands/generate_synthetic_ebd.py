@@ -0,0 +1,67 @@
+# encoding: utf-8
+"""
+Write a synthetic EBD file, for testing the loader and reports at scale.
+Usage:
+    python manage.py generate_synthetic_ebd --scale county -o ebd_synthetic_county.txt
+    python manage.py generate_synthetic_ebd --scale state --rows 1e6 --seed 7 -o ebd_md.txt.gz
+
+Load the result like a real download, by pointing `ebird_export_path` in
+ebird-create-db-and-load-ebd.sql at it (decompress it first if gzipped).
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ebirdcore.synthetic import SCALES, SyntheticEBD
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic eBird Basic Dataset file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            default="county",
+            choices=list(SCALES),
+            help="Region, observer and species counts to model",
+        )
+        parser.add_argument(
+            "--rows",
+            default=None,
+            type=float,
+            help="Number of observations (default depends on --scale, 1e5 to 1e9)",
+        )
+        parser.add_argument("--seed", default=0, type=int)
+        parser.add_argument(
+            "--years",
+            default="2010-2025",
+            help="Observation date range, eg 2015-2024",
+        )
+        parser.add_argument(
+            "-o", "--output", default="-", help="Output path, .gz to compress (default stdout)"
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="INFO")
+
+        try:
+            first_year, _, last_year = options["years"].partition("-")
+            first_year = int(first_year)
+            last_year = int(last_year or first_year)
+        except ValueError:
+            raise CommandError(f"Bad --years {options['years']}, expected eg 2015-2024")
+
+        generator = SyntheticEBD(
+            rows=options["rows"],
+            scale=options["scale"],
+            seed=options["seed"],
+            first_year=first_year,
+            last_year=last_year,
+        )
+        t0 = time.time()
+        generator.write(options["output"])
+        logger.info(f'Wrote "{options["output"]}" in {time.time() - t0:.1f}s')
@@ -0,0 +1,129 @@
+# encoding: utf-8
+"""
+Find the indexes that make the report queries faster.
+Usage: python manage.py index_advisor -r US-DC-001 -y 2024 [--apply]
+
+Captures the report workload (or reads it from a `--explain` plans file),
+times it with each candidate index in turn (see `ebirdcore.index_advisor`)
+and prints the candidates with their build time, size, workload time and how
+many queries used them.  With --apply the winners are created and kept, and
+the per-query changes are printed.  VACUUM "ebird" first: index-only scans
+need its visibility map.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ebirdcore import explain, index_advisor, sql_utils
+from ebirdcore.report_artifact import compute_report, report_sections, select_sections
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Evaluate candidate indexes against the report queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-r", "--region", default="US-DC-001")
+        parser.add_argument("-y", "--year", default=2020, type=int)
+        parser.add_argument(
+            "--as-of", default=None, help="Only include data up to this date"
+        )
+        parser.add_argument(
+            "--plans",
+            default=None,
+            help="Workload from a plans file saved by --explain (default: capture it)",
+        )
+        parser.add_argument(
+            "--min-gain",
+            default=index_advisor.MIN_GAIN,
+            type=float,
+            help="Smallest workload speedup for a winner (default %(default)s)",
+        )
+        parser.add_argument(
+            "--repeat",
+            default=1,
+            type=int,
+            help="Time each query this many times, keeping the fastest",
+        )
+        parser.add_argument(
+            "--apply", action="store_true", help="Create the winning indexes"
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="INFO")
+
+        region_code = options["region"]
+        year = options["year"]
+        if options["plans"]:
+            plans = explain.load_plans(options["plans"])
+        else:
+            plans = self.capture(region_code, year, options["as_of"])
+        queries = index_advisor.workload(plans)
+        if not queries:
+            raise CommandError("No queries of ebird in the workload")
+
+        existing = index_advisor.existing_indexes()
+        baseline = index_advisor.measure(queries, options["repeat"])
+        # Leave out queries that failed (eg on a temp table that is gone).
+        queries = {key: queries[key] for key in baseline}
+        baseline_ms = index_advisor.total_ms(baseline)
+        print(f"{len(queries)} queries, {baseline_ms:.0f} ms with the current indexes")
+
+        used = index_advisor.used_indexes(baseline)
+        for name, size in sorted(existing.items()):
+            if name not in used:
+                print(f"Not used by the workload: {name} ({size / 2**20:.0f} MB)")
+
+        results = [
+            index_advisor.evaluate(queries, candidate, baseline_ms, options["repeat"])
+            for candidate in index_advisor.candidates(queries)
+            if candidate.name not in existing
+        ]
+        print(
+            f"\n{'build s':>8} {'MB':>7} {'ms':>9} {'gain':>6} {'used':>5} {'only':>5}  candidate"
+        )
+        for r in sorted(results, key=lambda r: -r["gain"]):
+            print(
+                f"{r['build_s']:>8.1f} {r['bytes'] / 2**20:>7.0f} {r['ms']:>9.0f} "
+                f"{r['gain']:>6.0%} {r['used']:>5} {r['index_only']:>5}  {r['candidate'].name}"
+            )
+
+        winners = index_advisor.winners(results, options["min_gain"])
+        if not winners:
+            print("\nNo candidate is worth adding")
+            return
+        if not options["apply"]:
+            print("\nWinners (add them with --apply):")
+            for r in winners:
+                print(f"{r['candidate'].sql()};")
+            return
+
+        kept, after = index_advisor.apply(
+            queries, winners, baseline, options["min_gain"], options["repeat"]
+        )
+        print(
+            f"\n{baseline_ms:.0f} ms -> {index_advisor.total_ms(after):.0f} ms with "
+            f"{len(kept)} new indexes:"
+        )
+        for candidate in kept:
+            print(f"{candidate.sql()};")
+        for change in explain.diff_plans(baseline, after):
+            print(change)
+
+    def capture(self, region_code, year, as_of):
+        """The plans of every report query, except the photos'."""
+        sections = select_sections(
+            list(report_sections(region_code, year)), skip=["media"]
+        )
+        sql_utils.use_query_cache = False
+        explain.start_capture()
+        compute_report(
+            region_code, year, with_photos=False, sections=sections, as_of=as_of
+        )
+        capture = explain.finish_capture(
+            f"index-advisor-{region_code}-{year}.plans.json"
+        )
+        self.stdout.write(capture.report())
+        return capture.plans
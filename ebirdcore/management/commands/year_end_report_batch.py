@@ -0,0 +1,297 @@
+# encoding: utf-8
+"""
+Generate Annual eBird Statistical Reports for many regions at once.
+Usage:
+    python manage.py year_end_report_batch -y 2024 US-DC-001 "US-MD-*"
+    python manage.py year_end_report_batch -y 2024 --counties-of US-MD --counties-of US-VA -j 8
+
+Regions sharing a state get a shared base relation (that state's rows only,
+indexed for the county queries; the checklist and region tables and the
+leaderboard extractions are still per region), queries run with at most --db-jobs regions hitting the database at once, and
+rendering is fanned out over --jobs worker processes.  A failed region is
+reported at the end rather than aborting the batch.
+"""
+
+import fnmatch
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ebirdcore.index_advisor import COUNTABLE
+from ebirdcore.utils import get_subregions, parse_region_code
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("pdf", "html")
+
+# Indexes of a shared base relation: the county queries filter on
+# county_code and the list filters, and group by observer and checklist (the
+# covering ones are `index_advisor` candidates).
+BASE_INDEXES = (
+    "(county_code, observation_date)",
+    f"(county_code, observation_date) INCLUDE (observer_id, common_name) WHERE {COUNTABLE}",
+    f"(county_code, observer_id, observation_date) INCLUDE (common_name) WHERE {COUNTABLE}",
+    "(county_code, sampling_event_identifier)",
+    "(locality_id, observation_doy)",
+    "(common_name)",
+)
+
+_db_semaphore = None
+
+
+def _init_worker(db_semaphore):
+    global _db_semaphore
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    # Never share a connection inherited from the parent process.
+    connections.close_all()
+    _db_semaphore = db_semaphore
+
+
+def _run_region(region, year, formats, output_dir, base_schema, with_photos, offline):
+    from ebirdcore.media import MediaFetcher
+    from ebirdcore.report_artifact import compute_report
+
+    region_code = region["code"]
+    timings = {"region": region_code, "error": None}
+    filename_base = os.path.join(
+        output_dir, f"{year} Annual eBird Statistical Report - {region_code}"
+    )
+    artifact_path = filename_base + ".json"
+    fetcher = MediaFetcher(offline=offline)
+    try:
+        t0 = time.time()
+        with _db_semaphore:
+            timings["wait"] = time.time() - t0
+            t0 = time.time()
+            with connection.cursor() as cursor:
+                if base_schema:
+                    cursor.execute(f"set search_path to {base_schema}, public")
+                else:
+                    cursor.execute("set search_path to default")
+            artifact = compute_report(region_code, year, with_photos=False, region=region)
+        timings["compute"] = time.time() - t0
+
+        # The photo lookups are HTTP only, so they don't hold a --db-jobs slot.
+        t0 = time.time()
+        if with_photos and "media" in artifact.sections:
+            artifact.compute_photos(fetcher=fetcher)
+        artifact.save(artifact_path)
+        timings["photos"] = time.time() - t0
+
+        t0 = time.time()
+        options = dict(region=region_code, year=year, artifact=artifact_path)
+        if offline:
+            options["offline"] = True
+        if "pdf" in formats:
+            call_command("year_end_report", output=filename_base, **options)
+        if "html" in formats:
+            if not with_photos:
+                options["no_photos"] = True
+            call_command("year_end_report_html", output=filename_base + ".html", **options)
+        timings["render"] = time.time() - t0
+    except Exception as e:
+        timings["error"] = f"{type(e).__name__}: {e}"
+        logger.exception(f"Region {region_code} failed")
+    return timings
+
+
+def expand_region_pattern(pattern):
+    """Expand a region code glob (eg "US-MD-*") into region dicts."""
+    segs = pattern.split("-")
+    wild = [i for i, seg in enumerate(segs) if any(c in seg for c in "*?[")]
+    if not wild:
+        try:
+            return [parse_region_code(pattern)]
+        except RuntimeError as e:
+            raise CommandError(e)
+
+    i = wild[0]
+    if i == 0:
+        raise CommandError(f"Country codes can't be globbed: {pattern}")
+    level_pattern = "-".join(segs[: i + 1])
+    children = [
+        r
+        for r in get_subregions("-".join(segs[:i]))
+        if fnmatch.fnmatch(r["code"], level_pattern)
+    ]
+    if len(segs) == i + 1:
+        return children
+    rest = "-".join(segs[i + 1 :])
+    ret = []
+    for child in children:
+        ret.extend(expand_region_pattern(f"{child['code']}-{rest}"))
+    return ret
+
+
+def _base_schema_name(parent_code):
+    return "batch_" + re.sub(r"\W", "_", parent_code.lower())
+
+
+class Command(BaseCommand):
+    help = "Generate Annual eBird Statistical Reports for many regions in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "regions", nargs="*", help="Region codes or globs, eg US-MD-0*"
+        )
+        parser.add_argument(
+            "--counties-of",
+            action="append",
+            default=[],
+            help="Add every county in this state (repeatable)",
+        )
+        parser.add_argument("-y", "--year", default=2020, type=int)
+        parser.add_argument(
+            "-f",
+            "--formats",
+            default="pdf,html",
+            help=f"Comma-separated output formats ({', '.join(FORMATS)})",
+        )
+        parser.add_argument("-d", "--output-dir", default=".")
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            default=os.cpu_count(),
+            type=int,
+            help="Worker processes",
+        )
+        parser.add_argument(
+            "--db-jobs",
+            default=2,
+            type=int,
+            help="Maximum regions querying the database at once",
+        )
+        parser.add_argument(
+            "--no-shared-base",
+            action="store_true",
+            help="Don't build a shared per-state base relation",
+        )
+        parser.add_argument(
+            "--no-photos", action="store_true", help="Skip photo fetching"
+        )
+        parser.add_argument(
+            "--offline", action="store_true", help="Only use cached media"
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="INFO")
+
+        formats = [f.strip() for f in options["formats"].split(",") if f.strip()]
+        for f in formats:
+            if f not in FORMATS:
+                raise CommandError(f"Unknown format {f}")
+
+        regions = {}
+        for pattern in options["regions"]:
+            for region in expand_region_pattern(pattern):
+                regions[region["code"]] = region
+        for state_code in options["counties_of"]:
+            counties = get_subregions(state_code)
+            if not counties:
+                # An unknown state, reported with the codes it might be.
+                expand_region_pattern(state_code)
+            for region in counties:
+                regions[region["code"]] = region
+        if not regions:
+            raise CommandError("No regions to generate")
+
+        by_state = {}
+        for code in regions:
+            if len(code.split("-")) == 3:
+                by_state.setdefault(code.rsplit("-", 1)[0], []).append(code)
+        base_schemas = {}
+        if not options["no_shared_base"]:
+            for state_code, codes in by_state.items():
+                if len(codes) > 1:
+                    schema = self.create_base_relation(state_code)
+                    for code in codes:
+                        base_schemas[code] = schema
+
+        os.makedirs(options["output_dir"], exist_ok=True)
+        logger.info(f"Generating {len(regions)} region reports...")
+
+        # Worker processes open their own connections.
+        connection.close()
+        results = []
+        ctx = multiprocessing.get_context()
+        t_start = time.time()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=options["jobs"],
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(ctx.BoundedSemaphore(options["db_jobs"]),),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _run_region,
+                        region,
+                        options["year"],
+                        formats,
+                        options["output_dir"],
+                        base_schemas.get(code),
+                        not options["no_photos"],
+                        options["offline"],
+                    )
+                    for code, region in sorted(regions.items())
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    status = "FAILED" if result["error"] else "done"
+                    logger.info(f"{result['region']}: {status}")
+        finally:
+            for schema in set(base_schemas.values()):
+                self.drop_base_relation(schema)
+
+        self.print_summary(results, time.time() - t_start)
+        failures = [r for r in results if r["error"]]
+        if failures:
+            raise CommandError(f"{len(failures)} of {len(results)} regions failed")
+
+    def create_base_relation(self, state_code):
+        """Copy a state's rows into `<schema>.ebird`, shadowing the full table
+        for workers whose search_path puts that schema first."""
+        schema = _base_schema_name(state_code)
+        logger.info(f"Building shared base relation {schema}.ebird...")
+        with connection.cursor() as cursor:
+            cursor.execute(f"create schema if not exists {schema}")
+            cursor.execute(f"drop table if exists {schema}.ebird")
+            cursor.execute(
+                f"create unlogged table {schema}.ebird as select * from public.ebird where state_code = %s",
+                [state_code],
+            )
+            for columns in BASE_INDEXES:
+                cursor.execute(f"create index on {schema}.ebird {columns}")
+            cursor.execute(f"analyze {schema}.ebird")
+        return schema
+
+    def drop_base_relation(self, schema):
+        with connection.cursor() as cursor:
+            cursor.execute(f"drop schema if exists {schema} cascade")
+
+    def print_summary(self, results, elapsed):
+        print(
+            f"{'Region':<14} {'Wait':>7} {'Compute':>8} {'Photos':>8} {'Render':>8}  Status"
+        )
+        for r in sorted(results, key=lambda r: r["region"]):
+            wait = f"{r['wait']:.1f}s" if "wait" in r else "-"
+            compute = f"{r['compute']:.1f}s" if "compute" in r else "-"
+            photos = f"{r['photos']:.1f}s" if "photos" in r else "-"
+            render = f"{r['render']:.1f}s" if "render" in r else "-"
+            print(
+                f"{r['region']:<14} {wait:>7} {compute:>8} {photos:>8} {render:>8}  {r['error'] or 'ok'}"
+            )
+        print(f"{len(results)} regions in {elapsed:.1f}s")
@@ -0,0 +1,88 @@
+# encoding: utf-8
+"""
+Run every Annual eBird Statistical Report query once and save a report artifact.
+Usage: python manage.py year_end_report_compute -r US-DC-001 -y 2024 -o report.json
+
+Render it with `year_end_report --artifact report.json` and/or
+`year_end_report_html --artifact report.json` without re-running any queries.
+If the output file already exists, only sections whose inputs changed are
+recomputed.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ebirdcore.media import MediaFetcher
+from ebirdcore.report_artifact import (
+    load_or_compute_report,
+    report_sections,
+    select_sections,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute an Annual eBird Statistical Report artifact (JSON or .msgpack)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-r", "--region", default="US-DC-001")
+        parser.add_argument("-y", "--year", default=2020, type=int)
+        parser.add_argument("-o", "--output", default=None, help="Output file path")
+        parser.add_argument(
+            "--no-photos", action="store_true", help="Skip photo fetching"
+        )
+        parser.add_argument(
+            "--offline", action="store_true", help="Only use cached media"
+        )
+        parser.add_argument(
+            "--as-of", default=None, help="Only include data up to this date"
+        )
+        parser.add_argument(
+            "--dataset-version",
+            default=None,
+            help="EBD release loaded in the database, eg EBD_relDec-2025",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            help="Only compute these sections (comma-separated, repeatable)",
+        )
+        parser.add_argument(
+            "--skip",
+            action="append",
+            help="Skip these sections (comma-separated, repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="DEBUG")
+
+        region_code = options["region"]
+        year = options["year"]
+        filename = (
+            options["output"]
+            or f"{year} Annual eBird Statistical Report - {region_code}.json"
+        )
+
+        try:
+            sections = select_sections(
+                list(report_sections(region_code, year)),
+                only=options["only"],
+                skip=options["skip"],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        load_or_compute_report(
+            region_code,
+            year,
+            path=filename,
+            with_photos=not options["no_photos"],
+            fetcher=MediaFetcher(offline=options["offline"]),
+            as_of=options["as_of"],
+            dataset_version=options["dataset_version"],
+            sections=sections,
+        )
+
+        print(f"Written: {filename}")
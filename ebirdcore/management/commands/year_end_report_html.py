@@ -6,13 +6,30 @@ Usage: python manage.py year_end_report_html -r US-DC-001 -y 2024
 
 import html as _html
 import logging
+import os
+import shutil
 
-import requests
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from ebirdcore import explain, instrumentation
 from ebirdcore.dc_ward_wkv import dc_ward_wkv
-from ebirdcore.models import EBird
-from ebirdcore.management.commands.year_end_report import Command as Queries
+from ebirdcore.instrumentation import span
+from ebirdcore.media import MediaFetcher, derive_photos, get_asset_url
+from ebirdcore.report_artifact import (
+    dataset_release_date,
+    open_report,
+    report_sections,
+    select_sections,
+    subregion_level,
+)
+from ebirdcore.sql_utils import (
+    as_columns,
+    column_values,
+    fmt_column,
+    fmtrow,
+    rank_column,
+    split_table,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -187,6 +204,9 @@ table.dt td.loc { max-width: 160px; overflow: hidden; text-overflow: ellipsis; w
 
 
 def _render_table(column_desc, data, rank_by_colidx=-1, hline_every=5):
+    """Render a table a column at a time: each column is escaped, ranked and
+    linked in one pass, then the rows are joined in bulk."""
+    data = as_columns(data, len(column_desc))
     vis = [(i, d) for i, d in enumerate(column_desc) if not d.name.startswith("_")]
 
     # Build map: visible column index -> raw column index of its URL
@@ -209,39 +229,35 @@ def _render_table(column_desc, data, rank_by_colidx=-1, hline_every=5):
         and headers[0].startswith("Observer")
     )
 
-    sort_sentinel = object()
-    sort_val = sort_sentinel
-    rank = 0
-    rows = []
-
-    for ri, row in enumerate(data):
-        vis_vals = [row[i] for i, _ in vis]
-
-        if do_rank:
-            sv = vis_vals[rank_by_colidx]
-            if sv != sort_val:
-                rank = ri + 1
-                sort_val = sv
-
-        cells = []
-        for ci, (_, col) in enumerate(vis):
-            raw = vis_vals[ci]
-            val = h(raw)
-            if ci == 0 and do_rank:
-                val = f"{rank}.&nbsp;{val}"
-            if ci in url_for_col:
-                col_url = row[url_for_col[ci]]
-                if col_url:
-                    val = f'<a href="{h(col_url)}" target="_blank" rel="noopener">{val}</a>'
-            if col.name == "Locality":
-                cells.append(f'<td class="loc" title="{h(raw)}">{val}</td>')
-            else:
-                cells.append(f"<td>{val}</td>")
-
-        cls = (
-            ' class="sep"' if (hline_every and ri > 0 and ri % hline_every == 0) else ""
-        )
-        rows.append(f"<tr{cls}>{''.join(cells)}</tr>")
+    columns = []
+    for ci, (i, col) in enumerate(vis):
+        raw = fmt_column(column_values(data, i))
+        vals = [h(v) for v in raw]
+        if ci == 0 and do_rank:
+            ranks = rank_column(column_values(data, vis[rank_by_colidx][0]))
+            vals = [f"{rank}.&nbsp;{v}" for rank, v in zip(ranks, vals)]
+        if ci in url_for_col:
+            urls = column_values(data, url_for_col[ci])
+            vals = [
+                f'<a href="{h(url)}" target="_blank" rel="noopener">{v}</a>'
+                if url
+                else v
+                for url, v in zip(urls, vals)
+            ]
+        if col.name == "Locality":
+            vals = [
+                f'<td class="loc" title="{h(r)}">{v}</td>' for r, v in zip(raw, vals)
+            ]
+        else:
+            vals = [f"<td>{v}</td>" for v in vals]
+        columns.append(vals)
+
+    rows = [
+        f'<tr class="sep">{"".join(cells)}</tr>'
+        if hline_every and ri > 0 and ri % hline_every == 0
+        else f'<tr>{"".join(cells)}</tr>'
+        for ri, cells in enumerate(zip(*columns))
+    ]
 
     return (
         f'<table class="dt">'
@@ -284,32 +300,11 @@ def tables_in(table_rets, columns, rank_by_colidx=-1):
     return f'<div class="tgrid c{nc}">{"".join(parts)}</div>'
 
 
-def sec(anchor, title, body, description=None):
-    desc = f'<p class="desc">{h(description)}</p>' if description else ""
-    return f'<section class="sec" id="{h(anchor)}"><h2>{h(title)}</h2>{desc}{body}</section>\n'
-
-
 def subsec(title, body, description=None):
     desc = f'<p class="desc">{h(description)}</p>' if description else ""
     return f"<div><h3>{h(title)}</h3>{desc}{body}</div>\n"
 
 
-def table_sec(args, rank_by_colidx=None):
-    title, subtitle, description, column_desc, data = args
-    tbl = _render_table(
-        column_desc,
-        data,
-        rank_by_colidx=rank_by_colidx if rank_by_colidx is not None else -1,
-        hline_every=5,
-    )
-    return sec(
-        anchor=title.lower().replace(" ", "-"),
-        title=title,
-        body=tbl,
-        description=description,
-    )
-
-
 def _render_item_list(data, formatter):
     month_strs = {
         1: "Jan",
@@ -326,7 +321,7 @@ def _render_item_list(data, formatter):
         12: "Dec",
     }
     items = []
-    for row in data:
+    for row in map(fmtrow, data):
         if formatter == "month_big_day":
             mo = int(float(str(row[0])))
             obs, sp, dt = h(row[1]), h(row[2]), h(row[3])
@@ -352,645 +347,511 @@ def _render_item_list(data, formatter):
     return f'<div class="list-grid">{"".join(items)}</div>'
 
 
-def _get_top_photos(region_code, year, limit=10):
-    url = (
-        f"https://media.ebird.org/api/v2/search"
-        f"?regionCode={region_code}&beginYear={year}&endYear={year}"
-        f"&sort=rating_rank_desc&birdOnly=true"
-    )
-    try:
-        from fake_useragent import UserAgent
-
-        ua = UserAgent()
-        header = {"User-Agent": str(ua.chrome)}
-        ss = requests.Session()
-        ss.get(
-            "https://media.ebird.org/catalog",
-            allow_redirects=True,
-            headers=header,
-            timeout=10,
-        )
-        r = ss.get(url, headers=header, timeout=10)
-        r.raise_for_status()
-    except Exception as e:
-        logger.warning(f"Could not fetch photos: {e}")
-        return []
-
+def _copy_media(src_path, media_dir, name):
+    os.makedirs(media_dir, exist_ok=True)
+    dst_path = os.path.join(media_dir, name)
+    if not (
+        os.path.exists(dst_path)
+        and os.path.getsize(dst_path) == os.path.getsize(src_path)
+    ):
+        shutil.copyfile(src_path, dst_path)
+    return f"{os.path.basename(media_dir)}/{name}"
+
+
+def _get_top_photos(photos, media_dir, limit=10, fetcher=None):
+    """Top photos as thumbnail/lightbox derivatives copied into `media_dir`."""
+    photos = photos[:limit]
+    thumbs = derive_photos(photos, "thumb", fetcher=fetcher)
+    full = {
+        p["asset_id"]: p["image_filename"]
+        for p in derive_photos(photos, "lightbox", fetcher=fetcher)
+    }
     results = []
-    used = set()
-    for pd in r.json():
-        if pd["ebirdChecklistId"] in used:
-            continue
-        used.add(pd["ebirdChecklistId"])
-        cdn = f"https://cdn.download.ams.birds.cornell.edu/api/v1/asset/{pd['assetId']}/480"
-        full_cdn = f"https://cdn.download.ams.birds.cornell.edu/api/v1/asset/{pd['assetId']}/1800"
+    for p in thumbs:
+        asset_id = p["asset_id"]
+        if asset_id in full:
+            full_url = _copy_media(full[asset_id], media_dir, f"{asset_id}-full.jpg")
+        else:
+            full_url = get_asset_url(asset_id, 1800)
         results.append(
             {
-                "url": cdn,
-                "full_url": full_cdn,
-                "common_name": pd["taxonomy"]["comName"],
-                "user": pd["userDisplayName"],
-                "rank": len(results) + 1,
+                "url": _copy_media(p["image_filename"], media_dir, f"{asset_id}.jpg"),
+                "full_url": full_url,
+                "common_name": p["common_name"],
+                "user": p["user_display_name"],
+                "rank": p["rank"],
             }
         )
-        if len(results) >= limit:
-            break
     return results
 
 
-# ── Command ───────────────────────────────────────────────────────────────────
+# ── Sections ──────────────────────────────────────────────────────────────────
+
+# Top-level page sections: {section name: (anchor, TOC title)}.  Sections
+# without an entry are rendered as subsections of the one before them.
+PAGE_SECTIONS = {
+    "about": ("about", "About this Document"),
+    "year_in_review": ("year-in-review", "Year in Review"),
+    "most_species_seen": ("most-species", "Most Species Seen"),
+    "breeding": ("breeding", "Most Breeding Species Coded"),
+    "most_efficient": ("efficiency", "Most Efficient Birder"),
+    "most_honest": ("honest", "Most Honest Birder"),
+    "time_in_field": ("time-field", "Most Time Spent in Field"),
+    "month_closeouts": ("month-closeouts", "Month Closeouts"),
+    "month_life_lists": ("month-lists", "Top Month Life Lists"),
+    "clean_sweeps": ("clean-sweeps", "Clean Sweeps"),
+    "birds_eye_view": ("birds-eye", "Bird's-eye View"),
+    "least_reported": (
+        "most-infrequent-visitors-of-the-last-20-years",
+        "Most Infrequent Visitors",
+    ),
+}
 
 
-class Command(BaseCommand):
-    help = "Generate an HTML Annual eBird Statistical Report"
+def sec_open(name, description=None):
+    anchor, title = PAGE_SECTIONS[name]
+    desc = f'<p class="desc">{h(description)}</p>' if description else ""
+    return f'<section class="sec" id="{h(anchor)}"><h2>{h(title)}</h2>{desc}'
+
+
+def _render_about(artifact, photos):
+    return sec_open("about") + (
+        f"<p>This is a summary report of data entered into the eBird database for the "
+        f"<strong>{h(artifact.region_description)}</strong> region, intended for the amusement of area "
+        f"birders. All data comes from the eBird dataset, and as such is self-reported, "
+        f"sometimes does not include older records not yet entered, and is only sometimes "
+        f"reviewed or approved, so any numbers or sightings may be incorrect. Birds marked by "
+        f"eBird reviewers as Exotics and not approved are typically excluded. If you have ideas "
+        f"for additions or have found discrepancies, please email "
+        f'<a href="mailto:scott.stafford@gmail.com">scott.stafford@gmail.com</a>.</p>'
+        f"<p>Source: eBird Basic Dataset. Version: {h(artifact.dataset_version)}. Cornell Lab of Ornithology, Ithaca, New York. {h(dataset_release_date(artifact.dataset_version))}.</p>"
+    )
 
-    def add_arguments(self, parser):
-        parser.add_argument("-r", "--region", default="US-DC-001")
-        parser.add_argument("-y", "--year", default=2020, type=int)
-        parser.add_argument(
-            "--no-photos", action="store_true", help="Skip photo fetching"
-        )
-        parser.add_argument("-o", "--output", default=None, help="Output file path")
 
-    def handle(self, *args, **options):
-        logging.basicConfig(level="DEBUG")
+def _render_year_in_review(artifact, photos):
+    t = artifact.table
+    return sec_open(
+        "year_in_review",
+        description=(
+            f"Basic statistics from eBird for {artifact.region_description}, plus comparisons to "
+            f"recent years. 'All Time' includes all eBird data, but since eBird is more "
+            f"heavily used now, older data becomes increasingly sparse."
+        ),
+    ) + tables_cols(
+        [
+            t("year_stats"),
+            t("new_birds"),
+        ],
+        num_columns=1,
+    )
 
-        region_code = options["region"]
-        year = options["year"]
-        as_of = f"{year}-12-31"
-        version = "v1.1"
 
-        # Determine region where-clause and description
-        parts = region_code.split("-")
-        if len(parts) == 1:
-            region_where_clause = f"country_code = '{region_code}'"
-            rec = EBird.objects.filter(country_code=region_code).first()
-            region_description = rec.country
-        elif len(parts) == 2:
-            region_where_clause = f"state_code = '{region_code}'"
-            rec = EBird.objects.filter(state_code=region_code).first()
-            region_description = f"{rec.state}, {rec.country}"
-        elif len(parts) == 3:
-            region_where_clause = f"county_code = '{region_code}'"
-            rec = EBird.objects.filter(county_code=region_code).first()
-            region_description = (
-                rec.county if rec.county == rec.state else f"{rec.county}, {rec.state}"
-            )
-        else:
-            raise RuntimeError("Unknown region code format")
+def _render_most_species_seen(artifact, photos):
+    t = artifact.table
+    return sec_open(
+        "most_species_seen",
+        description=(
+            "The grand prize: most species seen (as reported to eBird). Only birds identified "
+            "to species are counted — spuhs (e.g., 'gull sp.') and slashes (e.g., "
+            "'Cooper's/Sharp-shinned Hawk') are excluded. Rookies are anyone who had never "
+            "submitted a checklist in the region before the current year."
+        ),
+    ) + tables_cols(
+        [
+            t("top_year_lists.life"),
+            t("top_year_lists.year"),
+            t("top_year_lists.last5"),
+            t("top_year_lists.rookies"),
+        ],
+        num_columns=2,
+        rank_by_colidx=1,
+    )
 
-        # Photos
-        photos = []
-        if not options["no_photos"]:
-            logger.info("Fetching top photos...")
-            photos = _get_top_photos(region_code, year, limit=10)
-
-        # ── Build page ────────────────────────────────────────────────────────
-        toc_items = []
-        sections = []
-
-        def add_sec(anchor, title, body, description=None):
-            toc_items.append((anchor, title))
-            sections.append(sec(anchor, title, body, description))
-
-        # About
-        add_sec(
-            "about",
-            "About this Document",
-            f"<p>This is a summary report of data entered into the eBird database for the "
-            f"<strong>{h(region_description)}</strong> region, intended for the amusement of area "
-            f"birders. All data comes from the eBird dataset, and as such is self-reported, "
-            f"sometimes does not include older records not yet entered, and is only sometimes "
-            f"reviewed or approved, so any numbers or sightings may be incorrect. Birds marked by "
-            f"eBird reviewers as Exotics and not approved are typically excluded. If you have ideas "
-            f"for additions or have found discrepancies, please email "
-            f'<a href="mailto:scott.stafford@gmail.com">scott.stafford@gmail.com</a>.</p>'
-            "<p>Source: eBird Basic Dataset. Version: EBD_relDec-2025. Cornell Lab of Ornithology, Ithaca, New York. Dec 2025.</p>",
+
+def _render_subregions(artifact, photos):
+    t = artifact.table
+    label = subregion_level(artifact.region_code).capitalize()
+    return subsec(
+        f"{label} by {label}",
+        tables_cols(
+            [t("subregion_totals.year"), t("subregion_totals.all")], num_columns=2
         )
+        + tables_cols([t("top_lists_by_subregion.life")], num_columns=1)
+        + tables_cols(split_table(t("top_lists_by_subregion.year")), num_columns=3),
+        description=(
+            f"How each {label.lower()} of the region compares, its top life lister, "
+            f"and its top listers this year."
+        ),
+    )
+
+
+def _render_all_time_bigs(artifact, photos):
+    t = artifact.table
+    bigs_body = tables_in(
+        [
+            t("top_all_time_year_lists"),
+            t("top_all_time_everyone_year_lists"),
+            t("top_all_time_month_lists"),
+            t("top_all_time_everyone_month_lists"),
+            t("top_all_time_day_lists"),
+            t("top_all_time_everyone_day_lists"),
+        ],
+        columns=[2, 2, 2, 2, 2, 2],
+    )
+    return subsec(
+        "Most Species Seen — All-Time Bigs",
+        bigs_body,
+        description=(
+            "The all-time highest Big Year, Month, and Day — the highest species count in "
+            "a single time period. Left: individual records. Right: 'team' records combining "
+            "all checklists posted in the region."
+        ),
+    )
+
+
+def _render_off_time_bigs(artifact, photos):
+    t = artifact.table
+    _, _, month_desc, month_cols, month_data = t("every_month_is_a_big_month")
+    _, _, day_desc, day_cols, day_data = t("every_day_is_a_big_day")
+    offbigs_body = _render_item_list(month_data, "month_big_day") + subsec(
+        "Every Day Is a Big Day",
+        _render_item_list(day_data, "day_big_day"),
+        description=day_desc,
+    )
+    return subsec(
+        "Most Species Seen — Off-time Bigs",
+        offbigs_body,
+        description=month_desc,
+    )
+
+
+def _render_most_species_on_one_list(artifact, photos):
+    one_list = artifact.table("most_species_on_one_list")
+    return subsec(
+        "Most Species Ever on One List",
+        tables_in([one_list], columns=[1]),
+        description=(
+            "Top scores go to individuals with the longest Complete Stationary or Traveling "
+            "lists meeting eBird guidelines (max 3 hours for Stationary, 5 miles for Traveling). "
+            "Observer names link to the checklist."
+        ),
+    )
+
 
-        # Year in Review
-        year_review_body = tables_cols(
+def _render_four_seasons_champ(artifact, photos):
+    fsc = artifact.table("four_seasons_champ")
+    return subsec(
+        fsc[0],
+        tables_in([fsc], columns=[1]),
+        description=fsc[2],
+    )
+
+
+def _render_media(artifact, photos):
+    if not photos:
+        return ""
+    photo_items = "".join(
+        f'<div class="photo-item">'
+        f'<img src="{h(p["url"])}" data-full="{h(p["full_url"])}" alt="{h(p["common_name"])}" loading="lazy">'
+        f'<p>#{p["rank"]}: {h(p["common_name"])} &mdash; {h(p["user"])}</p>'
+        f"</div>"
+        for p in photos
+    )
+    photo_body = f'<div class="photo-grid">{photo_items}</div>'
+    return subsec(
+        "Top-ranked eBird Media",
+        photo_body,
+        description=(
+            "Top photos for the region as ranked by eBird's algorithm based on user ratings."
+        ),
+    )
+
+
+def _render_media_lists(artifact, photos):
+    t = artifact.table
+    return subsec(
+        "Most Species Photographed or Recorded",
+        tables_cols(
             [
-                Queries.year_stats(region_where_clause, as_of=as_of, year=year),
-                Queries.new_birds(region_where_clause, as_of=as_of, year=year),
+                t("top_year_lists.media_life"),
+                t("top_year_lists.media_year"),
+                t("most_seen_birds.media_least_all"),
+                t("most_seen_birds.media_least_year"),
             ],
-            num_columns=1,
-        )
-        add_sec(
-            "year-in-review",
-            "Year in Review",
-            year_review_body,
-            description=(
-                f"Basic statistics from eBird for {region_description}, plus comparisons to "
-                f"recent years. 'All Time' includes all eBird data, but since eBird is more "
-                f"heavily used now, older data becomes increasingly sparse."
-            ),
-        )
-
-        # Most Species Seen
-        species_parts = []
+            num_columns=2,
+        ),
+        description=(
+            "Birders most avidly documenting sightings with photos or sound recordings, "
+            "and birds most frequently (or least frequently) documented."
+        ),
+    )
 
-        species_parts.append(
-            tables_cols(
-                [
-                    Queries.top_year_lists(
-                        region_where_clause, as_of=as_of, limit=20, include_change=True
-                    ),
-                    Queries.top_year_lists(
-                        region_where_clause, as_of=as_of, limit=20, year=year
-                    ),
-                    Queries.top_year_lists(
-                        region_where_clause,
-                        as_of=as_of,
-                        limit=20,
-                        year=year,
-                        last_x_years=5,
-                    ),
-                    Queries.top_year_lists(
-                        region_where_clause,
-                        as_of=as_of,
-                        limit=20,
-                        year=year,
-                        birder_started_on_or_after_year=year,
-                    ),
-                ],
-                num_columns=2,
-                rank_by_colidx=1,
-            )
-        )
 
-        # All-Time Bigs subsection
-        bigs_body = tables_in(
+def _render_dc_wards(artifact, photos):
+    return subsec(
+        "Top Life Lists by DC Ward",
+        tables_cols(
             [
-                Queries.top_all_time_year_lists(
-                    region_where_clause, as_of=as_of, limit=15
-                ),
-                Queries.top_all_time_everyone_year_lists(
-                    region_where_clause, as_of=as_of, limit=15
-                ),
-                Queries.top_all_time_month_lists(
-                    region_where_clause, as_of=as_of, limit=10
-                ),
-                Queries.top_all_time_everyone_month_lists(
-                    region_where_clause, as_of=as_of, limit=10
-                ),
-                Queries.top_all_time_day_lists(
-                    region_where_clause, as_of=as_of, limit=15
-                ),
-                Queries.top_all_time_everyone_day_lists(
-                    region_where_clause, as_of=as_of, limit=15
-                ),
+                artifact.table(f"top_year_lists.ward.{block_name}")
+                for block_name, wkv in sorted(dc_ward_wkv.items())
             ],
-            columns=[2, 2, 2, 2, 2, 2],
-        )
-        species_parts.append(
-            subsec(
-                "Most Species Seen — All-Time Bigs",
-                bigs_body,
-                description=(
-                    "The all-time highest Big Year, Month, and Day — the highest species count in "
-                    "a single time period. Left: individual records. Right: 'team' records combining "
-                    "all checklists posted in the region."
-                ),
-            )
-        )
+            num_columns=3,
+        ),
+    )
 
-        # Off-time Bigs subsection
-        _, _, month_desc, month_cols, month_data = Queries.every_month_is_a_big_month(
-            region_where_clause, as_of=as_of
-        )
-        _, _, day_desc, day_cols, day_data = Queries.every_day_is_a_big_day(
-            region_where_clause, as_of=as_of
-        )
-        offbigs_body = _render_item_list(month_data, "month_big_day") + subsec(
-            "Every Day Is a Big Day",
-            _render_item_list(day_data, "day_big_day"),
-            description=day_desc,
-        )
-        species_parts.append(
-            subsec(
-                "Most Species Seen — Off-time Bigs",
-                offbigs_body,
-                description=month_desc,
-            )
-        )
 
-        # Most Species on One List subsection
-        one_list = Queries.most_species_on_one_list(
-            region_where_clause, max_hours=3, max_miles=5, as_of=as_of, limit=20
-        )
-        species_parts.append(
-            subsec(
-                "Most Species Ever on One List",
-                tables_in([one_list], columns=[1]),
-                description=(
-                    "Top scores go to individuals with the longest Complete Stationary or Traveling "
-                    "lists meeting eBird guidelines (max 3 hours for Stationary, 5 miles for Traveling). "
-                    "Observer names link to the checklist."
-                ),
-            )
+def _render_breeding(artifact, photos):
+    t = artifact.table
+    region_code = artifact.region_code
+    breeding_desc = (
+        "Identifying breeding behaviors and coding them in eBird. "
+        "'Confirmed' birds are worth 3 points, 'Probable' 2, 'Possible' 1. "
+    )
+    if region_code.startswith("US-DC") or region_code.startswith("US-MD"):
+        breeding_desc += (
+            "The 3rd MD/DC Breeding Bird Atlas runs 2020–2025. "
+            "See https://ebird.org/atlasmddc/about. Data is self-reported and unvetted."
         )
 
-        # Four Seasons Championship
-        fsc = Queries.four_seasons_champ(
-            region_where_clause, as_of=as_of, year=year, limit=10
-        )
-        species_parts.append(
-            subsec(
-                fsc[0],
-                tables_in([fsc], columns=[1]),
-                description=fsc[2],
-            )
-        )
+    _, _, coded_people_desc, coded_people_cols, coded_people_data = (
+        t("top_atlas_coded_people")
+    )
+    return sec_open(
+        "breeding", description=breeding_desc
+    ) + tables_cols(
+        [
+            t("top_atlas_year_lists"),
+            t("top_atlas_coded_birds"),
+        ],
+        num_columns=2,
+    ) + subsec(
+        "Most Prone to Public Displays of Affection",
+        _render_item_list(coded_people_data, "default"),
+        description=coded_people_desc,
+    )
 
-        # Top-ranked Photos
-        if photos:
-            photo_items = "".join(
-                f'<div class="photo-item">'
-                f'<img src="{h(p["url"])}" data-full="{h(p["full_url"])}" alt="{h(p["common_name"])}" loading="lazy">'
-                f'<p>#{p["rank"]}: {h(p["common_name"])} &mdash; {h(p["user"])}</p>'
-                f"</div>"
-                for p in photos
-            )
-            photo_body = f'<div class="photo-grid">{photo_items}</div>'
-            species_parts.append(
-                subsec(
-                    "Top-ranked eBird Media",
-                    photo_body,
-                    description=(
-                        "Top photos for the region as ranked by eBird's algorithm based on user ratings."
-                    ),
-                )
-            )
 
-        # Most Species Photographed
-        species_parts.append(
-            subsec(
-                "Most Species Photographed or Recorded",
-                tables_cols(
-                    [
-                        Queries.top_year_lists(
-                            region_where_clause,
-                            as_of=as_of,
-                            with_media=True,
-                            limit=20,
-                            include_change=True,
-                        ),
-                        Queries.top_year_lists(
-                            region_where_clause,
-                            as_of=as_of,
-                            with_media=True,
-                            limit=20,
-                            year=year,
-                        ),
-                        Queries.most_seen_birds(
-                            region_where_clause,
-                            as_of=as_of,
-                            limit=20,
-                            sort="asc",
-                            with_media=True,
-                        ),
-                        Queries.most_seen_birds(
-                            region_where_clause,
-                            as_of=as_of,
-                            year=year,
-                            limit=20,
-                            sort="asc",
-                            with_media=True,
-                        ),
-                    ],
-                    num_columns=2,
-                ),
-                description=(
-                    "Birders most avidly documenting sightings with photos or sound recordings, "
-                    "and birds most frequently (or least frequently) documented."
-                ),
-            )
-        )
+def _render_most_efficient(artifact, photos):
+    return sec_open(
+        "most_efficient",
+        description=(
+            "Most species per hour logged. Includes only complete stationary or traveling "
+            "checklists over 5 minutes. Birders must have at least 10 checklists and 10 hours logged. "
+            "(Yes, this is silly.)"
+        ),
+    ) + tables_in(
+        [
+            artifact.table("most_avg_species_per_hour")
+        ],
+        columns=[1],
+    )
 
-        # DC Wards
-        if region_code == "US-DC-001":
-            species_parts.append(
-                subsec(
-                    "Top Life Lists by DC Ward",
-                    tables_cols(
-                        [
-                            Queries.top_year_lists(
-                                region_where_clause,
-                                as_of=as_of,
-                                limit=10,
-                                block_name=block_name,
-                                wkv=wkv,
-                                include_change=True,
-                                shorten_labels=True,
-                            )
-                            for block_name, wkv in sorted(dc_ward_wkv.items())
-                        ],
-                        num_columns=3,
-                    ),
-                )
-            )
 
-        add_sec(
-            "most-species",
-            "Most Species Seen",
-            "".join(species_parts),
-            description=(
-                "The grand prize: most species seen (as reported to eBird). Only birds identified "
-                "to species are counted — spuhs (e.g., 'gull sp.') and slashes (e.g., "
-                "'Cooper's/Sharp-shinned Hawk') are excluded. Rookies are anyone who had never "
-                "submitted a checklist in the region before the current year."
-            ),
-        )
+def _render_most_honest(artifact, photos):
+    t = artifact.table
+    return sec_open(
+        "most_honest",
+        description=(
+            "Ranked by heavy usage of Slashes (e.g., Cooper's/Sharp-shinned Hawk) and "
+            "Spuhs (e.g., gull sp.). If you never need a slash or spuh, you're lying to "
+            "yourself. 'Unique' is how many different kinds you employed."
+        ),
+    ) + tables_in(
+        [
+            t("most_honest_birder.all"),
+            t("most_honest_birder.year"),
+        ],
+        columns=[2, 2],
+        rank_by_colidx=-2,
+    )
 
-        # Most Breeding Species Coded
-        breeding_desc = (
-            "Identifying breeding behaviors and coding them in eBird. "
-            "'Confirmed' birds are worth 3 points, 'Probable' 2, 'Possible' 1. "
-        )
-        if region_code.startswith("US-DC") or region_code.startswith("US-MD"):
-            breeding_desc += (
-                "The 3rd MD/DC Breeding Bird Atlas runs 2020–2025. "
-                "See https://ebird.org/atlasmddc/about. Data is self-reported and unvetted."
-            )
 
-        _, _, coded_people_desc, coded_people_cols, coded_people_data = (
-            Queries.top_atlas_coded_people(
-                region_where_clause, as_of=as_of, year=year, sort="desc"
-            )
+def _render_time_in_field(artifact, photos):
+    t = artifact.table
+    return sec_open(
+        "time_in_field",
+        description=(
+            "Most time eBirded in the region. 'Days' are 24 hours long. 'Waking' is as a "
+            "percentage of normal waking hours."
+        ),
+    ) + tables_cols(
+        [
+            t("time_spent_in_field.year"),
+            t("time_spent_in_field.last5"),
+        ],
+        num_columns=2,
+        rank_by_colidx=-2,
+    )
+
+
+def _render_month_closeouts(artifact, photos):
+    t = artifact.table
+    _, _, closeout_desc, closeout_cols, closeout_data = (
+        t("top_month_closeout_birds")
+    )
+    # rank_by_colidx must be per-table: all-time has trailing Chg column so
+    # default -1 would rank by Chg instead of Species; total_month_ticks
+    # has a trailing Avg column so -1 would rank by Avg instead of Ticks.
+    closeout_body = (
+        '<div class="tgrid c2">'
+        + _tc(
+            *t("top_month_closeouts.all"),
+            rank_by_colidx=1,
         )
-        breeding_body = tables_cols(
-            [
-                Queries.top_atlas_year_lists(
-                    region_where_clause, as_of=as_of, limit=20, year=year
-                ),
-                Queries.top_atlas_coded_birds(
-                    region_where_clause, as_of=as_of, limit=20, year=year
-                ),
-            ],
-            num_columns=2,
-        ) + subsec(
-            "Most Prone to Public Displays of Affection",
-            _render_item_list(coded_people_data, "default"),
-            description=coded_people_desc,
+        + _tc(
+            *t("top_month_closeouts.year"),
+            rank_by_colidx=-1,
+        )
+        + _tc(
+            *t("top_month_closeouts_best_years"),
+            rank_by_colidx=-1,
         )
-        add_sec(
-            "breeding",
-            "Most Breeding Species Coded",
-            breeding_body,
-            description=breeding_desc,
+        + _tc(
+            *t("total_month_ticks"),
+            rank_by_colidx=1,
         )
+        + "</div>"
+    ) + subsec(
+        "All Month Closeout Birds",
+        _render_item_list(closeout_data, "default"),
+        description=closeout_desc,
+    )
+    return sec_open(
+        "month_closeouts",
+        description=(
+            "A Month Closeout is a bird seen in every month of the year. "
+            "'Ticks' count every bird-month — seeing a Cardinal in all 12 months is 12 ticks."
+        ),
+    ) + closeout_body
+
+
+def _render_month_life_lists(artifact, photos):
+    return sec_open("month_life_lists") + tables_cols(
+        [
+            artifact.table(f"top_year_lists.month.{month}")
+            for month in range(1, 13)
+        ],
+        num_columns=3,
+    )
+
 
-        # Most Efficient Birder
-        add_sec(
-            "efficiency",
-            "Most Efficient Birder",
+def _render_clean_sweeps(artifact, photos):
+    t = artifact.table
+    woodpecker_desc = (
+        "A Clean Sweep means seeing every species on a single checklist. "
+        "Observer names link to the qualifying checklist. "
+        "Species counted: Downy, Hairy, Yellow-bellied Sapsucker, Northern Flicker, "
+        "Pileated, Red-bellied, and Red-headed Woodpecker."
+    )
+    sweep_parts = [
+        subsec(
+            "Picked a Peck of Woodpeckers",
             tables_in(
                 [
-                    Queries.most_avg_species_per_hour(
-                        region_where_clause, as_of=as_of, year=year, limit=15
-                    )
+                    t("woodpecker_clean_sweep.all"),
+                    t("woodpecker_clean_sweep.year"),
                 ],
-                columns=[1],
-            ),
-            description=(
-                "Most species per hour logged. Includes only complete stationary or traveling "
-                "checklists over 5 minutes. Birders must have at least 10 checklists and 10 hours logged. "
-                "(Yes, this is silly.)"
+                columns=[2, 2],
             ),
-        )
-
-        # Most Honest Birder
-        add_sec(
-            "honest",
-            "Most Honest Birder",
+            description=woodpecker_desc,
+        ),
+        subsec(
+            "Warbler-a-palooza",
             tables_in(
                 [
-                    Queries.most_honest_birder(
-                        region_where_clause, as_of=as_of, limit=15
-                    ),
-                    Queries.most_honest_birder(
-                        region_where_clause, as_of=as_of, year=year, limit=15
-                    ),
+                    t("warbler_single_list.all"),
+                    t("warbler_single_list.year"),
                 ],
                 columns=[2, 2],
-                rank_by_colidx=-2,
             ),
             description=(
-                "Ranked by heavy usage of Slashes (e.g., Cooper's/Sharp-shinned Hawk) and "
-                "Spuhs (e.g., gull sp.). If you never need a slash or spuh, you're lying to "
-                "yourself. 'Unique' is how many different kinds you employed."
+                "Most warbler species on a single checklist. "
+                "Warblers: any bird whose name ends in Warbler, Parula, Redstart, "
+                "Yellowthroat, or Waterthrush, plus Ovenbird. Date links to the checklist."
             ),
-        )
+        ),
+    ]
+    return sec_open("clean_sweeps") + "".join(sweep_parts)
+
+
+def _render_birds_eye_view(artifact, photos):
+    t = artifact.table
+    return sec_open(
+        "birds_eye_view",
+        description=(
+            "Birding is a two-way street. Sadly, birds don't eBird, so this data is "
+            "necessarily incomplete. We use people lists to measure how many birders each "
+            "species got to see during the year."
+        ),
+    ) + tables_cols(
+        [
+            t("most_seen_birds.most_year"),
+            t("most_seen_birds.least_year"),
+            t("most_seen_birds.least_last5"),
+        ],
+        num_columns=3,
+    )
 
-        # Most Time in Field
-        add_sec(
-            "time-field",
-            "Most Time Spent in Field",
-            tables_cols(
-                [
-                    Queries.time_spent_in_field(
-                        region_where_clause, as_of=as_of, limit=20, year=year
-                    ),
-                    Queries.time_spent_in_field(
-                        region_where_clause,
-                        as_of=as_of,
-                        limit=20,
-                        year=year,
-                        last_x_years=5,
-                    ),
-                ],
-                num_columns=2,
-                rank_by_colidx=-2,
-            ),
-            description=(
-                "Most time eBirded in the region. 'Days' are 24 hours long. 'Waking' is as a "
-                "percentage of normal waking hours."
-            ),
-        )
 
-        # Month Closeouts
-        _, _, closeout_desc, closeout_cols, closeout_data = (
-            Queries.top_month_closeout_birds(region_where_clause, as_of=as_of)
-        )
-        # rank_by_colidx must be per-table: all-time has trailing Chg column so
-        # default -1 would rank by Chg instead of Species; total_month_ticks
-        # has a trailing Avg column so -1 would rank by Avg instead of Ticks.
-        closeout_body = (
-            '<div class="tgrid c2">'
-            + _tc(
-                *Queries.top_month_closeouts(
-                    region_where_clause, as_of=as_of, limit=20
-                ),
-                rank_by_colidx=1,
-            )
-            + _tc(
-                *Queries.top_month_closeouts(
-                    region_where_clause, as_of=as_of, year=year, limit=20
-                ),
-                rank_by_colidx=-1,
-            )
-            + _tc(
-                *Queries.top_month_closeouts_best_years(
-                    region_where_clause, as_of=as_of, limit=20
-                ),
-                rank_by_colidx=-1,
-            )
-            + _tc(
-                *Queries.total_month_ticks(region_where_clause, as_of=as_of, limit=20),
-                rank_by_colidx=1,
-            )
-            + "</div>"
-        ) + subsec(
-            "All Month Closeout Birds",
-            _render_item_list(closeout_data, "default"),
-            description=closeout_desc,
-        )
-        add_sec(
-            "month-closeouts",
-            "Month Closeouts",
-            closeout_body,
-            description=(
-                "A Month Closeout is a bird seen in every month of the year. "
-                "'Ticks' count every bird-month — seeing a Cardinal in all 12 months is 12 ticks."
-            ),
-        )
-
-        # Top Month Life Lists
-        add_sec(
-            "month-lists",
-            "Top Month Life Lists",
-            tables_cols(
-                [
-                    Queries.top_year_lists(
-                        region_where_clause,
-                        as_of=as_of,
-                        limit=10,
-                        month=month,
-                        include_change=True,
-                        shorten_labels=True,
-                    )
-                    for month in range(1, 13)
-                ],
-                num_columns=3,
-            ),
-        )
+def _render_least_reported(artifact, photos):
+    # The heading and anchor come from the table itself, as in table_sec.
+    title, subtitle, description, column_desc, data = artifact.table(
+        "least_reported_birds"
+    )
+    desc = f'<p class="desc">{h(description)}</p>' if description else ""
+    return (
+        f'<section class="sec" id="{h(PAGE_SECTIONS["least_reported"][0])}"><h2>{h(title)}</h2>{desc}'
+        + _render_table(column_desc, data, rank_by_colidx=-1, hline_every=5)
+    )
 
-        # Clean Sweeps
-        woodpecker_desc = (
-            "A Clean Sweep means seeing every species on a single checklist. "
-            "Observer names link to the qualifying checklist. "
-            "Species counted: Downy, Hairy, Yellow-bellied Sapsucker, Northern Flicker, "
-            "Pileated, Red-bellied, and Red-headed Woodpecker."
-        )
-        sweep_parts = [
-            subsec(
-                "Picked a Peck of Woodpeckers",
-                tables_in(
-                    [
-                        Queries.woodpecker_clean_sweep(
-                            region_where_clause, as_of=as_of
-                        ),
-                        Queries.woodpecker_clean_sweep(
-                            region_where_clause, as_of=as_of, year=year
-                        ),
-                    ],
-                    columns=[2, 2],
-                ),
-                description=woodpecker_desc,
-            ),
-            subsec(
-                "Warbler-a-palooza",
-                tables_in(
-                    [
-                        Queries.warbler_single_list(
-                            region_where_clause, as_of=as_of
-                        ),
-                        Queries.warbler_single_list(
-                            region_where_clause, as_of=as_of, year=year
-                        ),
-                    ],
-                    columns=[2, 2],
-                ),
-                description=(
-                    "Most warbler species on a single checklist. "
-                    "Warblers: any bird whose name ends in Warbler, Parula, Redstart, "
-                    "Yellowthroat, or Waterthrush, plus Ovenbird. Date links to the checklist."
-                ),
-            ),
-        ]
-        add_sec("clean-sweeps", "Clean Sweeps", "".join(sweep_parts))
-
-        # Bird's-eye View
-        add_sec(
-            "birds-eye",
-            "Bird's-eye View",
-            tables_cols(
-                [
-                    Queries.most_seen_birds(
-                        region_where_clause,
-                        as_of=as_of,
-                        year=year,
-                        limit=25,
-                        sort="desc",
-                    ),
-                    Queries.most_seen_birds(
-                        region_where_clause,
-                        as_of=as_of,
-                        year=year,
-                        limit=25,
-                        sort="asc",
-                    ),
-                    Queries.most_seen_birds(
-                        region_where_clause,
-                        as_of=as_of,
-                        limit=25,
-                        sort="asc",
-                        year=year,
-                        last_x_years=5,
-                    ),
-                ],
-                num_columns=3,
-            ),
-            description=(
-                "Birding is a two-way street. Sadly, birds don't eBird, so this data is "
-                "necessarily incomplete. We use people lists to measure how many birders each "
-                "species got to see during the year."
-            ),
-        )
 
-        # Most Infrequent Visitors
-        sections.append(
-            table_sec(
-                Queries.least_reported_birds(
-                    region_where_clause, as_of=as_of, year=year, last_x_years=20
-                )
-            )
-        )
-        toc_items.append(
-            (
-                "most-infrequent-visitors-of-the-last-20-years",
-                "Most Infrequent Visitors",
-            )
-        )
+def _page_parents(section_names):
+    """Map each section to the top-level page section it is rendered in."""
+    parents = {}
+    parent = None
+    for name in section_names:
+        if name in PAGE_SECTIONS:
+            parent = name
+        parents[name] = parent
+    return parents
+
+
+def iter_report_html(
+    artifact, sections=None, photos=(), version="v1.1", release=False
+):
+    """Yield the HTML report in chunks, computing each section as it goes.
+
+    The head, cover and table of contents (from the declared section list)
+    come first, then each section as soon as its data is available, so the
+    output can be written progressively to a file or returned as a Django
+    `StreamingHttpResponse`.  With `release`, each section's tables are
+    dropped from the artifact once rendered, so memory holds one section at
+    a time; only use it when the artifact won't be saved.
+    """
+    sections = sections or list(artifact.sections)
+    parents = _page_parents(artifact.sections)
+    toc_names = []
+    for name in sections:
+        if parents[name] and parents[name] not in toc_names:
+            toc_names.append(parents[name])
+    toc_html = "\n".join(
+        f'<li><a href="#{h(PAGE_SECTIONS[name][0])}">{h(PAGE_SECTIONS[name][1])}</a></li>'
+        for name in toc_names
+    )
 
-        # ── Assemble HTML ─────────────────────────────────────────────────────
-        toc_html = "\n".join(
-            f'<li><a href="#{h(anchor)}">{h(title)}</a></li>'
-            for anchor, title in toc_items
+    year = artifact.year
+    region_description = artifact.region_description
+    cover_photo_html = ""
+    if photos:
+        p = photos[0]
+        cover_photo_html = (
+            f'<img class="cover-photo" src="{h(p["url"])}" alt="{h(p["common_name"])}">'
+            f'<p class="cover-caption">Top-rated photo: {h(p["common_name"])} — ©{year} {h(p["user"])}</p>'
         )
 
-        cover_photo_html = ""
-        if photos:
-            p = photos[0]
-            cover_photo_html = (
-                f'<img class="cover-photo" src="{h(p["url"])}" alt="{h(p["common_name"])}">'
-                f'<p class="cover-caption">Top-rated photo: {h(p["common_name"])} — ©{year} {h(p["user"])}</p>'
-            )
-
-        page_title = f"{year} Annual eBird Statistical Report — {region_description}"
+    page_title = f"{year} Annual eBird Statistical Report — {region_description}"
 
-        html_out = f"""<!DOCTYPE html>
+    yield f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8">
@@ -1013,36 +874,181 @@ class Command(BaseCommand):
     <ol>{toc_html}</ol>
   </nav>
   <main>
-    {"".join(sections)}
+    """
+
+    open_parent = None
+    for name in sections:
+        if name in PAGE_SECTIONS or parents[name] != open_parent:
+            if open_parent:
+                yield "</section>\n"
+            open_parent = parents[name]
+            if name not in PAGE_SECTIONS and open_parent:
+                # A subsection selected without its page section.
+                yield sec_open(open_parent)
+        artifact.compute([name])
+        with span(name, cat="render"):
+            chunk = globals()[f"_render_{name}"](artifact, photos)
+        if release:
+            artifact.release(name)
+        yield chunk
+    if open_parent:
+        yield "</section>\n"
+
+    yield """
   </main>
 </div>
 
 <div id="lb"><img id="lb-img" src="" alt=""></div>
 <script>
-(function(){{
+(function(){
   var lb = document.getElementById('lb');
   var lbImg = document.getElementById('lb-img');
-  document.querySelectorAll('.photo-item img').forEach(function(img) {{
-    img.addEventListener('click', function() {{
+  document.querySelectorAll('.photo-item img').forEach(function(img) {
+    img.addEventListener('click', function() {
       lbImg.src = img.dataset.full;
       lbImg.alt = img.alt;
       lb.classList.add('open');
-    }});
-  }});
-  lb.addEventListener('click', function() {{ lb.classList.remove('open'); }});
-  document.addEventListener('keydown', function(e) {{ if (e.key === 'Escape') lb.classList.remove('open'); }});
-}})();
+    });
+  });
+  lb.addEventListener('click', function() { lb.classList.remove('open'); });
+  document.addEventListener('keydown', function(e) { if (e.key === 'Escape') lb.classList.remove('open'); });
+})();
 </script>
 </body>
 </html>
 """
 
+
+# ── Command ───────────────────────────────────────────────────────────────────
+
+
+class Command(BaseCommand):
+    help = "Generate an HTML Annual eBird Statistical Report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-r", "--region", default="US-DC-001")
+        parser.add_argument("-y", "--year", default=2020, type=int)
+        parser.add_argument(
+            "--no-photos", action="store_true", help="Skip photo fetching"
+        )
+        parser.add_argument("-o", "--output", default=None, help="Output file path")
+        parser.add_argument(
+            "--offline", action="store_true", help="Only use cached media"
+        )
+        parser.add_argument(
+            "--artifact",
+            default=None,
+            help="Render from this report artifact (computed and saved there if missing)",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Also run every query under EXPLAIN (ANALYZE, BUFFERS) and save the plans as <output>.plans.json",
+        )
+        parser.add_argument(
+            "--explain-baseline",
+            default=None,
+            help="Plans file to diff --explain against (default: the previous <output>.plans.json)",
+        )
+        parser.add_argument(
+            "--trace",
+            default=None,
+            help="Chrome trace output path (default <output>.trace.json)",
+        )
+        parser.add_argument(
+            "--as-of", default=None, help="Only include data up to this date"
+        )
+        parser.add_argument(
+            "--dataset-version",
+            default=None,
+            help="EBD release loaded in the database, eg EBD_relDec-2025",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            help="Only render these sections (comma-separated, repeatable)",
+        )
+        parser.add_argument(
+            "--skip",
+            action="append",
+            help="Skip these sections (comma-separated, repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="DEBUG")
+
+        region_code = options["region"]
+        year = options["year"]
+        version = "v1.1"
+
+        try:
+            sections = select_sections(
+                list(report_sections(region_code, year)),
+                only=options["only"],
+                skip=options["skip"],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        instrumentation.start_run()
+        if options["explain"]:
+            explain.start_capture()
+        fetcher = MediaFetcher(offline=options["offline"])
+        artifact = open_report(
+            region_code,
+            year,
+            # Sections loaded from the artifact would never reach the database.
+            path=None if options["explain"] else options["artifact"],
+            as_of=options["as_of"],
+            dataset_version=options["dataset_version"],
+        )
+        region_description = artifact.region_description
+
         filename = (
             options["output"]
             or f"{year} Annual eBird Statistical Report - {region_code} - {region_description} - {version}.html"
         )
+
+        # Photos
+        photos = []
+        if not options["no_photos"] and "media" in sections:
+            logger.info("Fetching top photos...")
+            photos = _get_top_photos(
+                artifact.compute_photos(fetcher=fetcher),
+                media_dir=os.path.splitext(filename)[0] + "_files",
+                limit=10,
+                fetcher=fetcher,
+            )
+
+        # Sections are written as they're computed, so a partial file shows
+        # progress.  Unless the artifact is saved afterwards, each section's
+        # tables are dropped once written, so memory holds one section at a time.
+        save = options["artifact"] and not options["explain"]
         with open(filename, "w", encoding="utf-8") as f:
-            f.write(html_out)
+            for chunk in iter_report_html(
+                artifact,
+                sections=sections,
+                photos=photos,
+                version=version,
+                release=not save,
+            ):
+                f.write(chunk)
+                f.flush()
+
+        # With --explain the artifact was computed from scratch, and may hold
+        # only some sections: it mustn't replace the one on disk.
+        if save and artifact.modified:
+            artifact.save(options["artifact"])
+        filename_base = os.path.splitext(filename)[0]
+        if options["explain"]:
+            capture = explain.finish_capture(
+                f"{filename_base}.plans.json", baseline=options["explain_baseline"]
+            )
+            self.stdout.write(capture.report())
+        tracer = instrumentation.finish_run(
+            options["trace"] or f"{filename_base}.trace.json"
+        )
+        self.stdout.write(tracer.summary())
 
         print(f"Written: {filename}")
         logger.info(f'"{filename}"')
@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+Compute the year-so-far leaderboards and save them as a report artifact.
+Usage: python manage.py year_to_date_report -r US-DC-001 -o ytd.json
+
+Run it after each delta load.  The leaderboard data is kept in a state file
+(--state) and only the rows edited since the previous run are merged into it
+(see `ebirdcore.ytd`), so a refresh costs about as much as the new data.
+Render the artifact with `year_end_report_html --artifact ytd.json` (or the
+PDF command) with the same region and year.
+"""
+
+import datetime
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ebirdcore import bitmaps, instrumentation
+from ebirdcore.report_artifact import (
+    load_or_compute_report,
+    report_sections,
+    select_sections,
+)
+from ebirdcore.utils import parse_region_code
+from ebirdcore.ytd import YTD_SECTIONS, load_or_refresh
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute year-to-date leaderboards incrementally"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-r", "--region", default="US-DC-001")
+        parser.add_argument(
+            "--as-of", default=None, help="Include data up to this date (default today)"
+        )
+        parser.add_argument("-o", "--output", default=None, help="Artifact path")
+        parser.add_argument(
+            "--state",
+            default=None,
+            help="Incremental state path (default ytd-<region>.npz)",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Rebuild the state from scratch instead of merging new rows",
+        )
+        parser.add_argument(
+            "--dataset-version",
+            default=None,
+            help="EBD release loaded in the database, eg EBD_relDec-2025",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            help=f"Only compute these sections (default {','.join(YTD_SECTIONS)})",
+        )
+        parser.add_argument(
+            "--skip",
+            action="append",
+            help="Skip these sections (comma-separated, repeatable)",
+        )
+        parser.add_argument("--trace", default=None, help="Chrome trace output path")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level="INFO")
+
+        region_code = options["region"]
+        as_of = options["as_of"] or datetime.date.today().isoformat()
+        year = int(as_of[:4])
+        filename = (
+            options["output"] or f"{year} Year to Date eBird Report - {region_code}.json"
+        )
+        try:
+            sections = select_sections(
+                list(report_sections(region_code, year)),
+                only=options["only"] or YTD_SECTIONS,
+                skip=options["skip"],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        instrumentation.start_run()
+        region = parse_region_code(region_code)
+        state = load_or_refresh(
+            options["state"] or f"ytd-{region_code}.npz",
+            region["where_clause"],
+            as_of,
+            rebuild=options["rebuild"],
+        )
+        with bitmaps.pin(region["where_clause"], as_of, state.extractions()):
+            load_or_compute_report(
+                region_code,
+                year,
+                path=filename,
+                region=region,
+                with_photos=False,
+                as_of=as_of,
+                dataset_version=options["dataset_version"],
+                sections=sections,
+            )
+        self.stdout.write(instrumentation.finish_run(options["trace"]).summary())
+
+        print(f"Written: {filename}")
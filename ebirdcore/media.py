@@ -0,0 +1,317 @@
+"""
+Fetching and caching of eBird media (top-ranked photos).
+
+Assets are stored content-addressed under `MEDIA_CACHE_DIR/blobs`, with an
+index keyed by (assetId, size) so reruns never hit the network for an asset
+that has already been downloaded.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from diskcache import Cache
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = "cache_media"
+SEARCH_URL = (
+    "https://media.ebird.org/api/v2/search"
+    "?regionCode={region_code}&beginYear={year}&endYear={year}"
+    "&sort=rating_rank_desc&birdOnly=true"
+)
+CATALOG_URL = "https://media.ebird.org/catalog"
+ASSET_URL = "https://cdn.download.ams.birds.cornell.edu/api/v1/asset/{asset_id}/{size}"
+
+# (connect, read) timeouts for every request.
+DEFAULT_TIMEOUT = (5, 30)
+MAX_WORKERS = 8
+# Ranked search results are re-fetched at most once a day unless offline.
+SEARCH_MAX_AGE = 24 * 60 * 60
+
+
+# Derivatives produced per output target:
+#   name: (source asset size, max long edge in px, JPEG quality, progressive)
+# "pdf" figures print at 2.35in wide (the cover at 5in), "thumb" is the HTML
+# grid image and "lightbox" the HTML full-size view.
+MEDIA_TARGETS = {
+    "pdf": (480, 480, 80, False),
+    "thumb": (480, 400, 75, True),
+    "lightbox": (1800, 1600, 80, True),
+}
+
+
+def get_asset_url(asset_id, size=480):
+    return ASSET_URL.format(asset_id=asset_id, size=size)
+
+
+class MediaFetcher:
+    """Downloads media assets concurrently into a content-addressed cache.
+
+    `offline` only ever returns what is already cached; `revalidate` sends a
+    conditional request (ETag / Last-Modified) for assets already on disk.
+    """
+
+    def __init__(
+        self,
+        cache_dir=MEDIA_CACHE_DIR,
+        offline=False,
+        revalidate=False,
+        max_workers=MAX_WORKERS,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.cache_dir = cache_dir
+        # Forward slashes keep cached paths usable from LaTeX on every platform.
+        self.blob_dir = f"{cache_dir}/blobs"
+        self.offline = offline
+        self.revalidate = revalidate
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.index = Cache(os.path.join(cache_dir, "index"))
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            ss = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.max_workers, pool_maxsize=self.max_workers
+            )
+            ss.mount("https://", adapter)
+            ss.mount("http://", adapter)
+            try:
+                from fake_useragent import UserAgent
+
+                ss.headers["User-Agent"] = str(UserAgent().chrome)
+            except ImportError:
+                pass
+            self._session = ss
+        return self._session
+
+    def _blob_path(self, digest, ext=".jpg"):
+        return f"{self.blob_dir}/{digest[:2]}/{digest}{ext}"
+
+    def search(self, region_code, year):
+        """Return the ranked search results for a region/year, cached on disk."""
+        key = ("search", region_code, year)
+        cached = self.index.get(key)
+        if cached and (
+            self.offline or time.time() - cached["fetched"] < SEARCH_MAX_AGE
+        ):
+            return cached["results"]
+        if self.offline:
+            logger.warning(f"No cached media search for {region_code} {year}.")
+            return []
+
+        url = SEARCH_URL.format(region_code=region_code, year=year)
+        logger.debug(f"...fetching {url}")
+        # The search API refuses requests that haven't visited the catalog first.
+        self.session.get(CATALOG_URL, allow_redirects=True, timeout=self.timeout)
+        r = self.session.get(url, timeout=self.timeout)
+        r.raise_for_status()
+        results = r.json()
+        self.index.set(key, {"fetched": time.time(), "results": results})
+        return results
+
+    def fetch(self, asset_id, size=480, url=None):
+        """Return the local path of an asset, downloading it if needed.
+
+        Returns None if the asset is unavailable (or not cached, when offline).
+        """
+        key = ("asset", asset_id, size)
+        entry = self.index.get(key)
+        if entry and not os.path.exists(entry["path"]):
+            entry = None
+
+        if entry and (self.offline or not self.revalidate):
+            return entry["path"]
+        if self.offline:
+            return None
+
+        url = url or get_asset_url(asset_id, size)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            r = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Could not fetch asset {asset_id}: {e}")
+            return entry["path"] if entry else None
+
+        with r:
+            if r.status_code == 304 and entry:
+                return entry["path"]
+            if r.status_code != 200:
+                logger.warning(f"Asset {asset_id} returned HTTP {r.status_code}.")
+                return None
+            path = self._store(r)
+
+        self.index.set(
+            key,
+            {
+                "path": path,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "fetched": time.time(),
+            },
+        )
+        return path
+
+    def _store(self, response):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir)
+        try:
+            with os.fdopen(fd, "wb") as out_file:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    digest.update(chunk)
+                    out_file.write(chunk)
+            path = self._blob_path(digest.hexdigest())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def fetch_many(self, asset_ids, size=480):
+        """Fetch several assets concurrently; returns {asset_id: path or None}."""
+        asset_ids = list(asset_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            paths = executor.map(lambda a: self.fetch(a, size=size), asset_ids)
+            return dict(zip(asset_ids, paths))
+
+
+def _make_derivative(src_path, dst_path, max_px, quality, progressive):
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_px, max_px), Image.LANCZOS)
+        tmp_path = dst_path + ".tmp"
+        # pdfLaTeX embeds JPEGs byte-for-byte, so baseline + optimized tables
+        # is what keeps the PDF small.
+        img.save(
+            tmp_path,
+            "JPEG",
+            quality=quality,
+            optimize=True,
+            progressive=progressive,
+        )
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+def derive_many(sources, target, cache_dir=MEDIA_CACHE_DIR, max_workers=None):
+    """Produce right-sized derivatives of cached assets for an output target.
+
+    `sources` maps asset_id to the path of its source asset.  Derivatives are
+    cached by asset id, source content and size, and missing ones are encoded
+    in a process pool.  Returns {asset_id: derivative path}.
+    """
+    _, max_px, quality, progressive = MEDIA_TARGETS[target]
+    derived_dir = f"{cache_dir}/derived"
+    os.makedirs(derived_dir, exist_ok=True)
+
+    ret = {}
+    todo = {}
+    for asset_id, src_path in sources.items():
+        digest = os.path.splitext(os.path.basename(src_path))[0][:12]
+        dst_path = f"{derived_dir}/{asset_id}-{digest}-{max_px}q{quality}.jpg"
+        ret[asset_id] = dst_path
+        if not os.path.exists(dst_path):
+            todo[asset_id] = (src_path, dst_path)
+
+    if todo:
+        logger.debug(f"Encoding {len(todo)} {target} derivatives...")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                asset_id: executor.submit(
+                    _make_derivative, src, dst, max_px, quality, progressive
+                )
+                for asset_id, (src, dst) in todo.items()
+            }
+            for asset_id, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning(f"Could not process asset {asset_id}: {e}")
+                    ret[asset_id] = sources[asset_id]
+    return ret
+
+
+def derive_photos(photos, target, fetcher=None):
+    """Point each photo's `image_filename` at its derivative for `target`.
+
+    Photos whose source asset is not the one the target derives from are
+    fetched at the right size first.
+    """
+    source_size = MEDIA_TARGETS[target][0]
+    fetcher = fetcher or MediaFetcher()
+    sources = fetcher.fetch_many([p["asset_id"] for p in photos], size=source_size)
+    sources = {a: path for a, path in sources.items() if path}
+    derived = derive_many(sources, target, cache_dir=fetcher.cache_dir)
+    ret = []
+    for photo_data in photos:
+        if photo_data["asset_id"] in derived:
+            photo_data = dict(
+                photo_data, image_filename=derived[photo_data["asset_id"]]
+            )
+            ret.append(photo_data)
+    return ret
+
+
+def get_top_ranked_photos(
+    region_code, year, limit=10, size=480, fetcher=None, download=True
+):
+    """Return up to `limit` top-ranked photos for a region/year, one per checklist.
+
+    With `download`, each result includes the local `image_filename` of the
+    cached asset, and assets that fail to download are replaced by the next
+    ranked ones.
+    """
+    fetcher = fetcher or MediaFetcher()
+    try:
+        results = fetcher.search(region_code, year)
+    except Exception as e:
+        logger.warning(f"Could not fetch photos: {e}")
+        return []
+
+    candidates = []
+    used_checklists = set()
+    for photo_data in results:
+        if photo_data["ebirdChecklistId"] in used_checklists:
+            continue
+        used_checklists.add(photo_data["ebirdChecklistId"])
+        candidates.append(photo_data)
+
+    responses = []
+    while candidates and len(responses) < limit:
+        batch, candidates = candidates[:limit], candidates[limit:]
+        if download:
+            paths = fetcher.fetch_many([p["assetId"] for p in batch], size=size)
+        for photo_data in batch:
+            if len(responses) >= limit:
+                break
+            rsp = {
+                "asset_id": photo_data["assetId"],
+                "rank": len(responses) + 1,
+                "user_display_name": photo_data["userDisplayName"],
+                "common_name": photo_data["taxonomy"]["comName"],
+            }
+            if download:
+                if paths[photo_data["assetId"]] is None:
+                    continue
+                rsp["image_filename"] = paths[photo_data["assetId"]]
+            responses.append(rsp)
+    return responses
@@ -1,9 +1,3 @@
-import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
-import pandas as pd
-
-
 def heatmap(
     data,
     row_labels,
@@ -35,6 +29,8 @@ def heatmap(
     **kwargs
         All other arguments are forwarded to `imshow`.
     """
+    import matplotlib.pyplot as plt
+    import numpy as np
 
     if not ax:
         ax = plt.gca()
@@ -105,6 +101,8 @@ def annotate_heatmap(
         All other arguments are forwarded to each call to `text` used to create
         the text labels.
     """
+    import matplotlib.ticker
+    import numpy as np
 
     if not isinstance(data, (list, np.ndarray)):
         data = im.get_array()
@@ -0,0 +1,1211 @@
+"""
+The report's queries, apart from the LaTeX and HTML renderers.
+
+Each `Queries` method returns a table as (title, subtitle, description,
+columns, rows); the report sections (see `ebirdcore.report_artifact`) name
+the methods they call.  This module is imported by every report command, so
+it doesn't import numpy (via `ebirdcore.bitmaps`) until a query needs it.
+"""
+import calendar
+import datetime
+import logging
+
+from django.contrib.gis.geos import GEOSGeometry
+
+from ebirdcore.challenges import challenge_table
+from ebirdcore.sql_utils import FakeColumn, execute_query
+from ebirdcore.utils import add_years
+
+logger = logging.getLogger(__name__)
+
+
+def species_bitmaps(region_where_clause, as_of, with_media=False):
+    from ebirdcore.bitmaps import species_bitmaps
+
+    return species_bitmaps(region_where_clause, as_of, with_media)
+
+
+def day_lists(region_where_clause, as_of):
+    from ebirdcore.bitmaps import day_lists
+
+    return day_lists(region_where_clause, as_of)
+
+
+def comma_join(lst):
+    if isinstance(lst, int):
+        return str(lst)
+    return ", ".join([str(_) for _ in lst])
+
+
+def _get_full_where_clause(
+    region_where_clause, as_of, year=None, month=None, last_x_years=None
+):
+    where = ""
+    if year is not None:
+        title = f"Year List"
+        if last_x_years:
+            subtitle = f"{year-last_x_years+1}-{year}"
+            where += (
+                f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+            )
+        else:
+            subtitle = f"{year}"
+            where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+    elif month is not None:
+        where += f" AND extract(month from OBSERVATION_DATE) = {month}"
+        title = f"Month Life List ({calendar.month_abbr[month]})"
+        subtitle = calendar.month_abbr[month]
+    else:
+        title = f"Life List"
+        subtitle = "All Time"
+
+    full_where = f"""
+        where {region_where_clause}
+        and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+        and not (approved = 'f' and reviewed = 't')
+        and (exotic_code is null or exotic_code in ('N'))
+        and observation_date <= '{as_of}'
+        {where}
+        """
+    return full_where
+
+
+class Queries:
+    @staticmethod
+    def year_stats(
+        region_where_clause,
+        as_of,
+        limit=10,
+        year=None,
+        month=None,
+        last_x_years=None,
+    ):
+        title = ""
+        subtitle = title
+        logger.debug(f"Generating {title}...")
+
+        cols = [
+            FakeColumn("", 25),
+            FakeColumn(str(year - 4), 20),
+            FakeColumn(str(year - 3), 20),
+            FakeColumn(str(year - 2), 20),
+            FakeColumn(str(year - 1), 20),
+            FakeColumn(str(year), 20),
+            FakeColumn("All Time", 20),
+        ]
+
+        data = []
+
+        def add_to_table(title, where_clauses, sql_template):
+            vals = []
+            for where in where_clauses:
+                logger.debug(f"Generating {title} ({where_clauses[0]})...")
+                sql = sql_template.format(where=where)
+                cols, val = execute_query(sql)
+                vals.append(val[0][0])
+            data.append([title] + vals)
+
+        where_clauses = [
+            _get_full_where_clause(
+                region_where_clause, as_of, year - 4, month, last_x_years
+            ),
+            _get_full_where_clause(
+                region_where_clause, as_of, year - 3, month, last_x_years
+            ),
+            _get_full_where_clause(
+                region_where_clause, as_of, year - 2, month, last_x_years
+            ),
+            _get_full_where_clause(
+                region_where_clause, as_of, year - 1, month, last_x_years
+            ),
+            _get_full_where_clause(
+                region_where_clause, as_of, year, month, last_x_years
+            ),
+            _get_full_where_clause(
+                region_where_clause, as_of, None, month, last_x_years
+            ),
+        ]
+        add_to_table(
+            "Birders",
+            where_clauses,
+            """select count(distinct observer_id) from ebird {where}""",
+        )
+        add_to_table(
+            "Species",
+            where_clauses,
+            """select count(distinct common_name) from ebird {where}""",
+        )
+        add_to_table(
+            "Lists",
+            where_clauses,
+            """select count(distinct SAMPLING_EVENT_IDENTIFIER) from ebird {where}""",
+        )
+        add_to_table(
+            "Time Logged in Field (in Days)",
+            where_clauses,
+            # """select round(sum(duration_minutes)/60.0/24.0, 1) from ebird {where}""",
+            """select round(sum(cnt),1) from (select max(duration_minutes)/60.0/24.0 as cnt from ebird {where} group by SAMPLING_EVENT_IDENTIFIER) t""",
+        )
+        add_to_table(
+            "Individual Birds",
+            where_clauses,
+            """select sum(cnt) from (select max(observation_count) as cnt from ebird {where} group by SAMPLING_EVENT_IDENTIFIER) t""",
+        )
+
+        # add_to_table(
+        #     "Individual Birds",
+        #     f"""select sum(cnt) as "Individuals" from (select max(observation_count) as cnt from ebird {_get_full_where_clause(region_where_clause, as_of, year-1, month, last_x_years)} group by SAMPLING_EVENT_IDENTIFIER) t""",
+        #     f"""select sum(cnt) as "Individuals" from (select max(observation_count) as cnt from ebird {_get_full_where_clause(region_where_clause, as_of, year, month, last_x_years)} group by SAMPLING_EVENT_IDENTIFIER) t""",
+        #     f"""select sum(cnt) as "Individuals" from (select max(observation_count) as cnt from ebird {_get_full_where_clause(region_where_clause, as_of, None, month, last_x_years)} group by SAMPLING_EVENT_IDENTIFIER) t""",
+        # )  # cols, data = execute_query(sql)
+        # breakpoint()
+
+        return title, subtitle, None, cols, data
+
+    @staticmethod
+    def top_year_lists(
+        region_where_clause,
+        as_of,
+        limit=10,
+        year=None,
+        month=None,
+        with_media=False,
+        last_x_years=None,
+        birder_started_on_or_after_year=None,
+        block_name=None,
+        wkv=None,
+        sort="desc",
+        include_change=False,
+        shorten_labels=False,
+    ):
+        where = ""
+        if year is not None:
+            title = f"Year List"
+            if last_x_years:
+                subtitle = f"{year-last_x_years+1}-{year} (Last 5 Years)"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle = f"{year}"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        elif month is not None:
+            where += f" AND extract(month from OBSERVATION_DATE) = {month}"
+            title = f"Month Life List ({calendar.month_abbr[month]})"
+            subtitle = calendar.month_abbr[month]
+        else:
+            title = f"Life List"
+            subtitle = "All Time"
+
+        if with_media:
+            where += f" AND has_media = 't'"
+            title += " w/ Photo/Audio"
+            # subtitle = " w/ Photo/Audio"
+
+        if birder_started_on_or_after_year:
+            where += f" AND observer_id not in (select distinct observer_id from ebird where {region_where_clause} and OBSERVATION_DATE < '{birder_started_on_or_after_year}-01-01')"
+            subtitle += " (Rookies)"
+
+        if block_name and wkv:
+            block_geog = GEOSGeometry(wkv)
+            where += f" and ST_Intersects(geog, ST_GeomFromEWKT('{block_geog.ewkt}'))"
+            subtitle = f" {block_name}"
+            title += f" {block_name}"
+
+        prev_as_of = add_years(datetime.date(*map(int, as_of.split("-"))), -1).strftime(
+            "%Y-%m-%d"
+        )
+        if include_change:
+            _term = f"(count(t.common_name) - ( count(t.common_name) filter (where min_obs_date <= '{prev_as_of}') ) )"
+            change_sql = f""",
+                case when ({_term} > 0) then concat('+', {_term}::text)
+                when ({_term} = 0) then '-'
+                else ({_term})::text end as "Chg"
+            """
+        else:
+            change_sql = ""
+
+        species_label = "Species" if not shorten_labels else "Sp."
+        if not block_name:
+            # Blocks need more than the (observer, species, year, month) tuples
+            # the bitmaps are built from, so they stay in SQL.  Rookies are
+            # observers whose first countable observation is this year or later.
+            logger.debug(f"Generating {title}...")
+            a, b = species_bitmaps(region_where_clause, as_of, with_media).top_year_lists(
+                limit=limit,
+                year=year,
+                month=month,
+                last_x_years=last_x_years,
+                sort=sort,
+                prev_as_of=prev_as_of if include_change else None,
+                species_label=species_label,
+                started_on_or_after_year=birder_started_on_or_after_year,
+            )
+            return title, subtitle, None, a, b
+
+        sql = f"""
+select get_observer_name(t.observer_id) as "Observer",
+    count(t.common_name) as "{species_label}"
+    {change_sql}
+from (
+         select OBSERVER_ID, COMMON_NAME, min(observation_date) as min_obs_date
+         from ebird
+         where {region_where_clause}
+           and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+           and not (approved = 'f' and reviewed = 't')
+           and (exotic_code is null or exotic_code in ('N'))
+           and observation_date <= '{as_of}'
+           {where}
+         group by observer_id, common_name
+     ) t
+group by observer_id
+order by 2 {sort}, 1 asc
+limit {limit};
+"""
+
+        # if with_media:
+        #     print (sql)
+        #     breakpoint()
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_lists_by_subregion(region_where_clause, as_of, subregion, year=None, limit=3):
+        """The top `limit` lists of each county (or state) of the region,
+        ranked per subregion in one scan rather than one query per subregion."""
+        label = subregion.capitalize()
+        if year is not None:
+            title = f"{year} Top Year Lists by {label}"
+            subtitle = str(year)
+        else:
+            title = f"Top Life Lists by {label}"
+            subtitle = "All Time"
+        full_where = _get_full_where_clause(region_where_clause, as_of, year=year)
+
+        sql = f"""
+select coalesce(r.{subregion}, t.code)   as "{label}",
+       get_observer_name(t.observer_id) as "Observer",
+       t.species                        as "Species"
+from (select {subregion}_code                                                      as code,
+             observer_id,
+             count(distinct common_name)                                           as species,
+             rank() over (partition by {subregion}_code
+                          order by count(distinct common_name) desc)               as rnk
+      from ebird
+      {full_where}
+        and {subregion}_code <> ''
+      group by 1, 2) t
+         left join ebird_region r on r.region_code = t.code
+where t.rnk <= {limit}
+order by 1, t.rnk, 2;
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def subregion_totals(region_where_clause, as_of, subregion, year=None):
+        """Species, birders and checklists of each county (or state) of the
+        region."""
+        label = subregion.capitalize()
+        if year is not None:
+            title = f"{year} {label} Totals"
+            subtitle = str(year)
+        else:
+            title = f"All-Time {label} Totals"
+            subtitle = "All Time"
+        full_where = _get_full_where_clause(region_where_clause, as_of, year=year)
+
+        sql = f"""
+select coalesce(r.{subregion}, t.code) as "{label}",
+       t.species                       as "Species",
+       t.birders                       as "Birders",
+       t.checklists                    as "Checklists"
+from (select {subregion}_code                          as code,
+             count(distinct common_name)               as species,
+             count(distinct observer_id)               as birders,
+             count(distinct sampling_event_identifier) as checklists
+      from ebird
+      {full_where}
+        and {subregion}_code <> ''
+      group by 1) t
+         left join ebird_region r on r.region_code = t.code
+order by 2 desc, 1;
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def most_seen_birds(
+        region_where_clause,
+        as_of,
+        year=None,
+        month=None,
+        last_x_years=None,
+        sort="desc",
+        with_media=False,
+        limit=10,
+    ):
+        verb = "Seen" if not with_media else "Documented"
+        title = f"Most {verb}"
+        if sort == "desc":
+            subtitle = f"Most {verb}"
+        elif sort == "asc":
+            subtitle = f"Least {verb}"
+        else:
+            raise RuntimeError()
+
+        where = ""
+        if year is not None:
+            title = f"Year List"
+            if last_x_years:
+                subtitle += f" {year-last_x_years+1}-{year}"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle += f" {year}"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        elif month is not None:
+            where += f" AND extract(month from OBSERVATION_DATE) = {month}"
+            title = f"Month Life List ({calendar.month_abbr[month]})"
+            subtitle += " " + calendar.month_abbr[month]
+        else:
+            title = f"Life List"
+            subtitle += " All Time"
+
+        if with_media:
+            where += f" AND has_media = 't'"
+            title += " w/ Photo/Audio"
+            # subtitle = " w/ Photo/Audio"
+
+        sql = f"""
+select t.common_name as "Species", count(t.OBSERVER_ID) as "Birders"
+from (
+         select distinct OBSERVER_ID, COMMON_NAME
+         from ebird
+         where {region_where_clause}
+           and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+           and not (approved = 'f' and reviewed = 't')
+           and (exotic_code is null or exotic_code in ('N'))
+        -- and OBSERVATION_DATE >= '{year}-01-01'
+        and observation_date <= '{as_of}'
+        {where}
+     ) t
+group by t.common_name
+order by 2 {sort}, 1 asc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def least_reported_birds(
+        region_where_clause,
+        as_of,
+        year=None,
+        last_x_years=15,
+        max_years_reported=6,
+    ):
+        title = f"Most Infrequent Visitors of the Last {last_x_years} Years"
+        subtitle = title
+
+        sql = f"""
+select common_name                                         as "Species",
+       count(distinct extract(year from OBSERVATION_DATE)) as "Years Reported",
+       count(distinct observer_id)                         as "Birders",
+       max(OBSERVATION_DATE)                               as "Prior"
+from ebird
+where {region_where_clause}
+  and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+  and not (approved = 'f' and reviewed = 't')
+  and (exotic_code is null or exotic_code in ('N'))
+  and observation_date <= '{as_of}'
+  and observation_date >= '{year-last_x_years+1}-01-01'
+group by common_name
+having count(distinct extract(year from OBSERVATION_DATE)) <= {max_years_reported}
+order by 2 asc, 3 asc, 4 asc;
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_atlas_year_lists(
+        region_where_clause,
+        as_of,
+        limit=10,
+        year=None,
+        month=None,
+        last_x_years=None,
+        birder_started_on_or_after_year=None,
+        block_name=None,
+        wkv=None,
+    ):
+        where = ""
+        if year is not None:
+            title = f"Year List"
+            if last_x_years:
+                subtitle = f"{year-last_x_years+1}-{year}"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle = f"{year}"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        elif month is not None:
+            where += f" AND extract(month from OBSERVATION_DATE) = {month}"
+            title = f"Month Life List ({calendar.month_abbr[month]})"
+            subtitle = calendar.month_abbr[month]
+        else:
+            title = f"Life List"
+            subtitle = "All Time"
+
+        if birder_started_on_or_after_year:
+            where += f" AND observer_id not in (select distinct observer_id from ebird where {region_where_clause} and OBSERVATION_DATE < '{birder_started_on_or_after_year}-01-01')"
+            subtitle += " (Rookies)"
+
+        if block_name and wkv:
+            block_geog = GEOSGeometry(wkv)
+            where += f" and ST_Intersects(geog, ST_GeomFromEWKT('{block_geog.ewkt}'))"
+            subtitle = f" {block_name}"
+            title += f" {block_name}"
+
+        subtitle += " Top Breeding Challenge Score"
+        sql = f"""
+select get_observer_name(t.observer_id)                                                          as "Observer",
+       sum(case when cat = 'C2' then 1 else 0 end)                                               as "Poss",
+       sum(case when cat = 'C3' then 1 else 0 end)                                               as "Prob",
+       sum(case when cat = 'C4' then 1 else 0 end)                                               as "Conf",
+    --    count(t.common_name)                                                                      as "Total",
+       sum(case when cat = 'C4' then 3 when cat = 'C3' then 2 when cat = 'C2' then 1 else 0 end) as "Score"
+from (
+         select OBSERVER_ID, COMMON_NAME, max(BREEDING_CATEGORY) as cat
+         from ebird
+         where {region_where_clause}
+           and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+           and not (approved = 'f' and reviewed = 't')
+           and (exotic_code is null or exotic_code in ('N'))
+           and observation_date <= '{as_of}'
+           AND breeding_category is not null
+           AND breeding_category in ('C2', 'C3', 'C4')
+           {where}
+         group by OBSERVER_ID, COMMON_NAME
+     ) t
+group by observer_id
+order by "Score" desc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_atlas_coded_birds(
+        region_where_clause,
+        as_of,
+        limit=10,
+        year=None,
+        last_x_years=None,
+        birder_started_on_or_after_year=None,
+        block_name=None,
+        wkv=None,
+    ):
+        where = ""
+        if year is not None:
+            title = f"Year List"
+            if last_x_years:
+                subtitle = f"{year-last_x_years+1}-{year}"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle = f"{year}"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        else:
+            title = f"Life List"
+            subtitle = "All Time"
+
+        if birder_started_on_or_after_year:
+            where += f" AND observer_id not in (select distinct observer_id from ebird where {region_where_clause} and OBSERVATION_DATE < '{birder_started_on_or_after_year}-01-01')"
+            subtitle += " (Rookies)"
+
+        if block_name and wkv:
+            block_geog = GEOSGeometry(wkv)
+            where += f" and ST_Intersects(geog, ST_GeomFromEWKT('{block_geog.ewkt}'))"
+            subtitle = f" {block_name}"
+            title += f" {block_name}"
+
+        subtitle += " Most Coded Birds"
+
+        sql = f"""
+select get_observer_name(t.observer_id) as "Observer",
+       count(*)                         as "Coded Lists",
+       sum(birds)                       as "Coded Birds"
+from (
+         select OBSERVER_ID, SAMPLING_EVENT_IDENTIFIER, count(*) as birds
+         from ebird
+         where {region_where_clause}
+           and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+           and not (approved = 'f' and reviewed = 't')
+           and (exotic_code is null or exotic_code in ('N'))
+           and observation_date <= '{as_of}'
+           AND breeding_category is not null
+           AND breeding_category in ('C2', 'C3', 'C4')
+           -- and PROJECT_CODE = 'EBIRD_ATL_MD_DC'
+           {where}
+         group by OBSERVER_ID, SAMPLING_EVENT_IDENTIFIER
+     ) t
+group by observer_id
+order by 3 desc
+limit {limit};
+"""
+
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_atlas_coded_people(
+        region_where_clause,
+        as_of,
+        limit=10,
+        year=None,
+        last_x_years=None,
+        birder_started_on_or_after_year=None,
+        block_name=None,
+        wkv=None,
+        num_to_credit=2,
+        sort="asc",
+    ):
+        where = ""
+        if year is not None:
+            title = f"Year List"
+            if last_x_years:
+                subtitle = f"{year-last_x_years+1}-{year}"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle = f"{year}"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        else:
+            title = f"Life List"
+            subtitle = "All Time"
+
+        if birder_started_on_or_after_year:
+            where += f" AND observer_id not in (select distinct observer_id from ebird where {region_where_clause} and OBSERVATION_DATE < '{birder_started_on_or_after_year}-01-01')"
+            subtitle += " (Rookies)"
+
+        if block_name and wkv:
+            block_geog = GEOSGeometry(wkv)
+            where += f" and ST_Intersects(geog, ST_GeomFromEWKT('{block_geog.ewkt}'))"
+            subtitle = f" {block_name}"
+            title += f" {block_name}"
+
+        # subtitle += " "
+        title = "Most Prone to Public Displays of Affection"
+        description = (
+            "a.k.a birds most frequently seen showing signs of presumed local breeding. This lists every bird that was assigned a Probable or Confirmed breeding code during the year, along with the number of people who coded it.  "
+            "Includes lists not specifically in the Atlas portal, and as elsewhere in this report the data is self-reported and unvetted, so it may differ from final Atlas figures. "
+            f"If {num_to_credit} or fewer birders coded it, their names are listed."
+        )
+
+        sql = f"""
+select common_name as "Species",
+       count(*)          as "#",
+       case
+           when count(*) <= {num_to_credit} then
+               string_agg(get_observer_name(OBSERVER_ID), ', ' order by get_observer_name(OBSERVER_ID))
+           else null end as "Birders"
+from (
+         select
+            common_name,
+            observer_id,
+            sum(case when breeding_category = 'C4' then 1 else 0 end),
+            sum(case when breeding_category = 'C3' then 1 else 0 end)
+         from ebird
+         where {region_where_clause}
+           and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+           and not (approved = 'f' and reviewed = 't')
+           and (exotic_code is null or exotic_code in ('N'))
+           and observation_date <= '{as_of}'
+           AND breeding_category is not null
+           AND breeding_category in ('C3', 'C4')
+           -- and PROJECT_CODE = 'EBIRD_ATL_MD_DC'
+           {where}
+         group by common_name, observer_id
+     ) t
+group by common_name
+order by "#" {sort}, common_name asc;
+"""
+
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def top_all_time_everyone_year_lists(
+        region_where_clause,
+        as_of,
+        limit=10,
+        with_media=False,
+    ):
+        subtitle = "Biggest Big Year (Everyone)"
+        title = subtitle
+
+        if with_media:
+            title += " w/ Photo/Audio"
+            # subtitle = " w/ Photo/Audio"
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of, with_media).everyone_lists(
+            by_month=False, limit=limit
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_all_time_everyone_month_lists(
+        region_where_clause,
+        as_of,
+        limit=10,
+        with_media=False,
+    ):
+        subtitle = "Biggest Big Month (Everyone)"
+        title = subtitle
+
+        if with_media:
+            title += " w/ Photo/Audio"
+            # subtitle = " w/ Photo/Audio"
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of, with_media).everyone_lists(
+            by_month=True, limit=limit
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_month_closeouts(region_where_clause, as_of, year=None, limit=10):
+        subtitle = "All-Time"
+        title = f"Month Closeouts"
+
+        if year is not None:
+            subtitle = f"{year}"
+            include_change = False
+        else:
+            subtitle = "All-Time"
+            include_change = True
+        title += " - " + subtitle
+
+        prev_as_of = add_years(datetime.date(*map(int, as_of.split("-"))), -1).strftime(
+            "%Y-%m-%d"
+        )
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).top_month_closeouts(
+            limit=limit, year=year, prev_as_of=prev_as_of if include_change else None
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_month_closeout_birds(
+        region_where_clause, as_of, sort="desc", num_to_credit=2
+    ):
+        subtitle = "All Month Closeout Birds"
+        title = subtitle
+        description = f"This is a list of all birds in the region that have been seen in every month of the year (in any year).  If {num_to_credit} or fewer birders have closed it out, their names are listed."
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).month_closeout_birds(
+            sort=sort, num_to_credit=num_to_credit
+        )
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def total_month_ticks(region_where_clause, as_of, limit=10):
+        subtitle = "All-Time Month Ticks"
+        title = f"Total Month Ticks"
+        description = ""
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).total_month_ticks(limit=limit)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def time_spent_in_field(
+        region_where_clause, as_of, year, last_x_years=None, limit=10
+    ):
+        description = "Sum of time listed on Stationary or Traveling counts with duration included. Excludes any lists over 10 hours."
+        where = ""
+        subtitle = None
+        if last_x_years is None:
+            assert year
+            where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+            title = f"Most Time Spent In Field ({year})"
+            subtitle = f"{year}"
+            waking_hours = 5840
+
+        else:
+            where += (
+                f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+            )
+            # where += f" AND extract(year from OBSERVATION_DATE) < {year-5}"
+            title = f"Most Time Spent In Field (last {last_x_years} years)"
+            # subtitle = f"last {last_x_years} years"
+            subtitle = f"{year-last_x_years+1}-{year}"
+            waking_hours = 5840 * last_x_years
+
+        sql = f"""
+select get_observer_name(t.observer_id) as "Observer",
+    count(*) as "Lists",
+    round(sum(duration_minutes) / 60 / 24.0, 2) as "Days",
+    round(100.0 * sum(duration_minutes) / 60 / {waking_hours}, 1)::text || '%' as "Waking"
+from (select observer_id, min(duration_minutes) duration_minutes
+      from ebird
+      where true
+        and {region_where_clause}
+        and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+        and not (approved = 'f' and reviewed = 't')
+        and (exotic_code is null or exotic_code in ('N'))
+        and observation_date <= '{as_of}'
+        and duration_minutes is not null
+        and duration_minutes <= 400
+        and protocol_code in ('P21', 'P22')
+        {where}
+      group by observer_id, SAMPLING_EVENT_IDENTIFIER
+     ) t
+group by observer_id
+order by 3 desc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def top_month_closeouts_best_years(region_where_clause, as_of, limit=10):
+        subtitle = "Best Years"
+        title = f"Month Closeouts -- Best Years"
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).top_month_closeouts_best_years(
+            limit=limit
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_all_time_year_lists(region_where_clause, as_of, limit=10):
+        title = f"All-Time Top Year List"
+        subtitle = "Biggest Big Year"
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).top_period_lists(
+            by_month=False, limit=limit
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def four_seasons_champ(region_where_clause, as_of, year, limit=10):
+        where = ""
+        title = f"Four Seasons Championship"
+        subtitle = title
+        description = (
+            "The Four Seasons Championship is a competition idea I've toyed with. Most Big Days are during migration, but they don't have to be! "
+            "The idea is to schedule a Big Day in the peak of each of the four seasons. Sum up the tally from each of the four days, and the person with the best score is the Champ. "
+            "Since this hasn't actually been organized, for now this ranking will suffice: The sum of each person's best day in each of the four seasons (Mar-May, Jun-Jul, Aug-Nov, Jan-Feb+Dec)."
+        )
+
+        sql = f"""
+with birdies as (
+    select observer_id, OBSERVATION_DATE, count(distinct common_name) as species
+    from ebird
+    where true
+      and {region_where_clause}
+      and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+      and not (approved = 'f' and reviewed = 't')
+      and (exotic_code is null or exotic_code in ('N'))
+      and OBSERVATION_DATE BETWEEN '{year}-01-01' and '{year}-12-31'
+      and observation_date <= '{as_of}'
+    group by observer_id, OBSERVATION_DATE
+)
+select get_observer_name(b2.observer_id) as "Observer",
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-03-01' and '{year}-05-31')                "Spring",
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-06-01' and '{year}-07-31')                "Summer",
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-08-01' and '{year}-11-30')                "Fall",
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and (OBSERVATION_DATE < '{year}-03-01' or OBSERVATION_DATE >= '{year}-12-01')) "Winter",
+
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-03-01' and '{year}-05-31') +
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-06-01' and '{year}-07-31') +
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and OBSERVATION_DATE BETWEEN '{year}-08-01' and '{year}-11-30') +
+       (select coalesce(max(species), 0)
+        from birdies b
+        where b.observer_id = b2.observer_id
+          and (OBSERVATION_DATE < '{year}-03-01' or OBSERVATION_DATE >= '{year}-12-01')) "Score"
+
+from birdies b2
+group by observer_id
+order by "Score" desc
+limit {limit};
+"""
+
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def top_all_time_month_lists(region_where_clause, as_of, limit=10):
+        title = f"All-Time Top Month List"
+        subtitle = "Biggest Big Month"
+
+        logger.debug(f"Generating {title}...")
+        a, b = species_bitmaps(region_where_clause, as_of).top_period_lists(
+            by_month=True, limit=limit
+        )
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_all_time_day_lists(region_where_clause, as_of, limit=10):
+        title = f"All-Time Top Day List"
+        subtitle = "Biggest Big Day"
+
+        logger.debug(f"Generating {title}...")
+        a, b = day_lists(region_where_clause, as_of).top_day_lists(limit=limit)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def top_all_time_everyone_day_lists(region_where_clause, as_of, limit=10):
+        subtitle = "Biggest Big Day (Everyone)"
+        title = subtitle
+
+        logger.debug(f"Generating {title}...")
+        a, b = day_lists(region_where_clause, as_of).everyone_day_lists(limit=limit)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def most_species_on_one_list(
+        region_where_clause, as_of, max_hours, max_miles, limit=10
+    ):
+        title = f"All-Time Top Single List"
+        subtitle = (
+            f"Biggest List (under {max_hours}h Traveling, {max_miles}mi Stationary)"
+        )
+        miles_to_km = 0.6213712
+
+        # ebird_checklist has one row per checklist with its countable species
+        # (see ebird-create-db-and-load-ebd.sql), so this is a top-N index scan.
+        sql = f"""
+select
+    get_observer_name(observer_id) as "Observer",
+    OBSERVATION_DATE as "Date",
+    locality as "Locality",
+    round(duration_minutes / 60.0, 1) as "Hours",
+    round((effort_distance_km*0.6213712)::numeric , 1) as "Miles",
+    concat('https://ebird.org/checklist/', SAMPLING_EVENT_IDENTIFIER) as "_Url",
+    species_count as "Species"
+from ebird_checklist
+where {region_where_clause}
+  and observation_date <= '{as_of}'
+  and species_count > 0
+  and (
+      (protocol_code = 'P22' and effort_distance_km*{miles_to_km} <= {max_miles}) OR
+      (protocol_code = 'P21' and duration_minutes <= {max_hours} * 60))
+order by species_count desc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def most_avg_species_per_hour(
+        region_where_clause, as_of, year, min_hours=10, min_checklists=10, limit=10
+    ):
+        where = ""
+        title = f"Species/Hour"
+        subtitle = f"Average Species Seen Per List-Hour ({year})"
+
+        sql = f"""
+select get_observer_name(t.observer_id) as "Observer",
+       count(*)                                    as "Lists",
+       --max(num_species)                            as max_species_on_list,
+       sum(num_species)               as "Sp",
+       round(sum(duration_hours), 1)               as "Hours",
+       round(avg(num_species / duration_hours), 2) as "Avg Species Per List-Hour"
+from (select observer_id, min(duration_minutes) / 60.0 as duration_hours, count(distinct common_name) as num_species
+      from ebird
+      where true
+        and {region_where_clause}
+        and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+        and not (approved = 'f' and reviewed = 't')
+        and (exotic_code is null or exotic_code in ('N'))
+        and observation_date <= '{as_of}'
+        and duration_minutes is not null
+        and duration_minutes >= 5
+        and protocol_code in ('P21', 'P22')
+        and OBSERVATION_DATE >= '{year}-01-01'
+      group by observer_id, SAMPLING_EVENT_IDENTIFIER
+     ) t
+group by observer_id
+having sum(duration_hours) > {min_hours}
+   and count(*) > {min_checklists}
+order by avg(num_species / duration_hours) desc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def most_honest_birder(
+        region_where_clause, as_of, year=None, limit=10, last_x_years=None
+    ):
+        where = ""
+        if year is not None:
+            if last_x_years:
+                subtitle = f"{year-last_x_years+1}-{year}"
+                where += (
+                    f" AND extract(year from OBSERVATION_DATE) >= {year-last_x_years+1}"
+                )
+            else:
+                subtitle = f"Most Honest Birder ({year})"
+                where += f" AND extract(year from OBSERVATION_DATE) = {year}"
+
+        else:
+            subtitle = "Most Honest Birder (All Time)"
+
+        title = subtitle
+
+        sql = f"""
+select get_observer_name(t.observer_id) as "Observer",
+       sum(spuhs)                       as "Spuhs",
+       sum(slashes)                     as "Slashes",
+       sum(total)                       as "Total",
+       sum(unq)                      as "Unique"
+
+from (
+         select observer_id,
+                common_name,
+                sum(case when category = 'spuh' then 1 else 0 end)     Spuhs,
+                sum(case when category = 'slash' then 1 else 0 end) as Slashes,
+                count(*)                                            as Total,
+                count(distinct common_name)                         as unq
+         from ebird
+            where {region_where_clause}
+           and category in ('slash', 'spuh')
+            and observation_date <= '{as_of}'
+           {where}
+         group by OBSERVER_ID, COMMON_NAME
+     ) t
+group by observer_id
+order by 4 desc
+limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def every_month_is_a_big_month(region_where_clause, as_of):
+        title = "Biggest Big Days by Month"
+        subtitle = None
+        description = "Here are the single biggest days that ever took place in every month of the year. If you're looking for a record to break, this is a good place to start."
+
+        sql = f"""
+with summary as (select OBSERVER_ID,
+                        count(distinct common_name)                                          as "Species",
+                        OBSERVATION_DATE,
+                        ROW_NUMBER()
+                        OVER (PARTITION BY
+                            extract(month from OBSERVATION_DATE)
+                            ORDER BY count(distinct common_name) desc, OBSERVATION_DATE ASC) AS rank
+                 from ebird
+                 where {region_where_clause}
+                   and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+                   and not (approved = 'f' and reviewed = 't')
+                   and (exotic_code is null or exotic_code in ('N'))
+                   and observation_date <= '{as_of}'
+                 group by observer_id, OBSERVATION_DATE
+)
+    select
+        extract(month from OBSERVATION_DATE),
+       get_observer_name(observer_id) as "Observer",
+       "Species" as "Sp",
+       observation_date as "On"
+from summary
+where rank = 1
+order by extract(month from OBSERVATION_DATE);
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def every_day_is_a_big_day(region_where_clause, as_of):
+        title = "Every Day is a Big Day"
+        subtitle = None
+        description = "Here are the single biggest days that ever took place in EVERY calendar date. If you're looking for a really easy record to break, well, you've arrived."
+
+        sql = f"""
+with summary as (select OBSERVER_ID,
+                        count(distinct common_name)                                          as "Species",
+                        OBSERVATION_DATE,
+                        ROW_NUMBER()
+                        OVER (PARTITION BY
+                            extract(month from OBSERVATION_DATE), extract(day from OBSERVATION_DATE)
+                            ORDER BY count(distinct common_name) desc, OBSERVATION_DATE ASC) AS rank
+                 from ebird
+                 where {region_where_clause}
+                   and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+                   and not (approved = 'f' and reviewed = 't')
+                   and (exotic_code is null or exotic_code in ('N'))
+                   and observation_date <= '{as_of}'
+                 group by observer_id, OBSERVATION_DATE
+)
+    select
+        extract(month from OBSERVATION_DATE),
+        extract(day from OBSERVATION_DATE),
+       get_observer_name(observer_id) as "Observer",
+       "Species" as "Sp",
+       extract(year from observation_date) as "On"
+from summary
+where rank = 1
+order by extract(month from OBSERVATION_DATE), extract(day from OBSERVATION_DATE);
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, description, a, b
+
+    @staticmethod
+    def new_birds_DEPRECATED(
+        region_where_clause, as_of, cur_year_in, prev_year_in, limit=10
+    ):
+        subtitle = ""
+
+        if prev_year_in == "all":
+            prev_where = f" and extract(year from OBSERVATION_DATE) < {cur_year_in} "
+            title = f"All-time new in {cur_year_in}"
+        else:
+            prev_where = f" and extract(year from OBSERVATION_DATE) in ({comma_join(prev_year_in)}) "
+
+            title = f"Reported in {cur_year_in} and not {prev_year_in}"
+
+        subtitle = title
+
+        sql = f"""
+select cur.common_name, cur.cnt cur, last.cnt as "last"
+from (
+         select common_name, count(distinct observer_id) as cnt
+         from ebird
+         where {region_where_clause}
+            and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+            and not (approved = 'f' and reviewed = 't')
+            and (exotic_code is null or exotic_code in ('N'))
+            and observation_date <= '{as_of}'
+            and extract(year from OBSERVATION_DATE) in ({comma_join(cur_year_in)})
+         group by 1) cur
+         left outer join
+     (
+         select common_name, count(distinct observer_id) as cnt
+         from ebird
+         where {region_where_clause}
+            and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+            and not (approved = 'f' and reviewed = 't')
+            and (exotic_code is null or exotic_code in ('N'))
+            and observation_date <= '{as_of}'
+            {prev_where}
+         group by 1) last
+     on cur.common_name = last.common_name
+where last.cnt is null
+order by cur.common_name;
+--limit {limit};
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+    @staticmethod
+    def new_birds(region_where_clause, as_of, year, limit=10):
+        title = f"Reported in {year} but Missed in {year-1}"
+        subtitle = title
+
+        sql = f"""
+select cur.common_name  as "Species",
+       (case when last.last_seen is null then 'n/a' else last.last_seen::text end) as "Prior",
+       cur.min_obs_date as "First Reported",
+       cur.cnt          as "Birders",
+       (case when has_media = 't' then 'X' else '' end) as "Documented"
+from (
+         select common_name,
+                count(distinct observer_id) as cnt,
+                min(observation_date)          min_obs_date,
+                max(observation_date)          max_obs_date,
+                bool_or(has_media)          as has_media
+         from ebird
+         where {region_where_clause}
+            and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+            and not (approved = 'f' and reviewed = 't')
+            and (exotic_code is null or exotic_code in ('N'))
+            and observation_date <= '{as_of}'
+            and observation_date >= '{year}-01-01'
+         group by 1) cur
+         left outer join
+     (
+         select common_name, max(observation_date) as last_seen
+         from ebird
+         where {region_where_clause}
+            and (category = 'species' or category = 'issf' or category = 'form' or common_name = 'Rock Pigeon')
+            and not (approved = 'f' and reviewed = 't')
+            and (exotic_code is null or exotic_code in ('N'))
+            and observation_date <= '{as_of}'
+            and observation_date <= '{year-1}-12-31'
+         group by 1) last
+     on cur.common_name = last.common_name
+where last.last_seen < '{year-1}-01-01'
+   or last.last_seen is null
+order by last_seen asc nulls first;
+"""
+        logger.debug(f"Generating {title}...")
+        a, b = execute_query(sql)
+        return title, subtitle, None, a, b
+
+
+    @staticmethod
+    def woodpecker_clean_sweep(region_where_clause, as_of, year=None, limit=100):
+        return challenge_table(
+            "woodpecker_clean_sweep", region_where_clause, as_of, year=year, limit=limit
+        )
+
+    @staticmethod
+    def warbler_single_list(region_where_clause, as_of, year=None, limit=20):
+        return challenge_table(
+            "warbler_single_list", region_where_clause, as_of, year=year, limit=limit
+        )
@@ -0,0 +1,686 @@
+"""
+The computed contents of an Annual eBird Statistical Report.
+
+All section queries are run once by `compute_report` and stored in a
+`ReportArtifact`, which can be saved to JSON (or MessagePack) and rendered by
+the LaTeX and HTML commands without touching the database again.
+
+Tables are grouped into the report's sections (`report_sections`).  Each
+section is fingerprinted by its inputs (region, year, as_of, dataset version,
+query parameters and the source of its queries and the helper modules they
+call), and recomputing an artifact only reruns
+the sections whose fingerprint changed.
+"""
+import datetime
+import decimal
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import re
+import time
+
+from ebirdcore.instrumentation import span
+from ebirdcore.sql_utils import Columns, FakeColumn
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 3
+DEFAULT_DATASET_VERSION = "EBD_relDec-2025"
+
+
+def dataset_release_date(dataset_version):
+    """eg "EBD_relDec-2025" -> "Dec 2025"."""
+    m = re.match(r"EBD_rel(\w{3})-(\d{4})", dataset_version)
+    return f"{m[1]} {m[2]}" if m else dataset_version
+
+
+def subregion_level(region_code):
+    """"state" for a country, "county" for a state, None for a county."""
+    return {1: "state", 2: "county"}.get(len(region_code.split("-")))
+
+
+def report_tables(region_code, year):
+    """All tables used by the report renderers: {key: (query method, kwargs)}.
+
+    Every query also receives the region where-clause and `as_of`.
+    """
+    from ebirdcore.dc_ward_wkv import dc_ward_wkv
+
+    tables = {
+        "year_stats": ("year_stats", dict(year=year, limit=20)),
+        "new_birds": ("new_birds", dict(year=year)),
+        # Most Species Seen
+        "top_year_lists.life": (
+            "top_year_lists",
+            dict(limit=20, include_change=True),
+        ),
+        "top_year_lists.year": ("top_year_lists", dict(limit=20, year=year)),
+        "top_year_lists.last5": (
+            "top_year_lists",
+            dict(limit=20, year=year, last_x_years=5),
+        ),
+        "top_year_lists.rookies": (
+            "top_year_lists",
+            dict(limit=20, year=year, birder_started_on_or_after_year=year),
+        ),
+        # All-Time Bigs
+        "top_all_time_year_lists": ("top_all_time_year_lists", dict(limit=15)),
+        "top_all_time_everyone_year_lists": (
+            "top_all_time_everyone_year_lists",
+            dict(limit=15),
+        ),
+        "top_all_time_month_lists": ("top_all_time_month_lists", dict(limit=10)),
+        "top_all_time_everyone_month_lists": (
+            "top_all_time_everyone_month_lists",
+            dict(limit=10),
+        ),
+        "top_all_time_day_lists": ("top_all_time_day_lists", dict(limit=15)),
+        "top_all_time_everyone_day_lists": (
+            "top_all_time_everyone_day_lists",
+            dict(limit=15),
+        ),
+        # Off-time Bigs
+        "every_month_is_a_big_month": ("every_month_is_a_big_month", dict()),
+        "every_day_is_a_big_day": ("every_day_is_a_big_day", dict()),
+        "most_species_on_one_list": (
+            "most_species_on_one_list",
+            dict(max_hours=3, max_miles=5, limit=20),
+        ),
+        "four_seasons_champ": ("four_seasons_champ", dict(limit=10, year=year)),
+        # Most Species Photographed or Recorded
+        "top_year_lists.media_life": (
+            "top_year_lists",
+            dict(with_media=True, limit=20, include_change=True),
+        ),
+        "top_year_lists.media_year": (
+            "top_year_lists",
+            dict(with_media=True, limit=20, year=year),
+        ),
+        "most_seen_birds.media_least_all": (
+            "most_seen_birds",
+            dict(limit=20, sort="asc", with_media=True),
+        ),
+        "most_seen_birds.media_least_year": (
+            "most_seen_birds",
+            dict(year=year, limit=20, sort="asc", with_media=True),
+        ),
+        # Most Breeding Species Coded
+        "top_atlas_year_lists": ("top_atlas_year_lists", dict(limit=20, year=year)),
+        "top_atlas_coded_birds": (
+            "top_atlas_coded_birds",
+            dict(limit=20, year=year),
+        ),
+        "top_atlas_coded_people": (
+            "top_atlas_coded_people",
+            dict(year=year, sort="desc"),
+        ),
+        "most_avg_species_per_hour": (
+            "most_avg_species_per_hour",
+            dict(year=year, limit=15),
+        ),
+        "most_honest_birder.all": ("most_honest_birder", dict(limit=15)),
+        "most_honest_birder.year": ("most_honest_birder", dict(year=year, limit=15)),
+        "time_spent_in_field.year": (
+            "time_spent_in_field",
+            dict(limit=20, year=year),
+        ),
+        "time_spent_in_field.last5": (
+            "time_spent_in_field",
+            dict(limit=20, year=year, last_x_years=5),
+        ),
+        # Month Closeouts
+        "top_month_closeouts.all": ("top_month_closeouts", dict(limit=20)),
+        "top_month_closeouts.year": ("top_month_closeouts", dict(year=year, limit=20)),
+        "top_month_closeouts_best_years": (
+            "top_month_closeouts_best_years",
+            dict(limit=20),
+        ),
+        "total_month_ticks": ("total_month_ticks", dict(limit=20)),
+        "top_month_closeout_birds": ("top_month_closeout_birds", dict()),
+    }
+    for month in range(1, 13):
+        tables[f"top_year_lists.month.{month}"] = (
+            "top_year_lists",
+            dict(limit=10, month=month, include_change=True, shorten_labels=True),
+        )
+    tables.update(
+        {
+            # Clean Sweeps
+            "woodpecker_clean_sweep.all": ("woodpecker_clean_sweep", dict()),
+            "woodpecker_clean_sweep.year": ("woodpecker_clean_sweep", dict(year=year)),
+            "warbler_single_list.all": ("warbler_single_list", dict()),
+            "warbler_single_list.year": ("warbler_single_list", dict(year=year)),
+            # Bird's-eye View
+            "most_seen_birds.most_year": (
+                "most_seen_birds",
+                dict(year=year, limit=25, sort="desc"),
+            ),
+            "most_seen_birds.least_year": (
+                "most_seen_birds",
+                dict(year=year, limit=25, sort="asc"),
+            ),
+            "most_seen_birds.least_last5": (
+                "most_seen_birds",
+                dict(year=year, limit=25, sort="asc", last_x_years=5),
+            ),
+            "least_reported_birds": (
+                "least_reported_birds",
+                dict(year=year, last_x_years=20),
+            ),
+        }
+    )
+    subregion = subregion_level(region_code)
+    if subregion:
+        tables.update(
+            {
+                "subregion_totals.year": (
+                    "subregion_totals",
+                    dict(subregion=subregion, year=year),
+                ),
+                "subregion_totals.all": ("subregion_totals", dict(subregion=subregion)),
+                "top_lists_by_subregion.year": (
+                    "top_lists_by_subregion",
+                    dict(subregion=subregion, year=year, limit=3),
+                ),
+                "top_lists_by_subregion.life": (
+                    "top_lists_by_subregion",
+                    dict(subregion=subregion, limit=1),
+                ),
+            }
+        )
+    if region_code == "US-DC-001":
+        for block_name, wkv in sorted(dc_ward_wkv.items()):
+            tables[f"top_year_lists.ward.{block_name}"] = (
+                "top_year_lists",
+                dict(
+                    limit=10,
+                    block_name=block_name,
+                    wkv=wkv,
+                    include_change=True,
+                    shorten_labels=True,
+                ),
+            )
+    return tables
+
+
+def report_sections(region_code, year):
+    """The report's sections in document order: {name: table keys}.
+
+    "about" and "media" have no tables; "media" is the top-ranked photos.
+    """
+    sections = {
+        "about": [],
+        "year_in_review": ["year_stats", "new_birds"],
+        "most_species_seen": [
+            "top_year_lists.life",
+            "top_year_lists.year",
+            "top_year_lists.last5",
+            "top_year_lists.rookies",
+        ],
+    }
+    if subregion_level(region_code):
+        sections["subregions"] = [
+            "subregion_totals.year",
+            "subregion_totals.all",
+            "top_lists_by_subregion.life",
+            "top_lists_by_subregion.year",
+        ]
+    sections.update(
+        {
+            "all_time_bigs": [
+                "top_all_time_year_lists",
+                "top_all_time_everyone_year_lists",
+                "top_all_time_month_lists",
+                "top_all_time_everyone_month_lists",
+                "top_all_time_day_lists",
+                "top_all_time_everyone_day_lists",
+            ],
+            "off_time_bigs": ["every_month_is_a_big_month", "every_day_is_a_big_day"],
+            "most_species_on_one_list": ["most_species_on_one_list"],
+            "four_seasons_champ": ["four_seasons_champ"],
+            "media": [],
+            "media_lists": [
+                "top_year_lists.media_life",
+                "top_year_lists.media_year",
+                "most_seen_birds.media_least_all",
+                "most_seen_birds.media_least_year",
+            ],
+        }
+    )
+    if region_code == "US-DC-001":
+        from ebirdcore.dc_ward_wkv import dc_ward_wkv
+
+        sections["dc_wards"] = [
+            f"top_year_lists.ward.{block_name}" for block_name in sorted(dc_ward_wkv)
+        ]
+    sections.update(
+        {
+            "breeding": [
+                "top_atlas_year_lists",
+                "top_atlas_coded_birds",
+                "top_atlas_coded_people",
+            ],
+            "most_efficient": ["most_avg_species_per_hour"],
+            "most_honest": ["most_honest_birder.all", "most_honest_birder.year"],
+            "time_in_field": [
+                "time_spent_in_field.year",
+                "time_spent_in_field.last5",
+            ],
+            "month_closeouts": [
+                "top_month_closeouts.all",
+                "top_month_closeouts.year",
+                "top_month_closeouts_best_years",
+                "total_month_ticks",
+                "top_month_closeout_birds",
+            ],
+            "month_life_lists": [
+                f"top_year_lists.month.{month}" for month in range(1, 13)
+            ],
+            "clean_sweeps": [
+                "woodpecker_clean_sweep.all",
+                "woodpecker_clean_sweep.year",
+                "warbler_single_list.all",
+                "warbler_single_list.year",
+            ],
+            "birds_eye_view": [
+                "most_seen_birds.most_year",
+                "most_seen_birds.least_year",
+                "most_seen_birds.least_last5",
+            ],
+            "least_reported": ["least_reported_birds"],
+        }
+    )
+    return sections
+
+
+def _split_names(values):
+    return [n.strip() for v in values or [] for n in v.split(",") if n.strip()]
+
+
+def select_sections(names, only=None, skip=None):
+    """Filter section names by --only/--skip lists, keeping document order.
+
+    `only` and `skip` are lists of (possibly comma-separated) section names.
+    """
+    only, skip = _split_names(only), _split_names(skip)
+    for name in only + skip:
+        if name not in names:
+            raise ValueError(
+                f"Unknown section {name!r}; choose from {', '.join(names)}"
+            )
+    return [
+        name
+        for name in names
+        if (not only or name in only) and name not in skip
+    ]
+
+
+def _encode_value(v):
+    if isinstance(v, datetime.datetime):
+        return {"$datetime": v.isoformat()}
+    if isinstance(v, datetime.date):
+        return {"$date": v.isoformat()}
+    if isinstance(v, decimal.Decimal):
+        return {"$decimal": str(v)}
+    return v
+
+
+def _decode_value(v):
+    if isinstance(v, dict):
+        if "$datetime" in v:
+            return datetime.datetime.fromisoformat(v["$datetime"])
+        if "$date" in v:
+            return datetime.date.fromisoformat(v["$date"])
+        if "$decimal" in v:
+            return decimal.Decimal(v["$decimal"])
+    return v
+
+
+# The modules behind the helpers `Queries` methods call, by helper name.
+HELPER_MODULES = {
+    "species_bitmaps": ("ebirdcore.bitmaps", "ebirdcore.binary_copy"),
+    "day_lists": ("ebirdcore.bitmaps", "ebirdcore.binary_copy"),
+    "challenge_table": ("ebirdcore.challenges",),
+}
+HELPER_CALL = re.compile(rf"\b({'|'.join(HELPER_MODULES)})\(")
+
+
+def _query_source(func):
+    # Editing a query invalidates its sections.
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return func.__code__.co_code.hex()
+
+
+@functools.lru_cache(maxsize=None)
+def _module_source(name):
+    # Read, not imported: the bitmap modules import numpy.
+    with open(importlib.util.find_spec(name).origin, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _helper_sources(source):
+    """{module: source hash} of the helper modules `source` calls into, so
+    editing eg the bitmap leaderboards invalidates the sections using them."""
+    modules = sorted(
+        {m for helper in HELPER_CALL.findall(source) for m in HELPER_MODULES[helper]}
+    )
+    return {m: _module_source(m) for m in modules}
+
+
+def _column_type(d):
+    return getattr(d, "type_code", getattr(d, "type", None))
+
+
+class ReportArtifact:
+    """Section results for one region and year, as rendered by every format."""
+
+    def __init__(
+        self,
+        region,
+        year,
+        as_of=None,
+        dataset_version=None,
+        photos=None,
+        tables=None,
+        fingerprints=None,
+        queries=None,
+    ):
+        self.region = region
+        self.year = year
+        self.as_of = as_of or f"{year}-12-31"
+        self.dataset_version = dataset_version or DEFAULT_DATASET_VERSION
+        self.photos = photos or []
+        self.tables = tables or {}
+        self.fingerprints = fingerprints or {}
+        self._queries = queries
+        self._specs = None
+        self._sections = None
+        self.modified = False
+
+    @property
+    def region_code(self):
+        return self.region["code"]
+
+    @property
+    def region_description(self):
+        return self.region["description"]
+
+    @property
+    def specs(self):
+        if self._specs is None:
+            self._specs = report_tables(self.region_code, self.year)
+        return self._specs
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            self._sections = report_sections(self.region_code, self.year)
+        return self._sections
+
+    @property
+    def queries(self):
+        if self._queries is None:
+            from ebirdcore.queries import Queries
+
+            self._queries = Queries
+        return self._queries
+
+    def fingerprint(self, section):
+        """Hash of everything a section's tables depend on."""
+        inputs = {
+            "region": [self.region["code"], self.region["where_clause"]],
+            "year": self.year,
+            "as_of": self.as_of,
+            "dataset_version": self.dataset_version,
+            "tables": [],
+        }
+        for key in self.sections[section]:
+            method, kwargs = self.specs[key]
+            source = _query_source(getattr(self.queries, method))
+            inputs["tables"].append(
+                [key, method, kwargs, source, _helper_sources(source)]
+            )
+        digest = hashlib.sha256(
+            json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def is_stale(self, section):
+        return self.fingerprints.get(section) != self.fingerprint(section) or any(
+            key not in self.tables for key in self.sections[section]
+        )
+
+    def compute_table(self, key):
+        method, kwargs = self.specs[key]
+        with span(key, cat="table"):
+            title, subtitle, description, column_desc, vals = getattr(
+                self.queries, method
+            )(self.region["where_clause"], as_of=self.as_of, **kwargs)
+        self.tables[key] = (
+            title,
+            subtitle,
+            description,
+            [FakeColumn(d.name, _column_type(d)) for d in column_desc],
+            vals
+            if isinstance(vals, Columns)
+            else Columns.from_rows(vals, len(column_desc)),
+        )
+        self.modified = True
+        return self.tables[key]
+
+    def table(self, key):
+        """Return the (title, subtitle, description, column_desc, vals) of a table.
+
+        Tables missing from the artifact are computed on demand.
+        """
+        if key not in self.tables:
+            return self.compute_table(key)
+        return self.tables[key]
+
+    def release(self, section):
+        """Forget a section's tables (and that it was computed), eg once it
+        has been rendered by a run that won't save the artifact."""
+        for key in self.sections[section]:
+            self.tables.pop(key, None)
+        self.fingerprints.pop(section, None)
+
+    def compute(self, sections=None):
+        """Compute the given sections (default all), skipping up-to-date ones."""
+        for section in sections or self.sections:
+            if not self.is_stale(section):
+                logger.debug(f"Section {section} is up to date.")
+                continue
+            t0 = time.time()
+            with span(section, cat="section"):
+                for key in self.sections[section]:
+                    self.compute_table(key)
+            self.fingerprints[section] = self.fingerprint(section)
+            self.modified = True
+            logger.info(f"Computed section {section} in {time.time() - t0:.1f}s")
+        return self
+
+    def compute_photos(self, fetcher=None):
+        """Look up the top-ranked photos, unless the artifact already has them."""
+        from ebirdcore.media import get_top_ranked_photos
+
+        if self.photos:
+            return self.photos
+        self.photos = [
+            {k: v for k, v in p.items() if k != "image_filename"}
+            for p in get_top_ranked_photos(
+                self.region_code, self.year, limit=10, fetcher=fetcher
+            )
+        ]
+        self.modified = True
+        return self.photos
+
+    def to_dict(self):
+        return {
+            "version": ARTIFACT_VERSION,
+            "region": {
+                "code": self.region["code"],
+                "description": self.region["description"],
+                "where_clause": self.region["where_clause"],
+            },
+            "year": self.year,
+            "as_of": self.as_of,
+            "dataset_version": self.dataset_version,
+            "photos": self.photos,
+            "fingerprints": self.fingerprints,
+            "tables": {
+                key: {
+                    "title": title,
+                    "subtitle": subtitle,
+                    "description": description,
+                    "columns": [[d.name, d.type] for d in column_desc],
+                    "values": [
+                        [_encode_value(v) for v in col] for col in vals.columns
+                    ],
+                }
+                for key, (
+                    title,
+                    subtitle,
+                    description,
+                    column_desc,
+                    vals,
+                ) in self.tables.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != ARTIFACT_VERSION:
+            raise RuntimeError(
+                f"Report artifact version {data.get('version')} is not {ARTIFACT_VERSION}; recompute it."
+            )
+        tables = {
+            key: (
+                t["title"],
+                t["subtitle"],
+                t["description"],
+                [FakeColumn(name, type_code) for name, type_code in t["columns"]],
+                Columns([[_decode_value(v) for v in col] for col in t["values"]]),
+            )
+            for key, t in data["tables"].items()
+        }
+        return cls(
+            data["region"],
+            data["year"],
+            as_of=data["as_of"],
+            dataset_version=data["dataset_version"],
+            photos=data["photos"],
+            tables=tables,
+            fingerprints=data["fingerprints"],
+        )
+
+    def save(self, path):
+        data = self.to_dict()
+        if path.endswith(".msgpack"):
+            import msgpack
+
+            with open(path, "wb") as f:
+                msgpack.pack(data, f)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        self.modified = False
+        logger.info(f'Saved report artifact "{path}"')
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith(".msgpack"):
+            import msgpack
+
+            with open(path, "rb") as f:
+                data = msgpack.unpack(f, strict_map_key=False)
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        return cls.from_dict(data)
+
+
+def open_report(
+    region_code, year, path=None, region=None, as_of=None, dataset_version=None
+):
+    """Load the artifact at `path` if it exists, or start an empty one.
+
+    `region` may be passed (as from `parse_region_code`) if already resolved.
+    Nothing is computed; `ReportArtifact.compute` only reruns sections whose
+    inputs changed.
+    """
+    if path and os.path.exists(path):
+        artifact = ReportArtifact.load(path)
+        if artifact.region_code != region_code or artifact.year != year:
+            raise RuntimeError(
+                f"{path} is for {artifact.region_code} {artifact.year}, not {region_code} {year}"
+            )
+    else:
+        from ebirdcore.utils import parse_region_code
+
+        artifact = ReportArtifact(region or parse_region_code(region_code), year)
+    if as_of:
+        artifact.as_of = as_of
+    if dataset_version:
+        artifact.dataset_version = dataset_version
+    return artifact
+
+
+def compute_report(
+    region_code,
+    year,
+    with_photos=True,
+    fetcher=None,
+    sections=None,
+    artifact=None,
+    **kwargs,
+):
+    """Run the report queries for a region and year and return the artifact.
+
+    Only `sections` (default all) are computed.  Other keyword arguments are
+    passed to `open_report` unless an `artifact` is given.
+    """
+    artifact = artifact or open_report(region_code, year, **kwargs)
+    sections = sections or list(artifact.sections)
+    if with_photos and "media" in sections:
+        artifact.compute_photos(fetcher=fetcher)
+    return artifact.compute(sections)
+
+
+def load_or_compute_report(region_code, year, path=None, **kwargs):
+    """Load the artifact at `path` if it exists, then compute (and save) any
+    sections that are missing or out of date."""
+    artifact = compute_report(region_code, year, path=path, **kwargs)
+    if path and artifact.modified:
+        artifact.save(path)
+    return artifact
+
+
+def backfill_reports(region_code, years, path, **kwargs):
+    """Compute (and save) the artifact of every year in `years`.
+
+    `path` is formatted with the year, eg "report-US-DC-001-{year}.json".  The
+    in-process leaderboards (`ebirdcore.bitmaps`) are extracted once, up to the
+    last year, and cut off at each year's end; other tables are queried per
+    year.  Other keyword arguments are passed to `load_or_compute_report`.
+    """
+    from ebirdcore.bitmaps import sweep
+    from ebirdcore.utils import parse_region_code
+
+    region = parse_region_code(region_code)
+    artifacts = []
+    with sweep(region["where_clause"], max(years)):
+        for year in sorted(years):
+            t0 = time.time()
+            artifacts.append(
+                load_or_compute_report(
+                    region_code, year, path=path.format(year=year), region=region, **kwargs
+                )
+            )
+            logger.info(f"Backfilled {region_code} {year} in {time.time() - t0:.1f}s")
+    return artifacts
@@ -1,17 +1,27 @@
 import datetime
 import logging
-import requests
-from bs4 import BeautifulSoup
+import pickle
+from collections import namedtuple
+
 from .models import EBird
 from diskcache import Cache
 from django.db import connection
 
+from .explain import capture_plan
+from .instrumentation import span, tracing
+
 cache = Cache("cache_observer_name")
+query_cache = Cache("cachedir")
+# Set to False to always run queries against the database, eg when benchmarking.
+use_query_cache = True
 
 logger = logging.getLogger(__name__)
 
 from .utils import get_observer_name
 
+# Stands in for a cursor description column on tables built in Python.
+FakeColumn = namedtuple("FakeColumn", ("name", "type"))
+
 
 def fmtrow(r):
     return [fmt(x) for x in r]
@@ -51,16 +61,161 @@ def format_list_of_names(s):
     return ", ".join(lst)
 
 
+def rank_column(values):
+    """Competition ranks (1, 2, 2, 4, ...) for values already sorted."""
+    ranks = []
+    prev = object()
+    for rowidx, v in enumerate(values):
+        if v != prev:
+            rank = rowidx + 1
+            prev = v
+        ranks.append(rank)
+    return ranks
+
+
+class Columns:
+    """Query results stored column-wise: `columns[j]` is a tuple of column j's
+    raw values.
+
+    Also behaves as a sequence of row tuples, for code that goes row by row.
+    """
+
+    __slots__ = ("columns", "nrows")
+
+    def __init__(self, columns):
+        self.columns = [tuple(col) for col in columns]
+        self.nrows = len(self.columns[0]) if self.columns else 0
+
+    @classmethod
+    def from_rows(cls, rows, ncols):
+        rows = list(rows)
+        if not rows:
+            return cls([()] * ncols)
+        return cls(zip(*rows))
+
+    def __len__(self):
+        return self.nrows
+
+    def __iter__(self):
+        return zip(*self.columns)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Columns([col[i] for col in self.columns])
+        return tuple(col[i] for col in self.columns)
+
+
+def as_columns(vals, ncols):
+    """`vals` as `Columns`, reading it once if it's a list or an iterator of rows."""
+    if isinstance(vals, Columns):
+        return vals
+    return Columns.from_rows(vals, ncols)
+
+
+def column_values(vals, i):
+    """Values of column `i` of a `Columns` or a list of rows."""
+    if isinstance(vals, Columns):
+        return vals.columns[i]
+    return [row[i] for row in vals]
+
+
+def split_table(table):
+    """One table per value of the first column of `table` (eg per county),
+    without that column and captioned with the value, in order of appearance."""
+    title, subtitle, description, column_desc, vals = table
+    groups = {}
+    for row in vals:
+        groups.setdefault(row[0], []).append(row[1:])
+    return [
+        (title, str(key), description, list(column_desc)[1:], rows)
+        for key, rows in groups.items()
+    ]
+
+
+def fmt_column(values):
+    """`fmt` a column of values; only string columns need it."""
+    if any(isinstance(v, str) for v in values):
+        return [fmt(v) for v in values]
+    return values
+
+
 def namedtuplefetchall(cursor):
-    "Return all rows from a cursor as a namedtuple"
-    desc = cursor.description
+    "Return all rows from a cursor as raw values in `Columns`"
+    return Columns.from_rows(cursor.fetchall(), len(cursor.description))
+
+
+# Rows fetched per round trip by a server-side cursor.
+DEFAULT_ITERSIZE = 2000
+
+
+class QueryStream:
+    """The rows of `sql`, fetched `itersize` at a time from a named
+    server-side cursor, so a large result is never held in memory at once.
+
+    Iterate it for row tuples (once per pass; each pass re-runs the query), or
+    call `columns()` to collect it into `Columns`.  `description` is set once
+    the query has run.
+    """
 
-    return [fmtrow(row) for row in cursor.fetchall()]
+    def __init__(self, sql, itersize=DEFAULT_ITERSIZE):
+        self.sql = sql
+        self.itersize = itersize
+        self.description = None
+
+    def batches(self):
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(self.sql)
+            self.description = cursor.description
+            while rows := cursor.fetchmany(self.itersize):
+                yield rows
+
+    def __iter__(self):
+        for rows in self.batches():
+            yield from rows
+
+    def columns(self):
+        """Collect the result column-wise, one batch of rows at a time."""
+        cols = None
+        for rows in self.batches():
+            if cols is None:
+                cols = [[] for _ in self.description]
+            for col, values in zip(cols, zip(*rows)):
+                col.extend(values)
+        return Columns(cols if cols is not None else [()] * len(self.description))
+
+
+def iter_query(sql, itersize=DEFAULT_ITERSIZE):
+    """Stream the rows of `sql`, uncached, eg for exports."""
+    return QueryStream(sql, itersize=itersize)
+
+
+@query_cache.memoize()
+def _fetch_query(sql):
+    stream = QueryStream(sql)
+    vals = stream.columns()
+    return stream.description, vals
 
 
-@cache.memoize()
 def execute_query(sql):
-    with connection.cursor() as cursor:
-        cursor.execute(sql)
-        vals = namedtuplefetchall(cursor)
-        return cursor.description, vals
+    """Run `sql` (or return its cached result), recording it in the run's trace.
+
+    The result is kept whole, as report tables are stored in the artifact and
+    the query cache; it is only fetched in batches.  Read results too large
+    for that with `iter_query`.
+
+    `bytes` is the pickled size of the result, as stored in the query cache;
+    it is only measured while tracing.
+    """
+    with span("query", cat="query", sql=sql) as args:
+        capture_plan(sql, args.get("parent"))
+        if use_query_cache:
+            cache_key = _fetch_query.__cache_key__(sql)
+            args["cache"] = "hit" if cache_key in query_cache else "miss"
+            desc, vals = _fetch_query(sql)
+        else:
+            args["cache"] = "off"
+            desc, vals = _fetch_query.__wrapped__(sql)
+        args["rows"] = len(vals)
+        if tracing():
+            args["bytes"] = len(pickle.dumps(vals, pickle.HIGHEST_PROTOCOL))
+    return desc, vals
@@ -0,0 +1,563 @@
+"""
+Synthetic eBird Basic Dataset (EBD) files for scale testing.
+
+`SyntheticEBD(rows, scale=..., seed=...)` writes the 52-column, tab-separated
+EBD format that `ebird-create-db-and-load-ebd.sql` loads (`CUT_FIELDS` are the
+columns its `cut` keeps), so the loader and every report query can be run
+without a real EBD download.  The same seed always produces the same file.
+
+The data is shaped like the real thing where the report cares: observers and
+localities follow a power law, species are resident, summer, winter or
+passage migrants with matching seasonality, checklist sizes depend on the
+protocol, and there are breeding codes in season, media flags, a few
+unapproved records, and spuhs, slashes, ISSFs and hybrids.
+
+Rows are generated a chunk at a time with numpy, so memory stays flat from a
+county (10^5 rows) to a country (10^9 rows).
+"""
+import datetime
+import gzip
+import logging
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EBD_COLUMNS = (
+    "GLOBAL UNIQUE IDENTIFIER",
+    "LAST EDITED DATE",
+    "TAXONOMIC ORDER",
+    "CATEGORY",
+    "TAXON CONCEPT ID",
+    "COMMON NAME",
+    "SCIENTIFIC NAME",
+    "SUBSPECIES COMMON NAME",
+    "SUBSPECIES SCIENTIFIC NAME",
+    "EXOTIC CODE",
+    "OBSERVATION COUNT",
+    "BREEDING CODE",
+    "BREEDING CATEGORY",
+    "BEHAVIOR CODE",
+    "AGE/SEX",
+    "COUNTRY",
+    "COUNTRY CODE",
+    "STATE",
+    "STATE CODE",
+    "COUNTY",
+    "COUNTY CODE",
+    "IBA CODE",
+    "BCR CODE",
+    "USFWS CODE",
+    "ATLAS BLOCK",
+    "LOCALITY",
+    "LOCALITY ID",
+    "LOCALITY TYPE",
+    "LATITUDE",
+    "LONGITUDE",
+    "OBSERVATION DATE",
+    "TIME OBSERVATIONS STARTED",
+    "OBSERVER ID",
+    "OBSERVER ORCID ID",
+    "SAMPLING EVENT IDENTIFIER",
+    "OBSERVATION TYPE",
+    "PROTOCOL NAME",
+    "PROTOCOL CODE",
+    "PROJECT NAMES",
+    "PROJECT IDENTIFIERS",
+    "DURATION MINUTES",
+    "EFFORT DISTANCE KM",
+    "EFFORT AREA HA",
+    "NUMBER OBSERVERS",
+    "ALL SPECIES REPORTED",
+    "GROUP IDENTIFIER",
+    "HAS MEDIA",
+    "APPROVED",
+    "REVIEWED",
+    "REASON",
+    "TRIP COMMENTS",
+    "SPECIES COMMENTS",
+)
+
+# 1-based, as in the loader's `cut -f`.
+CUT_FIELDS = (1, 2, 3, 4, 6, 7, 8, 10, 11, 12, 13, 14, 16, 17, 18, 19, 20, 21, 25,
+              26, 27, 28, 29, 30, 31, 32, 33, 35, 38, 40, 41, 42, 43, 44, 45, 46,
+              47, 48, 49, 50, 51, 52)
+
+MD_COUNTIES = (
+    ("001", "Allegany"), ("003", "Anne Arundel"), ("005", "Baltimore"),
+    ("510", "Baltimore City"), ("009", "Calvert"), ("011", "Caroline"),
+    ("013", "Carroll"), ("015", "Cecil"), ("017", "Charles"),
+    ("019", "Dorchester"), ("021", "Frederick"), ("023", "Garrett"),
+    ("025", "Harford"), ("027", "Howard"), ("029", "Kent"),
+    ("031", "Montgomery"), ("033", "Prince George's"), ("035", "Queen Anne's"),
+    ("037", "St. Mary's"), ("039", "Somerset"), ("041", "Talbot"),
+    ("043", "Washington"), ("045", "Wicomico"), ("047", "Worcester"),
+)
+
+US_STATES = (
+    ("AL", "Alabama"), ("AK", "Alaska"), ("AZ", "Arizona"), ("AR", "Arkansas"),
+    ("CA", "California"), ("CO", "Colorado"), ("CT", "Connecticut"),
+    ("DE", "Delaware"), ("DC", "District of Columbia"), ("FL", "Florida"),
+    ("GA", "Georgia"), ("HI", "Hawaii"), ("ID", "Idaho"), ("IL", "Illinois"),
+    ("IN", "Indiana"), ("IA", "Iowa"), ("KS", "Kansas"), ("KY", "Kentucky"),
+    ("LA", "Louisiana"), ("ME", "Maine"), ("MD", "Maryland"),
+    ("MA", "Massachusetts"), ("MI", "Michigan"), ("MN", "Minnesota"),
+    ("MS", "Mississippi"), ("MO", "Missouri"), ("MT", "Montana"),
+    ("NE", "Nebraska"), ("NV", "Nevada"), ("NH", "New Hampshire"),
+    ("NJ", "New Jersey"), ("NM", "New Mexico"), ("NY", "New York"),
+    ("NC", "North Carolina"), ("ND", "North Dakota"), ("OH", "Ohio"),
+    ("OK", "Oklahoma"), ("OR", "Oregon"), ("PA", "Pennsylvania"),
+    ("RI", "Rhode Island"), ("SC", "South Carolina"), ("SD", "South Dakota"),
+    ("TN", "Tennessee"), ("TX", "Texas"), ("UT", "Utah"), ("VT", "Vermont"),
+    ("VA", "Virginia"), ("WA", "Washington"), ("WV", "West Virginia"),
+    ("WI", "Wisconsin"), ("WY", "Wyoming"),
+)
+
+
+def _us_counties(counties_per_state):
+    return [
+        (f"US-{code}", name, f"US-{code}-{2 * i + 1:03d}", f"{name} County {i + 1}")
+        for code, name in US_STATES
+        for i in range(counties_per_state)
+    ]
+
+
+# rows: default size; observers/localities_per_county: entity counts;
+# regions: (state_code, state, county_code, county).
+SCALES = {
+    "county": dict(
+        rows=10**5,
+        observers=3_000,
+        localities_per_county=2_000,
+        species=420,
+        regions=lambda: [("US-DC", "District of Columbia", "US-DC-001", "District of Columbia")],
+    ),
+    "state": dict(
+        rows=10**7,
+        observers=40_000,
+        localities_per_county=2_000,
+        species=480,
+        regions=lambda: [("US-MD", "Maryland", f"US-MD-{c}", n) for c, n in MD_COUNTIES],
+    ),
+    "country": dict(
+        rows=10**9,
+        observers=800_000,
+        localities_per_county=300,
+        species=1_000,
+        regions=lambda: _us_counties(60),
+    ),
+}
+
+# Families in taxonomic order: (name suffix, genus, share of species).
+FAMILIES = (
+    ("Goose", "Anser", 2), ("Duck", "Anas", 8), ("Grebe", "Podiceps", 2),
+    ("Dove", "Zenaida", 2), ("Cuckoo", "Coccyzus", 1), ("Nightjar", "Caprimulgus", 1),
+    ("Swift", "Chaetura", 1), ("Hummingbird", "Archilochus", 2), ("Rail", "Rallus", 2),
+    ("Plover", "Charadrius", 3), ("Sandpiper", "Calidris", 7), ("Gull", "Larus", 4),
+    ("Tern", "Sterna", 3), ("Loon", "Gavia", 1), ("Heron", "Ardea", 3),
+    ("Hawk", "Buteo", 4), ("Owl", "Strix", 3), ("Kingfisher", "Megaceryle", 1),
+    ("Woodpecker", "Picoides", 0), ("Falcon", "Falco", 2), ("Flycatcher", "Empidonax", 4),
+    ("Vireo", "Vireo", 3), ("Jay", "Cyanocitta", 2), ("Swallow", "Tachycineta", 3),
+    ("Wren", "Troglodytes", 3), ("Thrush", "Catharus", 4), ("Sparrow", "Spizella", 7),
+    ("Blackbird", "Agelaius", 3), ("Warbler", "Setophaga", 9), ("Tanager", "Piranga", 2),
+)
+
+# The woodpecker clean sweep is scored on these exact names.
+WOODPECKERS = (
+    ("Red-headed Woodpecker", "Melanerpes erythrocephalus"),
+    ("Red-bellied Woodpecker", "Melanerpes carolinus"),
+    ("Yellow-bellied Sapsucker", "Sphyrapicus varius"),
+    ("Downy Woodpecker", "Dryobates pubescens"),
+    ("Hairy Woodpecker", "Dryobates villosus"),
+    ("Pileated Woodpecker", "Dryocopus pileatus"),
+    ("Northern Flicker", "Colaptes auratus"),
+)
+
+# Introduced species, reported with exotic code N.
+NATURALIZED = (
+    ("Dove", "Rock Pigeon", "Columba livia"),
+    ("Blackbird", "European Starling", "Sturnus vulgaris"),
+    ("Sparrow", "House Sparrow", "Passer domesticus"),
+)
+
+ADJECTIVES = (
+    "Common", "Northern", "Eastern", "Western", "Southern", "Lesser", "Greater",
+    "American", "Little", "Great", "Red-eyed", "Black-throated", "Yellow-throated",
+    "Blue-winged", "Golden-winged", "Chestnut-sided", "White-crowned", "Gray-cheeked",
+    "Scarlet", "Spotted", "Ruddy", "Swainson's", "Hooded", "Cerulean", "Prairie",
+    "Pine", "Marsh", "Field", "Song", "Wood", "Sedge", "Cape May", "Bay-breasted",
+    "Least", "Solitary", "Pectoral", "Ring-necked", "Horned", "Barred", "Tufted",
+)
+
+STATUSES = ("resident", "summer", "winter", "migrant")
+
+PROTOCOLS = (
+    # code, name, share of checklists, mean species
+    ("P22", "Traveling", 0.55, 22),
+    ("P21", "Stationary", 0.33, 14),
+    ("P20", "Incidental", 0.08, 2),
+    ("P23", "Area", 0.01, 25),
+    ("P62", "Historical", 0.03, 18),
+)
+
+BREEDING_CODES = (
+    # code, category, weight
+    ("F", "C1", 4), ("H", "C2", 10), ("S", "C2", 12), ("S7", "C3", 2),
+    ("M", "C3", 1), ("P", "C3", 6), ("T", "C3", 3), ("C", "C3", 2),
+    ("N", "C3", 1), ("A", "C3", 2), ("B", "C3", 1), ("NB", "C4", 3),
+    ("CN", "C4", 3), ("DD", "C4", 1), ("ON", "C4", 3), ("FL", "C4", 5),
+    ("CF", "C4", 4), ("FY", "C4", 3), ("FS", "C4", 1), ("NE", "C4", 1),
+    ("NY", "C4", 2), ("UN", "C4", 1), ("PE", "C4", 1),
+)
+
+TRIP_COMMENTS = (
+    "Overcast, light wind.",
+    "Clear and cold.",
+    "Birding with the local club.",
+    "Counts are conservative.",
+    "Rain in the afternoon.",
+)
+
+EPOCH = datetime.date(2000, 1, 1)
+
+
+def _name_prefixes():
+    """Enough distinct "<adjective> " prefixes for the largest family."""
+    return list(ADJECTIVES) + [f"{a} {b}" for a in ADJECTIVES[:10] for b in ADJECTIVES[10:]]
+
+
+def power_law_cdf(n, alpha):
+    """CDF over ranks 1..n with P(rank k) proportional to k**-alpha."""
+    w = np.arange(1, n + 1, dtype=np.float64) ** -alpha
+    cdf = np.cumsum(w)
+    return cdf / cdf[-1]
+
+
+def _seasonality(status, weeks, rng):
+    if status == "resident":
+        return np.ones_like(weeks)
+    if status == "summer":
+        peak, width = 26 + rng.normal(0, 2), 9
+    elif status == "winter":
+        peak, width = 0 + rng.normal(0, 2), 8
+    else:
+        spring, fall = 19 + rng.normal(0, 1), 38 + rng.normal(0, 2)
+        return 0.02 + np.exp(-0.5 * ((weeks - spring) / 2) ** 2) + 0.7 * np.exp(
+            -0.5 * ((weeks - fall) / 3) ** 2
+        )
+    # Circular distance in weeks, so winter wraps around the new year.
+    d = np.abs(weeks - peak)
+    d = np.minimum(d, 53 - d)
+    return 0.02 + np.exp(-0.5 * (d / width) ** 2)
+
+
+class SyntheticEBD:
+    """Deterministic generator of EBD rows; iterate `chunks()` or call `write()`."""
+
+    def __init__(
+        self,
+        rows=None,
+        scale="county",
+        seed=0,
+        first_year=2010,
+        last_year=2025,
+        chunk_rows=1_000_000,
+    ):
+        if scale not in SCALES:
+            raise ValueError(f"Unknown scale {scale!r}, expected one of {', '.join(SCALES)}")
+        self.params = SCALES[scale]
+        self.rows = int(rows or self.params["rows"])
+        self.scale = scale
+        self.seed = seed
+        self.first_year = first_year
+        self.last_year = last_year
+        self.chunk_rows = chunk_rows
+
+        # Entity tables come from their own stream so that changing `rows`
+        # doesn't change the species, observers or places.
+        rng = np.random.default_rng([seed, 0])
+        self._build_species(rng)
+        self._build_places(rng)
+        self._build_observers(rng)
+        self._build_calendar()
+
+    # Entity tables
+
+    def _build_species(self, rng):
+        n_target = self.params["species"]
+        shares = np.array([f[2] for f in FAMILIES], dtype=np.float64)
+        per_family = np.maximum(1, np.round(shares / shares.sum() * n_target)).astype(int)
+
+        rows = []  # (category, common, scientific, subspecies common, subspecies sci, exotic)
+        for (family, genus, _), k in zip(FAMILIES, per_family):
+            if family == "Woodpecker":
+                species = [(common, sci, "") for common, sci in WOODPECKERS]
+            else:
+                species = [(common, sci, "N") for fam, common, sci in NATURALIZED if fam == family]
+                for adj in _name_prefixes()[: k - len(species)]:
+                    epithet = "".join(c for c in adj.lower() if c.isalpha())
+                    species.append((f"{adj} {family}", f"{genus} {epithet}i", ""))
+            for common, sci, exotic in species:
+                rows.append(("species", common, sci, "", "", exotic))
+            # One of each of the other categories per family, ordered as eBird does.
+            (c1, s1, _), (c2, s2, _) = species[0], species[-1]
+            if len(species) > 1:
+                rows.append(("slash", f"{c1}/{c2}", f"{s1}/{s2.split()[-1]}", "", "", ""))
+                rows.append(("hybrid", f"{c1} x {c2} (hybrid)", f"{s1} x {s2.split()[-1]}", "", "", ""))
+            rows.append(
+                ("issf", c1, s1, f"{c1} (Eastern)", f"{s1} orientalis", "")
+            )
+            rows.append(("spuh", f"{family.lower()} sp.", f"{genus} sp.", "", "", ""))
+        self.n_species = n = len(rows)
+
+        category = np.array([r[0] for r in rows])
+        is_species = category == "species"
+        # Abundance: heavy-tailed among species, rare for everything else.
+        abundance = np.where(
+            is_species,
+            rng.lognormal(0, 1.5, n),
+            np.where(category == "issf", 0.3, 0.02) * rng.lognormal(0, 0.5, n),
+        )
+        status = rng.choice(len(STATUSES), n, p=[0.35, 0.3, 0.15, 0.2])
+        status[~is_species] = 0
+        self.species_status = status
+
+        weeks = np.arange(53, dtype=np.float64)
+        season = np.stack(
+            [_seasonality(STATUSES[s], weeks, rng) for s in status], axis=1
+        )  # (53, n)
+        weight = season * abundance
+        cdf = np.cumsum(weight, axis=1)
+        cdf /= cdf[:, -1:]
+        cdf[:, -1] = 1.0
+        # One sorted array: row w holds week w's CDF shifted by w, so a single
+        # searchsorted picks species for rows from any mix of weeks.
+        self._species_cdf = (cdf + np.arange(53)[:, None]).ravel()
+
+        self._species_block = np.array(
+            [
+                f"\t{1000 + 10 * i}\t{cat}\t\t{common}\t{sci}\t{ssp}\t{ssp_sci}\t{exotic}\t"
+                for i, (cat, common, sci, ssp, ssp_sci, exotic) in enumerate(rows)
+            ],
+            dtype=object,
+        )
+        self._breeding_species = np.isin(status, [0, 1])
+
+    def _build_places(self, rng):
+        self.regions = regions = self.params["regions"]()
+        n_counties = len(regions)
+        # The busiest counties are scattered through the list, not the first few.
+        self.county_cdf = power_law_cdf(n_counties, 0.8)
+        self._county_order = rng.permutation(n_counties)
+        centers = np.column_stack(
+            [rng.uniform(25, 49, n_counties), rng.uniform(-124, -67, n_counties)]
+        )
+        self._county_centers = centers
+
+        per = self.params["localities_per_county"]
+        self.localities_per_county = per
+        self.locality_cdf = power_law_cdf(per, 1.0)
+        self._locality_offsets = rng.normal(0, 0.1, (per, 2))
+        self._region_block = [
+            f"United States\tUS\t{state}\t{state_code}\t{county}\t{county_code}\t\t\t\t\t"
+            for state_code, state, county_code, county in regions
+        ]
+        self._county_names = [r[3] for r in regions]
+
+    def _build_observers(self, rng):
+        n = self.params["observers"]
+        self.n_observers = n
+        self.observer_cdf = power_law_cdf(n, 1.1)
+        # Observers bird mostly in their home county.
+        self._observer_home = self._pick_county(rng, n)
+
+    def _build_calendar(self):
+        first = datetime.date(self.first_year, 1, 1)
+        last = datetime.date(self.last_year, 12, 31)
+        days = np.arange((first - EPOCH).days, (last - EPOCH).days + 1)
+        dates = np.datetime64(EPOCH, "D") + days.astype("timedelta64[D]")
+        years = dates.astype("datetime64[Y]").astype(int) + 1970
+        weekday = (dates.astype(np.int64) + 3) % 7  # 0 = Monday
+        doy = (dates - dates.astype("datetime64[Y]")).astype(int)
+        # eBird grows every year; weekends and May are busier.
+        weight = (
+            1.15 ** (years - self.first_year)
+            * np.where(weekday >= 5, 1.8, 1.0)
+            * (1 + 0.6 * np.exp(-0.5 * ((doy - 130) / 15) ** 2))
+        )
+        cdf = np.cumsum(weight)
+        self._day_cdf = cdf / cdf[-1]
+        self._days = days
+        self._last_day = days[-1]
+
+    def _pick_county(self, rng, n):
+        return self._county_order[
+            np.searchsorted(self.county_cdf, rng.random(n))
+        ]
+
+    # Rows
+
+    def header(self):
+        return "\t".join(EBD_COLUMNS) + "\n"
+
+    def chunks(self):
+        """Yield the file's text: the header, then blocks of about `chunk_rows` rows."""
+        yield self.header()
+        rng = np.random.default_rng([self.seed, 1])
+        written = 0
+        checklist_id = 0
+        while written < self.rows:
+            want = min(self.chunk_rows, self.rows - written)
+            text, n_rows, n_checklists = self._chunk(rng, want, written, checklist_id)
+            if not n_rows:
+                break
+            yield text
+            written += n_rows
+            checklist_id += n_checklists
+        logger.info(f"Generated {written} rows on {checklist_id} checklists")
+
+    def _chunk(self, rng, want, first_row, first_checklist):
+        # Checklists
+        protocol_p = np.array([p[2] for p in PROTOCOLS])
+        n_cl = max(1, int(want / 16))
+        protocol = rng.choice(len(PROTOCOLS), n_cl, p=protocol_p / protocol_p.sum())
+        mean_size = np.array([p[3] for p in PROTOCOLS])[protocol]
+        size = np.maximum(1, np.round(rng.lognormal(np.log(mean_size), 0.55))).astype(np.int64)
+        size = np.minimum(size, self.n_species)
+
+        # Only whole checklists, up to `want` rows.
+        end = np.cumsum(size)
+        n_cl = int(np.searchsorted(end, want, side="right"))
+        if not n_cl:
+            return "", 0, 0
+        protocol, size = protocol[:n_cl], size[:n_cl]
+
+        observer = np.searchsorted(self.observer_cdf, rng.random(n_cl))
+        county = np.where(
+            rng.random(n_cl) < 0.9,
+            self._observer_home[observer],
+            self._pick_county(rng, n_cl),
+        )
+        local = np.searchsorted(self.locality_cdf, rng.random(n_cl))
+        day = self._days[np.searchsorted(self._day_cdf, rng.random(n_cl))]
+        date = np.datetime64(EPOCH, "D") + day.astype("timedelta64[D]")
+        week = np.minimum(
+            (date - date.astype("datetime64[Y]")).astype(int) // 7, 52
+        )
+        start_min = np.clip(rng.normal(8.5 * 60, 150, n_cl), 0, 24 * 60 - 1).astype(int)
+        duration = np.maximum(1, rng.lognormal(np.log(60), 0.7, n_cl)).astype(int)
+        distance = rng.lognormal(np.log(2), 0.8, n_cl)
+        n_observers = rng.geometric(0.7, n_cl)
+        edited = np.minimum(day + rng.geometric(0.05, n_cl) - 1, self._last_day)
+        edited_secs = rng.integers(0, 86400, n_cl)
+        comment = np.where(
+            rng.random(n_cl) < 0.05, rng.integers(0, len(TRIP_COMMENTS), n_cl), -1
+        )
+
+        checklist_block = []
+        edited_block = []
+        trip_tail = []
+        for i in range(n_cl):
+            c, l, p = county[i], local[i], PROTOCOLS[protocol[i]][0]
+            lat, lon = self._county_centers[c] + self._locality_offsets[l]
+            hotspot = l < self.localities_per_county // 10
+            loc_name = (
+                f"{self._county_names[c]} Park {l}" if hotspot else f"Yard {c}-{l}"
+            )
+            timed = p not in ("P20", "P62")
+            d = datetime.date.fromordinal(EPOCH.toordinal() + int(day[i]))
+            e = datetime.date.fromordinal(EPOCH.toordinal() + int(edited[i]))
+            s = int(edited_secs[i])
+            edited_block.append(
+                f"\t{e.isoformat()} {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+            )
+            checklist_block.append(
+                f"{self._region_block[c]}{loc_name}\tL{c * self.localities_per_county + l + 1}"
+                f"\t{'H' if hotspot else 'P'}\t{lat:.6f}\t{lon:.6f}\t{d.isoformat()}"
+                f"\t{(f'{start_min[i] // 60:02d}:{start_min[i] % 60:02d}:00') if p != 'P62' else ''}"
+                f"\tobsr{observer[i] + 1}\t\tS{first_checklist + i + 1}\t"
+                f"\t{PROTOCOLS[protocol[i]][1]}\t{p}\teBird\tEBIRD"
+                f"\t{duration[i] if timed else ''}"
+                f"\t{f'{distance[i]:.3f}' if p == 'P22' else ''}"
+                f"\t{f'{distance[i] * 10:.1f}' if p == 'P23' else ''}"
+                f"\t{n_observers[i]}\t{0 if p == 'P20' else 1}\t"
+            )
+            trip_tail.append(
+                f"\t{TRIP_COMMENTS[comment[i]] if comment[i] >= 0 else ''}\t\n"
+            )
+
+        # Observations: draw each checklist's species from its week's
+        # distribution and drop repeats.
+        cl = np.repeat(np.arange(n_cl), size)
+        wk = week[cl]
+        species = np.searchsorted(self._species_cdf, wk + rng.random(len(cl)))
+        species = np.clip(species - wk * self.n_species, 0, self.n_species - 1)
+        key = np.unique(cl.astype(np.int64) * self.n_species + species)
+        cl, species = key // self.n_species, key % self.n_species
+        n = len(cl)
+
+        counts = np.minimum(rng.geometric(0.25, n), 999)
+        counts[rng.random(n) < 0.04] = 0  # "X"
+        count_str = np.array(["X"] + [str(i) for i in range(1, 1000)], dtype=object)[counts]
+
+        wk = week[cl]
+        breeding = np.full(n, -1)
+        in_season = (wk >= 14) & (wk <= 32) & self._breeding_species[species]
+        coded = in_season & (rng.random(n) < 0.06)
+        bw = np.array([b[2] for b in BREEDING_CODES], dtype=np.float64)
+        breeding[coded] = rng.choice(len(BREEDING_CODES), coded.sum(), p=bw / bw.sum())
+        breeding_str = np.array(
+            [f"\t{c}\t{cat}\t\t\t" for c, cat, _ in BREEDING_CODES] + ["\t\t\t\t\t"],
+            dtype=object,
+        )[breeding]
+
+        # has_media, approved/reviewed/reason.
+        flags = (rng.random(n) < 0.02).astype(int)
+        r = rng.random(n)
+        flags += 2 * ((r < 0.003).astype(int) + (r < 0.005).astype(int))
+        flag_str = np.array(
+            [
+                "\t0\t1\t0\t",
+                "\t1\t1\t0\t",
+                "\t0\t0\t0\tSpecies",
+                "\t1\t0\t0\tSpecies",
+                "\t0\t0\t1\tIntroduced/Exotic",
+                "\t1\t0\t1\tIntroduced/Exotic",
+            ],
+            dtype=object,
+        )[flags]
+
+        guid = np.array(
+            [
+                f"URN:CornellLabOfOrnithology:EBIRD:OBS{first_row + i + 1}"
+                for i in range(n)
+            ],
+            dtype=object,
+        )
+        lines = (
+            guid
+            + np.array(edited_block, dtype=object)[cl]
+            + self._species_block[species]
+            + count_str
+            + breeding_str
+            + np.array(checklist_block, dtype=object)[cl]
+            + flag_str
+            + np.array(trip_tail, dtype=object)[cl]
+        )
+        return "".join(lines.tolist()), n, n_cl
+
+    def write(self, path):
+        """Write the dataset to `path` ("-" for stdout, gzipped if it ends in .gz)."""
+        if path == "-":
+            f, close = sys.stdout, False
+        elif path.endswith(".gz"):
+            f, close = gzip.open(path, "wt", encoding="utf-8", newline=""), True
+        else:
+            f, close = open(path, "w", encoding="utf-8", newline=""), True
+        try:
+            for text in self.chunks():
+                f.write(text)
+        finally:
+            if close:
+                f.close()
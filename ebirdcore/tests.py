@@ -1,3 +1,897 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.db import ProgrammingError
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase
+
+from ebirdcore import (
+    binary_copy,
+    bitmaps,
+    challenges,
+    explain,
+    instrumentation,
+    report_artifact,
+    sql_utils,
+    views,
+    ytd,
+)
+from ebirdcore.challenges import challenge_table
+from ebirdcore.report_artifact import ReportArtifact
+from ebirdcore.sql_utils import FakeColumn
+from ebirdcore.synthetic import SyntheticEBD
+
+REGION = {
+    "code": "US-DC-001",
+    "description": "District of Columbia",
+    "where_clause": "county_code = 'US-DC-001'",
+}
+
+# Imported by commands that don't build a PDF or plot anything.
+LIGHT_MODULES = [
+    "ebirdcore.queries",
+    "ebirdcore.report_artifact",
+    "ebirdcore.management.commands.year_end_report_compute",
+    "ebirdcore.management.commands.year_end_report_html",
+    "ebirdcore.management.commands.year_end_report_batch",
+]
+HEAVY_MODULES = ["pylatex", "matplotlib", "pandas", "bs4", "requests", "numpy"]
+
+# The heavy modules are blocked, so importing one raises ImportError.
+# django.contrib.gis only uses numpy if it can be imported.
+IMPORT_SCRIPT = """
+import json, sys
+for m in json.loads(sys.argv[2]):
+    sys.modules[m] = None
+import django
+django.setup()
+try:
+    __import__(sys.argv[1])
+except ImportError as e:
+    print(json.dumps([e.name]))
+else:
+    print(json.dumps([]))
+"""
+
+
+class ImportTest(SimpleTestCase):
+    """Each command runs in a fresh process (and batch workers spawn many), so
+    importing a command mustn't pull in the LaTeX, plotting or scraping
+    libraries it doesn't use."""
+
+    def _import(self, module):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "ebirddb.settings")
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT, module, json.dumps(HEAVY_MODULES)],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return json.loads(out.splitlines()[-1])
+
+    def test_light_modules(self):
+        for module in LIGHT_MODULES:
+            with self.subTest(module=module):
+                self.assertEqual(self._import(module), [])
+
+
+class FakeQueries:
+    """Stands in for `Queries`: every table is the same one row."""
+
+    @staticmethod
+    def year_stats(region_where_clause, as_of, **kwargs):
+        return (
+            "Year Stats",
+            "All",
+            None,
+            [FakeColumn("Observer", None), FakeColumn("Species", None)],
+            [("A Birder", 200)],
+        )
+
+    new_birds = year_stats
+
+    @staticmethod
+    def challenge(region_where_clause, as_of, name, year=None, **kwargs):
+        return challenge_table(name, region_where_clause, as_of, year=year)
+
+
+class ExplainArtifactTest(SimpleTestCase):
+    """--explain computes a fresh artifact, which mustn't replace --artifact."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "report.json")
+        ReportArtifact(REGION, 2024).save(self.path)
+        with open(self.path, "rb") as f:
+            self.saved = f.read()
+        # No pg_stat_statements without a database.
+        patcher = mock.patch(
+            "ebirdcore.instrumentation.pg_stat_statements_snapshot", return_value=None
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fresh_artifact(self, *args, **kwargs):
+        return ReportArtifact(REGION, 2024, queries=FakeQueries)
+
+    def options(self, output):
+        return [
+            "-r", "US-DC-001", "-y", "2024", "--only", "year_in_review",
+            "--artifact", self.path, "--explain",
+            "-o", os.path.join(self.dir, output),
+            "--trace", os.path.join(self.dir, "trace.json"),
+        ]
+
+    def assert_unchanged(self):
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.saved)
+
+    def test_html(self):
+        with mock.patch(
+            "ebirdcore.management.commands.year_end_report_html.open_report",
+            self.fresh_artifact,
+        ):
+            out = io.StringIO()
+            call_command(
+                "year_end_report_html", "--no-photos", *self.options("r.html"), stdout=out
+            )
+        self.assert_unchanged()
+        self.assertIn("year_in_review (section)", out.getvalue())
+
+    def test_finish_capture(self):
+        plan = {
+            "execution_ms": 120.0, "flags": ["seq scan: Seq Scan on ebird"],
+            "shape": ["Seq Scan on ebird"],
+        }
+        path = os.path.join(self.dir, "r.plans.json")
+        explain.start_capture().plans = {"year_in_review#0": dict(plan, execution_ms=10.0)}
+        explain.finish_capture(path)
+        explain.start_capture().plans = {"year_in_review#0": plan}
+        with mock.patch("builtins.print") as print_:
+            capture = explain.finish_capture(path)
+        print_.assert_not_called()
+        self.assertEqual(capture.baseline, path)
+        self.assertEqual(capture.changes, ["year_in_review#0: 10.0 ms -> 120.0 ms"])
+        report = capture.report()
+        self.assertIn("seq scan: Seq Scan on ebird", report)
+        self.assertIn(f"1 plan changes since {path}", report)
+
+    def test_pdf(self):
+        def compute(*args, **kwargs):
+            return self.fresh_artifact().compute(kwargs["sections"])
+
+        module = "ebirdcore.management.commands.year_end_report"
+        with mock.patch(f"{module}.load_or_compute_report", compute), mock.patch(
+            f"{module}.generate_pdf_incremental"
+        ):
+            call_command("year_end_report", *self.options("r"))
+        self.assert_unchanged()
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [FakeColumn("n", None), FakeColumn("square", None)]
+        self.fetched = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.pos = 0
+
+    def fetchmany(self, size):
+        batch = self.rows[self.pos : self.pos + size]
+        self.pos += size
+        self.fetched.append(len(batch))
+        return batch
+
+
+class QueryStreamTest(SimpleTestCase):
+    """Results are read from a server-side cursor `itersize` rows at a time."""
+
+    def setUp(self):
+        self.cursor = FakeCursor([(n, n * n) for n in range(7)])
+        connection = mock.Mock(chunked_cursor=mock.Mock(return_value=self.cursor))
+        patcher = mock.patch.object(sql_utils, "connection", connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches(self):
+        stream = sql_utils.iter_query("select", itersize=3)
+        self.assertEqual([len(b) for b in stream.batches()], [3, 3, 1])
+        self.assertEqual(stream.description, self.cursor.description)
+
+    def test_rows(self):
+        self.assertEqual(list(sql_utils.iter_query("select", itersize=3)), self.cursor.rows)
+        self.assertEqual(self.cursor.fetched, [3, 3, 1, 0])
+
+    def test_columns(self):
+        vals = sql_utils.QueryStream("select", itersize=2).columns()
+        self.assertEqual(vals.columns, [tuple(range(7)), tuple(n * n for n in range(7))])
+        self.assertEqual(self.cursor.fetched, [2, 2, 2, 1, 0])
+
+
+class TracerTest(SimpleTestCase):
+    """Spans are only kept between `start_run` and `finish_run`."""
+
+    def setUp(self):
+        patcher = mock.patch(
+            "ebirdcore.instrumentation.pg_stat_statements_snapshot", return_value=None
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_run(self):
+        with instrumentation.span("outside") as args:
+            args["rows"] = 1
+        self.assertFalse(instrumentation.tracing())
+
+    def test_run(self):
+        tracer = instrumentation.start_run()
+        self.assertTrue(instrumentation.tracing())
+        with instrumentation.span("section"):
+            with instrumentation.span("query", cat="query") as args:
+                args["rows"] = 1
+        with mock.patch("builtins.print") as print_:
+            self.assertIs(instrumentation.finish_run(), tracer)
+        print_.assert_not_called()
+        self.assertEqual([e["name"] for e in tracer.events], ["query", "section"])
+        self.assertEqual(tracer.events[0]["args"], {"parent": "section", "rows": 1})
+
+        self.assertFalse(instrumentation.tracing())
+        with instrumentation.span("after"):
+            pass
+        self.assertEqual(len(tracer.events), 2)
+
+
+class FingerprintTest(SimpleTestCase):
+    """Sections go stale when their queries, or the helpers those call, change."""
+
+    def artifact(self):
+        artifact = ReportArtifact(REGION, 2024, queries=FakeQueries)
+        artifact._sections = {"stats": ["year_stats"], "challenges": ["challenge"]}
+        artifact._specs = {
+            "year_stats": ("year_stats", {}),
+            "challenge": ("challenge", dict(name="yard")),
+        }
+        return artifact
+
+    def test_helper_modules(self):
+        self.assertEqual(
+            list(report_artifact._helper_sources("return challenge_table(name)")),
+            ["ebirdcore.challenges"],
+        )
+        self.assertEqual(
+            list(report_artifact._helper_sources("day_lists(a, b).top_day_lists()")),
+            ["ebirdcore.binary_copy", "ebirdcore.bitmaps"],
+        )
+        self.assertEqual(report_artifact._helper_sources("select 1"), {})
+
+    def test_helper_change(self):
+        before = {s: self.artifact().fingerprint(s) for s in ["stats", "challenges"]}
+        with mock.patch.object(
+            report_artifact, "_module_source", lambda name: f"edited {name}"
+        ):
+            after = {s: self.artifact().fingerprint(s) for s in ["stats", "challenges"]}
+        self.assertEqual(before["stats"], after["stats"])
+        self.assertNotEqual(before["challenges"], after["challenges"])
+
+
+OBSERVERS = ["obsr5", "obsr1", "obsr4", "obsr2", "obsr3"]
+NAMES = ["Eve", "Bob", "Dan", "Al", "Cy"]
+
+
+def species_tuples(seed=1, n=6000, n_species=70):
+    """{(observer, species, year, month): first seen} for random sightings
+    of `n_species` species (70: two bitmap words) in 2020-2022."""
+    rng = random.Random(seed)
+    first = {}
+    for _ in range(n):
+        date = datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(3 * 365))
+        obs, sp = rng.randrange(len(OBSERVERS)), rng.randrange(n_species)
+        key = (obs, sp, date.year, date.month)
+        first[key] = min(first.get(key, date), date)
+    return first
+
+
+def species_bitmaps(tuples):
+    keys = list(tuples)
+    rows = {
+        field: np.array([k[i] for k in keys])
+        for i, field in enumerate(["obs", "sp", "year", "month"])
+    }
+    rows["first_seen"] = np.array(
+        [(tuples[k] - datetime.date(2000, 1, 1)).days for k in keys]
+    )
+    return bitmaps.SpeciesBitmaps(
+        OBSERVERS,
+        NAMES,
+        [sorted(NAMES).index(name) + 1 for name in NAMES],
+        [f"Species {i}" for i in range(70)],
+        rows,
+    )
+
+
+def naive_board(lists, limit=10):
+    """(name, list size) rows, biggest first, as the SQL leaderboards order them."""
+    rows = [(NAMES[obs], len(species)) for obs, species in lists.items() if species]
+    return sorted(rows, key=lambda r: (-r[1], r[0]))[:limit]
+
+
+class SpeciesBitmapsTest(SimpleTestCase):
+    """The NumPy leaderboards agree with set arithmetic over the same tuples."""
+
+    def setUp(self):
+        self.tuples = species_tuples()
+        self.bm = species_bitmaps(self.tuples)
+
+    def lists(self, keep):
+        lists = {obs: set() for obs in range(len(OBSERVERS))}
+        for (obs, sp, year, month), first in self.tuples.items():
+            if keep(year, month, first):
+                lists[obs].add(sp)
+        return lists
+
+    def closeouts(self, as_of=None):
+        months = {}
+        for (obs, sp, year, month), first in self.tuples.items():
+            if as_of is None or first <= as_of:
+                months.setdefault((obs, sp), set()).add(month)
+        lists = {obs: set() for obs in range(len(OBSERVERS))}
+        for (obs, sp), seen in months.items():
+            if len(seen) == 12:
+                lists[obs].add(sp)
+        return lists
+
+    def test_bitmaps(self):
+        def dense(keys, mask):
+            # One full-width row per tuple, OR-ed per key.
+            keys, sp = keys[mask], self.bm.sp[mask]
+            uniq, inverse = np.unique(keys, return_inverse=True)
+            words = np.zeros((len(uniq), self.bm.n_words), dtype=np.uint64)
+            for group, s in zip(inverse, sp):
+                words[group, s >> 6] |= np.uint64(1) << np.uint64(s & 63)
+            return uniq, words
+
+        period, _, _ = self.bm.periods(by_month=True)
+        for keys, mask in [
+            (self.bm.obs, self.bm.select()),
+            (self.bm.obs, self.bm.select(year=2021, month=3)),
+            (period, self.bm.select(since_year=2022)),
+            (self.bm.obs, self.bm.select(year=1999)),
+        ]:
+            uniq, words = self.bm.bitmaps(keys, mask)
+            expected_uniq, expected_words = dense(keys, mask)
+            np.testing.assert_array_equal(uniq, expected_uniq)
+            np.testing.assert_array_equal(words, expected_words)
+            self.assertEqual(words.shape, (len(uniq), 2))
+
+    def test_life_list(self):
+        _, rows = self.bm.top_year_lists()
+        self.assertEqual(rows, naive_board(self.lists(lambda y, m, d: True)))
+
+    def test_year_list(self):
+        _, rows = self.bm.top_year_lists(year=2021, limit=3)
+        self.assertEqual(rows, naive_board(self.lists(lambda y, m, d: y == 2021), 3))
+
+    def test_month_life_list(self):
+        _, rows = self.bm.top_year_lists(month=5)
+        self.assertEqual(rows, naive_board(self.lists(lambda y, m, d: m == 5)))
+
+    def test_life_list_change(self):
+        as_of, prev = datetime.date(2021, 6, 30), datetime.date(2020, 12, 31)
+        _, rows = self.bm.top_year_lists(as_of=str(as_of), prev_as_of=str(prev))
+        now = self.lists(lambda y, m, d: d <= as_of)
+        before = self.lists(lambda y, m, d: d <= prev)
+        self.assertEqual(
+            rows,
+            [
+                (name, n, bitmaps.fmt_change(n - len(before[NAMES.index(name)])))
+                for name, n in naive_board(now)
+            ],
+        )
+
+    def test_month_closeouts(self):
+        lists = self.closeouts()
+        self.assertTrue(any(lists.values()))
+        _, rows = self.bm.top_month_closeouts()
+        self.assertEqual(rows, naive_board(lists))
+
+    def test_month_closeouts_as_of(self):
+        as_of = datetime.date(2021, 3, 31)
+        _, rows = self.bm.top_month_closeouts(as_of=str(as_of))
+        self.assertEqual(rows, naive_board(self.closeouts(as_of)))
+
+    def test_rookies(self):
+        # Eve (observer 0) starts in 2022.
+        tuples = {
+            k: d for k, d in self.tuples.items() if k[0] != 0 or k[2] == 2022
+        }
+        bm = species_bitmaps(tuples)
+        for year, rookies in [(2021, []), (2022, ["Eve"])]:
+            with self.subTest(year=year):
+                _, rows = bm.top_year_lists(year=year, started_on_or_after_year=year)
+                self.assertEqual([r[0] for r in rows], rookies)
+        _, rows = bm.top_year_lists(year=2022, started_on_or_after_year=2022)
+        self.assertEqual(
+            rows[0][1], len({k[1] for k in tuples if k[0] == 0 and k[2] == 2022})
+        )
+
+    def test_month_closeout_birds(self):
+        lists = self.closeouts()
+        birders = {}
+        for obs, species in lists.items():
+            for sp in species:
+                birders.setdefault(f"Species {sp}", []).append(NAMES[obs])
+        expected = sorted(
+            (
+                (name, len(who), ", ".join(sorted(who)) if len(who) <= 2 else None)
+                for name, who in birders.items()
+            ),
+            key=lambda r: (-r[1], r[0]),
+        )
+        _, rows = self.bm.month_closeout_birds()
+        self.assertEqual(rows, expected)
+        self.assertTrue(any(r[2] for r in rows))
+
+    def test_month_closeouts_best_years(self):
+        # Few species, so some are closed out within a year.
+        tuples = species_tuples(n=2500, n_species=5)
+        months = {}
+        for (obs, sp, year, month), first in tuples.items():
+            months.setdefault((obs, year, sp), set()).add(month)
+        counts = {}
+        for (obs, year, sp), seen in months.items():
+            if len(seen) == 12:
+                counts[obs, year] = counts.get((obs, year), 0) + 1
+        expected = sorted(
+            ((NAMES[obs], year, n) for (obs, year), n in counts.items()),
+            key=lambda r: (-r[2], r[0], r[1]),
+        )[:10]
+        self.assertTrue(expected)
+        _, rows = species_bitmaps(tuples).top_month_closeouts_best_years()
+        self.assertEqual(rows, expected)
+
+    def test_until(self):
+        _, rows = self.bm.until(2020).top_year_lists()
+        self.assertEqual(rows, naive_board(self.lists(lambda y, m, d: y <= 2020)))
+
+
+class FakeCopyCursor:
+    """A cursor whose COPY streams `data` in `block` byte pieces."""
+
+    def __init__(self, columns, data, block=7):
+        self.description = [
+            SimpleNamespace(name=name, type_code=oid) for name, oid in columns
+        ]
+        self.data = data
+        self.block = block
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        pass
+
+    @contextmanager
+    def copy(self, sql):
+        yield (
+            self.data[i : i + self.block] for i in range(0, len(self.data), self.block)
+        )
+
+
+def copy_binary(rows):
+    """A COPY BINARY stream of (int4, float8, date) rows."""
+    out = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    for n, x, days in rows:
+        out += struct.pack(">h", 3)
+        out += struct.pack(">ii", 4, n)
+        out += struct.pack(">id", 8, x)
+        out += struct.pack(">ii", 4, days)
+    return out + struct.pack(">h", -1)
+
+
+class BinaryCopyTest(SimpleTestCase):
+    """COPY BINARY streams are decoded into structured arrays, across blocks."""
+
+    COLUMNS = [("n", 23), ("x", 701), ("date", 1082)]
+    ROWS = [(i, i / 4, 7000 + i) for i in range(-3, 50)]
+
+    def fetch(self, data):
+        cursor = FakeCopyCursor(self.COLUMNS, data)
+        connection = mock.Mock(cursor=mock.Mock(return_value=cursor))
+        with mock.patch.object(binary_copy, "connection", connection):
+            return binary_copy.fetch_arrays("select n, x, date from t")
+
+    def test_decode(self):
+        # Small blocks, so rows are split across COPY messages and decodes.
+        with mock.patch.object(binary_copy, "BLOCK_BYTES", 100):
+            result = self.fetch(copy_binary(self.ROWS))
+        self.assertEqual(result.dtype.names, ("n", "x", "date"))
+        self.assertEqual(result["n"].dtype, np.dtype("int32"))
+        self.assertEqual([tuple(r) for r in result.tolist()], self.ROWS)
+        self.assertEqual(
+            binary_copy.to_datetime64(result["date"][:1])[0],
+            np.datetime64("2019-02-27"),
+        )
+
+    def test_empty(self):
+        self.assertEqual(len(self.fetch(copy_binary([]))), 0)
+
+    def test_truncated(self):
+        with self.assertRaises(RuntimeError):
+            self.fetch(copy_binary(self.ROWS)[:-2])
+
+    def test_variable_width(self):
+        with self.assertRaises(ValueError):
+            binary_copy._copy_query("select name from t", [("name", 25)])
+
+
+class ArtifactTest(SimpleTestCase):
+    """Artifacts round-trip through JSON and MessagePack, and only sections
+    whose inputs changed are recomputed."""
+
+    def artifact(self, **kwargs):
+        artifact = ReportArtifact(REGION, 2024, queries=FakeQueries, **kwargs)
+        artifact._sections = {"stats": ["year_stats"], "new": ["new_birds"]}
+        artifact._specs = {
+            "year_stats": ("year_stats", dict(year=2024)),
+            "new_birds": ("new_birds", dict(year=2024)),
+        }
+        return artifact
+
+    def test_round_trip(self):
+        artifact = self.artifact(photos=[{"url": "https://example.org/1.jpg"}])
+        artifact.compute()
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("report.json", "report.msgpack"):
+                with self.subTest(name=name):
+                    path = os.path.join(tmp, name)
+                    artifact.save(path)
+                    loaded = ReportArtifact.load(path)
+                    self.assertEqual(loaded.to_dict(), artifact.to_dict())
+                    title, _, _, columns, vals = loaded.tables["year_stats"]
+                    self.assertEqual(title, "Year Stats")
+                    self.assertEqual([c.name for c in columns], ["Observer", "Species"])
+                    self.assertEqual(list(vals), [("A Birder", 200)])
+
+    def test_stale(self):
+        artifact = self.artifact()
+        self.assertTrue(artifact.is_stale("stats"))
+        artifact.compute()
+        self.assertTrue(artifact.modified)
+        self.assertFalse(artifact.is_stale("stats"))
+
+        loaded = ReportArtifact.from_dict(artifact.to_dict())
+        loaded._queries, loaded._sections, loaded._specs = (
+            FakeQueries,
+            artifact.sections,
+            artifact.specs,
+        )
+        loaded.compute()
+        self.assertFalse(loaded.modified)
+
+        # Other parameters, or a table gone missing, make a section stale.
+        loaded._specs = dict(loaded.specs, new_birds=("new_birds", dict(year=2023)))
+        self.assertFalse(loaded.is_stale("stats"))
+        self.assertTrue(loaded.is_stale("new"))
+        del loaded.tables["year_stats"]
+        self.assertTrue(loaded.is_stale("stats"))
+
+    def test_release(self):
+        artifact = self.artifact().compute()
+        artifact.release("new")
+        self.assertEqual(list(artifact.tables), ["year_stats"])
+        self.assertTrue(artifact.is_stale("new"))
+        self.assertFalse(artifact.is_stale("stats"))
+
+    def test_render_release(self):
+        from ebirdcore.management.commands.year_end_report_html import iter_report_html
+
+        for release, tables in [(False, ["year_stats", "new_birds"]), (True, [])]:
+            with self.subTest(release=release):
+                artifact = ReportArtifact(REGION, 2024, queries=FakeQueries)
+                html = "".join(
+                    iter_report_html(artifact, sections=["year_in_review"], release=release)
+                )
+                self.assertIn("Year in Review", html)
+                self.assertEqual(sorted(artifact.tables), sorted(tables))
+
+    def test_fingerprint_inputs(self):
+        base = self.artifact().fingerprint("stats")
+        self.assertEqual(self.artifact().fingerprint("stats"), base)
+        self.assertNotEqual(
+            self.artifact(as_of="2024-06-30").fingerprint("stats"), base
+        )
+        self.assertNotEqual(
+            self.artifact(dataset_version="EBD_relJan-2026").fingerprint("stats"),
+            base,
+        )
+
+
+class YTDMergeTest(SimpleTestCase):
+    """Merging the rows edited since the watermark gives the same lists as an
+    extraction from scratch, however often they're merged."""
+
+    def setUp(self):
+        self.tuples = species_tuples()
+        cut = datetime.date(2022, 6, 30)
+        self.old = {k: d for k, d in self.tuples.items() if d <= cut}
+        # Edited rows: everything after the cut, plus some already merged.
+        self.delta = [
+            (OBSERVERS[obs], f"Species {sp}", year, month, d)
+            for (obs, sp, year, month), d in self.tuples.items()
+            if d > cut or sp % 7 == 0
+        ]
+
+    def test_merge_species(self):
+        merged = ytd.merge_species(species_bitmaps(self.old), self.delta)
+        expected = species_bitmaps(self.tuples)
+        for kwargs in [{}, dict(year=2022), dict(as_of="2022-09-30", prev_as_of="2022-06-30")]:
+            with self.subTest(**kwargs):
+                self.assertEqual(
+                    merged.top_year_lists(**kwargs), expected.top_year_lists(**kwargs)
+                )
+        self.assertEqual(merged.top_month_closeouts(), expected.top_month_closeouts())
+        again = ytd.merge_species(merged, self.delta)
+        self.assertEqual(len(again.obs), len(self.tuples))
+
+    def test_earliest_first_seen(self):
+        (obs, sp, year, month), d = next(iter(self.tuples.items()))
+        later = (OBSERVERS[obs], f"Species {sp}", year, month, d + datetime.timedelta(days=1))
+        bm = species_bitmaps(self.tuples)
+        merged = ytd.merge_species(bm, [later])
+        self.assertEqual(len(merged.obs), len(bm.obs))
+        self.assertEqual(
+            merged.top_year_lists(as_of=str(d)), bm.top_year_lists(as_of=str(d))
+        )
+
+    def test_new_observer(self):
+        with mock.patch.object(
+            ytd, "_rank_observers", return_value=(NAMES + ["Ann"], list(range(6)))
+        ) as rank:
+            merged = ytd.merge_species(
+                species_bitmaps(self.old),
+                [("obsr9", "Species 99", 2022, 7, datetime.date(2022, 7, 1))],
+            )
+        rank.assert_called_once_with(OBSERVERS + ["obsr9"])
+        self.assertEqual(merged.species[-1], "Species 99")
+        self.assertEqual(merged.n_words, 2)
+
+    def test_merge_days(self):
+        day = lambda s: (np.datetime64(s) - binary_copy.PG_EPOCH).astype(int)
+        days = np.zeros(2, dtype=[("obs", "i4"), ("date", "i4"), ("species", "i4")])
+        days[:] = [(0, day("2024-05-01"), 40), (1, day("2024-05-01"), 35)]
+        everyone = np.zeros(1, dtype=[("date", "i4"), ("birders", "i4"), ("species", "i4")])
+        everyone[:] = [(day("2024-05-01"), 2, 60)]
+        dl = bitmaps.DayLists(OBSERVERS, NAMES, [5, 2, 4, 1, 3], days, everyone)
+
+        may1, may2 = datetime.date(2024, 5, 1), datetime.date(2024, 5, 2)
+        merged = ytd.merge_days(
+            dl, [("obsr5", may1, 42), ("obsr1", may2, 50)], [(may1, 2, 61), (may2, 1, 50)]
+        )
+        self.assertEqual(
+            merged.top_day_lists()[1],
+            [("Bob", may2, 50), ("Eve", may1, 42), ("Bob", may1, 35)],
+        )
+        self.assertEqual(
+            merged.everyone_day_lists()[1], [(may1, 2, 61), (may2, 1, 50)]
+        )
+
+
+class SyntheticTest(SimpleTestCase):
+    """The synthetic EBD depends only on its parameters."""
+
+    def generate(self, seed, rows=3000):
+        return "".join(SyntheticEBD(rows, seed=seed, chunk_rows=1000).chunks())
+
+    def test_deterministic(self):
+        text = self.generate(1)
+        self.assertEqual(self.generate(1), text)
+        self.assertNotEqual(self.generate(2), text)
+
+        # Whole checklists only, so a few rows short of the target.
+        lines = text.splitlines()
+        self.assertTrue(2900 < len(lines) - 1 <= 3000)
+        self.assertTrue(all(len(line.split("\t")) == 52 for line in lines))
+
+    def test_rows_independent(self):
+        # The row count doesn't change the species, observers, places or the
+        # chunks before it's reached.
+        def first_chunk(rows):
+            return list(SyntheticEBD(rows, seed=1, chunk_rows=1000).chunks())[:2]
+
+        self.assertEqual(first_chunk(1000), first_chunk(3000))
+
+
+class ReportViewTest(SimpleTestCase):
+    """The report view is for staff, and 404s on regions and years without data."""
+
+    def setUp(self):
+        patcher = mock.patch.object(views, "parse_region_code", return_value=REGION)
+        self.parse = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, region_code="US-DC-001", year=2024, staff=True):
+        request = RequestFactory().get(f"/report/{region_code}/{year}/")
+        request.user = SimpleNamespace(is_active=True, is_staff=staff)
+        return views.report_html(request, region_code, year)
+
+    def test_staff_only(self):
+        response = self.get(staff=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/admin/login/", response["Location"])
+
+    def test_unknown_region(self):
+        self.parse.side_effect = RuntimeError("No data for region US-XX")
+        with self.assertRaisesMessage(Http404, "No data for region US-XX"):
+            self.get("US-XX")
+
+    def test_missing_catalog(self):
+        self.parse.side_effect = ProgrammingError('relation "ebird_region" does not exist')
+        with self.assertLogs("ebirdcore.views", "ERROR"):
+            response = self.get()
+        self.assertEqual(response.status_code, 503)
+
+    def test_year(self):
+        for year in (1899, datetime.date.today().year + 1):
+            with self.subTest(year=year), self.assertRaises(Http404):
+                self.get(year=year)
+        self.parse.assert_not_called()
+
+    def test_report(self):
+        with mock.patch.object(views, "open_report") as open_report, mock.patch.object(
+            views, "iter_report_html", return_value=iter(["<html>"])
+        ):
+            response = self.get()
+        open_report.assert_called_once_with("US-DC-001", 2024, region=REGION)
+        self.assertEqual(b"".join(response.streaming_content), b"<html>")
+
+
+class HeldLock:
+    """A stand-in for the batch's --db-jobs semaphore that records whether it's held."""
+
+    held = False
+
+    def __enter__(self):
+        self.held = True
+
+    def __exit__(self, *exc):
+        self.held = False
+
+
+class BatchRegionTest(SimpleTestCase):
+    """A batch region queries under the --db-jobs semaphore and fetches photos outside it."""
+
+    def run_region(self, artifact):
+        from ebirdcore.management.commands import year_end_report_batch as batch
+
+        self.lock = HeldLock()
+        self.held = {}
+
+        def compute_report(*args, **kwargs):
+            self.held["compute"] = self.lock.held
+            return artifact
+
+        def compute_photos(fetcher):
+            self.held["photos"] = self.lock.held
+
+        artifact.compute_photos.side_effect = compute_photos
+        with tempfile.TemporaryDirectory() as output_dir, mock.patch.object(
+            batch, "_db_semaphore", self.lock
+        ), mock.patch.object(batch, "connection"), mock.patch.object(
+            batch, "call_command"
+        ), mock.patch.object(
+            report_artifact, "compute_report", side_effect=compute_report
+        ) as patched:
+            timings = batch._run_region(REGION, 2024, ["html"], output_dir, None, True, True)
+        self.compute_report = patched
+        return timings
+
+    def test_photos_outside_semaphore(self):
+        artifact = mock.Mock(sections={"media": []})
+        timings = self.run_region(artifact)
+        self.assertIsNone(timings["error"])
+        self.assertEqual(self.held, {"compute": True, "photos": False})
+        self.assertFalse(self.compute_report.call_args.kwargs["with_photos"])
+        artifact.save.assert_called_once()
+
+    def test_failure_logged(self):
+        artifact = mock.Mock(sections={})
+        artifact.save.side_effect = OSError("disk full")
+        with self.assertLogs(
+            "ebirdcore.management.commands.year_end_report_batch", "ERROR"
+        ) as logs:
+            timings = self.run_region(artifact)
+        self.assertEqual(timings["error"], "OSError: disk full")
+        self.assertIn("Traceback", logs.output[0])
+
+
+WOODPECKERS = list(challenges.CHALLENGES["woodpecker_clean_sweep"].taxa.names)
+WARBLERS = ["Ovenbird", "Cerulean Warbler", "Downy Woodpecker"]
+
+
+def counts(species):
+    """The per-challenge counts of a checklist with `species`."""
+    return tuple(
+        sum(1 for s in species if c.taxa.matches(s))
+        for c in challenges.CHALLENGES.values()
+    )
+
+
+class ChallengeTest(SimpleTestCase):
+    """Challenges are scored per observer id; names are only displayed."""
+
+    CHECKLISTS = [
+        ("obsr1", "Pat Smith", "S1", datetime.date(2024, 3, 1), "Park", *counts(WOODPECKERS)),
+        ("obsr2", "Pat Smith", "S2", datetime.date(2024, 4, 1), "Yard", *counts(WOODPECKERS)),
+        ("obsr2", "Pat Smith", "S3", datetime.date(2023, 5, 1), "Yard", *counts(WOODPECKERS)),
+        ("obsr3", "Al Jones", "S4", datetime.date(2024, 2, 1), "Park", *counts(WOODPECKERS[:-1])),
+        ("obsr3", "Al Jones", "S5", datetime.date(2024, 6, 1), "Park", *counts(WARBLERS)),
+    ]
+
+    def table(self, name, year=None):
+        with mock.patch.object(
+            challenges, "checklist_counts", return_value=self.CHECKLISTS
+        ):
+            return challenge_table(name, REGION["where_clause"], "2024-12-31", year=year)
+    def test_all_time_namesakes(self):
+        _, _, _, _, rows = self.table("woodpecker_clean_sweep")
+        self.assertEqual(
+            rows,
+            [
+                ("Pat Smith", 2, datetime.date(2024, 4, 1), f"{challenges.CHECKLIST_URL}S2"),
+                ("Pat Smith", 1, datetime.date(2024, 3, 1), f"{challenges.CHECKLIST_URL}S1"),
+            ],
+        )
+
+    def test_year(self):
+        _, _, _, _, rows = self.table("woodpecker_clean_sweep", year=2024)
+        self.assertEqual([row[3][-2:] for row in rows], ["S1", "S2"])
+
+    def test_most(self):
+        _, _, _, columns, rows = self.table("warbler_single_list", year=2024)
+        self.assertEqual(columns[-1].name, "Warblers")
+        url = f"{challenges.CHECKLIST_URL}S5"
+        self.assertEqual(rows, [("Al Jones", datetime.date(2024, 6, 1), "Park", url, 2)])
+
+    def test_one_query(self):
+        challenges.checklist_counts.cache_clear()
+        self.addCleanup(challenges.checklist_counts.cache_clear)
+        with mock.patch.object(
+            challenges, "execute_query", return_value=(None, self.CHECKLISTS)
+        ) as execute_query:
+            for name in challenges.CHALLENGES:
+                for year in (None, 2024):
+                    challenge_table(name, REGION["where_clause"], "2024-12-31", year=year)
+        execute_query.assert_called_once()
+        sql = execute_query.call_args[0][0]
+        self.assertEqual(
+            sql.count("count(distinct common_name) filter"), len(challenges.CHALLENGES)
+        )
+        self.assertNotIn("array_agg", sql)
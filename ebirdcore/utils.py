@@ -1,8 +1,6 @@
 import pickle, io
 import datetime
 import logging
-import requests
-from bs4 import BeautifulSoup
 from .models import EBird
 from diskcache import Cache, Disk
 
@@ -18,6 +16,9 @@ def get_checklist_url(sampling_event_identifier):
 
 @cache.memoize()
 def get_observer_name(obs_id):
+    import requests
+    from bs4 import BeautifulSoup
+
     # checklist_code = "S69886809"
     logger.warning(f"Finding {obs_id}...")
     e = EBird.objects.filter(observer_id=obs_id).first()
@@ -52,36 +53,68 @@ def add_years(d, years):
         return d + (datetime.date(d.year + years, 1, 1) - datetime.date(d.year, 1, 1))
 
 
-def parse_region_code(region_code):
-    region_code_split = region_code.split("-")
-    if len(region_code_split) == 1:
-        region_where_clause = f"country_code = '{region_code}'"
-        one_record = EBird.objects.filter(country_code=region_code).first()
+REGION_COLUMNS = {"country": "country_code", "state": "state_code", "county": "county_code"}
 
-        region_description = f"{one_record.country}"
 
-    elif len(region_code_split) == 2:
-        region_where_clause = f"state_code = '{region_code}'"
-        one_record = EBird.objects.filter(state_code=region_code).first()
+def _region(code, region_type, country, state, county):
+    if region_type == "country":
+        description = f"{country}"
+    elif region_type == "state":
+        description = f"{state}, {country}"
+    elif county == state:
+        description = f"{county}"
+    else:
+        description = f"{county}, {state}"
+    return {
+        "code": code,
+        "description": description,
+        "where_clause": f"{REGION_COLUMNS[region_type]} = '{code}'",
+    }
 
-        region_description = f"{one_record.state}, {one_record.country}"
 
-    elif len(region_code_split) == 3:
-        region_where_clause = f"county_code = '{region_code}'"
-        one_record = EBird.objects.filter(county_code=region_code).first()
+def _catalog(where, params):
+    """Regions of the `ebird_region` catalog (built by the load scripts)."""
+    from django.db import connection
 
-        region_description = f"{one_record.county}, {one_record.state}"
-        if one_record.county == one_record.state:
-            region_description = f"{one_record.county}"
-    else:
-        raise RuntimeError("unknonw region code type")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+select region_code, region_type, country, state, county
+from ebird_region
+where {where}
+order by region_code
+""",
+            params,
+        )
+        return [_region(*row) for row in cursor.fetchall()]
 
-    return {
-        "code": region_code,
-        "description": region_description,
-        "example_obj": one_record,
-        "where_clause": region_where_clause,
-    }
+
+def parse_region_code(region_code):
+    if len(region_code.split("-")) > 3:
+        raise RuntimeError("unknown region code type")
+
+    regions = _catalog("region_code = %s", [region_code])
+    if not regions:
+        from difflib import get_close_matches
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute("select region_code from ebird_region")
+            codes = [row[0] for row in cursor.fetchall()]
+        message = f"No data for region {region_code}"
+        close = get_close_matches(region_code, codes, n=5)
+        if close:
+            message += f"; did you mean {', '.join(close)}?"
+        raise RuntimeError(message)
+    return regions[0]
+
+
+def get_subregions(parent_code):
+    """Return the region dicts (as `parse_region_code`) of the states of a
+    country, or the counties of a state."""
+    if len(parent_code.split("-")) > 2:
+        raise RuntimeError(f"{parent_code} has no subregions")
+    return _catalog("parent_code = %s", [parent_code])
 
 
 MR_CODES = (
@@ -107,7 +140,8 @@ def get_top_ranked_photo(
     ages=None,
     exclude=None,
 ):
-    import requests, shutil
+    import requests
+    from .media import MediaFetcher
 
     if not ages:
         ages = []
@@ -165,11 +199,9 @@ def get_top_ranked_photo(
     photo_url = photo_data["mediaUrl"]
     common_name = photo_data["commonName"]
     user_display_name = photo_data["userDisplayName"]
-    img_response = requests.get(photo_url, stream=True)
-    img_filename = f"images/top-image-{taxon_code or 'all'}-{region_code}-{year or 'all'}-{sex or 'all'}-{''.join(ages) or 'all'}.jpg"
-    with open(img_filename, "wb") as out_file:
-        shutil.copyfileobj(img_response.raw, out_file)
-    del img_response
+    img_filename = MediaFetcher().fetch(
+        photo_data["assetId"], size="full", url=photo_url
+    )
     if region_description:
         caption = f"{common_name} - The top-rated photo in {region_description} for {year} - ©{year} {user_display_name}"
     else:
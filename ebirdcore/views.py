@@ -1,3 +1,38 @@
-from django.shortcuts import render
+import datetime
+import logging
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import DatabaseError
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+
+from ebirdcore.management.commands.year_end_report_html import iter_report_html
+from ebirdcore.report_artifact import open_report
+from ebirdcore.utils import parse_region_code
+
+logger = logging.getLogger(__name__)
+
+# Reject obviously bad years before touching the database.
+FIRST_YEAR = 1900
+
+
+@staff_member_required
+def report_html(request, region_code, year):
+    """The HTML report (without photos), streamed as each section is computed.
+
+    Staff only: every request runs all of the report's queries. Regions are
+    looked up in the `ebird_region` catalog; without it the view answers 503.
+    """
+    if not FIRST_YEAR <= year <= datetime.date.today().year:
+        raise Http404(f"No report for {year}")
+    try:
+        region = parse_region_code(region_code)
+    except RuntimeError as e:
+        raise Http404(str(e))
+    except DatabaseError:
+        logger.exception("Looking up region %s", region_code)
+        return HttpResponse("The region catalog is unavailable.", status=503)
+    artifact = open_report(region_code, year, region=region)
+    return StreamingHttpResponse(
+        iter_report_html(artifact, release=True),
+        content_type="text/html; charset=utf-8",
+    )
@@ -0,0 +1,354 @@
+"""
+Year-to-date leaderboards, refreshed incrementally after each delta load.
+
+A `YTDState` holds a region's in-process leaderboard data (see
+`ebirdcore.bitmaps`): the (observer, species, year, month) tuples, with and
+without media, and the day lists.  It also holds a watermark, the latest
+`last_edited_date` folded in.  `refresh` reads only the rows edited after the
+watermark (or observed after the state's `as_of`), through the
+`last_edited_date` and region/date indexes, and merges them:
+
+- tuples are added, keeping the earliest first-seen date,
+- the (observer, date) and date totals those rows touch are recounted.
+
+Both merges are idempotent, so rows seen twice do no harm.  Rows whose edit
+takes them out of the lists (eg a record that was marked invalid) and deleted
+rows aren't taken out again; `year_to_date_report` rebuilds the state from
+scratch at the start of each year, or with --rebuild.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+from django.db import connection
+
+from .binary_copy import PG_EPOCH
+from .bitmaps import (
+    DayLists,
+    SpeciesBitmaps,
+    extract_days,
+    extract_species,
+    list_filters,
+)
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+DELTA_TABLE = "_ytd_delta"
+
+# The report sections computed from the state; none of them query `ebird`.
+YTD_SECTIONS = [
+    "most_species_seen",
+    "all_time_bigs",
+    "month_closeouts",
+    "month_life_lists",
+]
+
+SPECIES_FIELDS = ("obs", "sp", "year", "month", "first_seen")
+
+
+def _watermark(region_where_clause):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"select max(last_edited_date) from ebird where {region_where_clause}"
+        )
+        (watermark,) = cursor.fetchone()
+    return watermark.isoformat(sep=" ") if watermark else None
+
+
+def _days(dates):
+    """Dates as days since 2000-01-01."""
+    return (np.array(dates, dtype="datetime64[D]") - PG_EPOCH).astype(np.int64)
+
+
+def _ids(names, new):
+    """The positions of `new` in `names`, appending missing ones to `names`."""
+    index = {name: i for i, name in enumerate(names)}
+    ids = []
+    for name in new:
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+        ids.append(index[name])
+    return np.array(ids, dtype=np.int64)
+
+
+def _rank_observers(observers):
+    """(names, rank by name) of observer ids, as `get_observer_name` sorts them."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+select get_observer_name(id), rank() over (order by get_observer_name(id))
+from unnest(%s::varchar[]) with ordinality as t(id, n)
+order by n
+""",
+            [observers],
+        )
+        rows = cursor.fetchall()
+    return [r[0] for r in rows], np.array([r[1] for r in rows], dtype=np.int64)
+
+
+def _with_observers(obj, observers):
+    """(names, rank) for `observers`, re-querying them only if some are new."""
+    if len(observers) == len(obj.observers):
+        return obj.observer_names, obj.name_rank
+    return _rank_observers(observers)
+
+
+def merge_species(bm, rows):
+    """`bm` with the (observer id, common name, year, month, first seen date)
+    `rows` added."""
+    if not rows:
+        return bm
+    observers, species = list(bm.observers), list(bm.species)
+    new = {
+        "obs": _ids(observers, [r[0] for r in rows]),
+        "sp": _ids(species, [r[1] for r in rows]),
+        "year": np.array([r[2] for r in rows], dtype=np.int64),
+        "month": np.array([r[3] for r in rows], dtype=np.int64),
+        "first_seen": _days([r[4] for r in rows]),
+    }
+    merged = {
+        f: np.concatenate([getattr(bm, f), new[f]]) for f in SPECIES_FIELDS
+    }
+    # Keep the earliest first-seen date of each (observer, species, year, month).
+    order = np.lexsort(
+        tuple(merged[f] for f in reversed(SPECIES_FIELDS))
+    )
+    merged = {f: a[order] for f, a in merged.items()}
+    same = np.ones(len(order) - 1, dtype=bool)
+    for f in SPECIES_FIELDS[:-1]:
+        same &= merged[f][1:] == merged[f][:-1]
+    keep = np.concatenate([[True], ~same])
+    merged = {f: a[keep] for f, a in merged.items()}
+
+    names, name_rank = _with_observers(bm, observers)
+    return SpeciesBitmaps(observers, names, name_rank, species, merged)
+
+
+def merge_days(dl, days, everyone):
+    """`dl` with the recounted (observer id, date, species) `days` and
+    (date, birders, species) `everyone` rows replacing any it had."""
+    if not days and not everyone:
+        return dl
+    observers = list(dl.observers)
+    new_days = np.zeros(len(days), dtype=dl.days.dtype)
+    new_days["obs"] = _ids(observers, [r[0] for r in days])
+    new_days["date"] = _days([r[1] for r in days])
+    new_days["species"] = [r[2] for r in days]
+    new_everyone = np.zeros(len(everyone), dtype=dl.everyone.dtype)
+    new_everyone["date"] = _days([r[0] for r in everyone])
+    new_everyone["birders"] = [r[1] for r in everyone]
+    new_everyone["species"] = [r[2] for r in everyone]
+
+    def day_key(a):
+        return (a["obs"].astype(np.int64) << 32) + a["date"].astype(np.int64)
+
+    old_days = dl.days[~np.isin(day_key(dl.days), day_key(new_days))]
+    old_everyone = dl.everyone[~np.isin(dl.everyone["date"], new_everyone["date"])]
+
+    names, name_rank = _with_observers(dl, observers)
+    return DayLists(
+        observers,
+        names,
+        name_rank,
+        np.concatenate([old_days, new_days]),
+        np.concatenate([old_everyone, new_everyone]),
+    )
+
+
+class YTDState:
+    """A region's leaderboard data up to `as_of`, with edits up to `watermark`."""
+
+    def __init__(self, region_where_clause, year, as_of, watermark, species, media, days):
+        self.region_where_clause = region_where_clause
+        self.year = year
+        self.as_of = as_of
+        self.watermark = watermark
+        self.species = species
+        self.media = media
+        self.days = days
+
+    @classmethod
+    def build(cls, region_where_clause, year, as_of):
+        """Extract everything from scratch."""
+        # Taken first: rows edited while extracting are merged again next time.
+        watermark = _watermark(region_where_clause)
+        with span("ytd.build", cat="query"):
+            return cls(
+                region_where_clause,
+                year,
+                as_of,
+                watermark,
+                extract_species(region_where_clause, as_of, False),
+                extract_species(region_where_clause, as_of, True),
+                extract_days(region_where_clause, as_of),
+            )
+
+    def extractions(self):
+        """The state as `bitmaps.pin` takes it."""
+        return {
+            ("species", False): self.species,
+            ("species", True): self.media,
+            ("days",): self.days,
+        }
+
+    def refresh(self, as_of):
+        """Merge the rows edited after the watermark, or observed after the
+        previous `as_of`, up to `as_of`."""
+        filters = list_filters(self.region_where_clause, as_of)
+        edited = "true" if self.watermark is None else f"last_edited_date > '{self.watermark}'"
+        with span("ytd.refresh", cat="query") as args, connection.cursor() as cursor:
+            cursor.execute(f"drop table if exists {DELTA_TABLE}")
+            # Two selects rather than an "or", so each can use its index.
+            cursor.execute(
+                f"""
+create temp table {DELTA_TABLE} as
+select observer_id, common_name, observation_date, has_media, last_edited_date
+from ebird
+where {filters}
+  and {edited}
+union
+select observer_id, common_name, observation_date, has_media, last_edited_date
+from ebird
+where {filters}
+  and observation_date > '{self.as_of}'
+"""
+            )
+            # The new watermark comes from the delta, not another scan.
+            cursor.execute(f"select max(last_edited_date) from {DELTA_TABLE}")
+            (latest,) = cursor.fetchone()
+            tuples_sql = f"""
+select observer_id, common_name,
+       extract(year from observation_date)::int,
+       extract(month from observation_date)::int,
+       min(observation_date)
+from {DELTA_TABLE}
+where {{}}
+group by 1, 2, 3, 4
+"""
+            cursor.execute(tuples_sql.format("true"))
+            species = cursor.fetchall()
+            cursor.execute(tuples_sql.format("has_media = 't'"))
+            media = cursor.fetchall()
+            cursor.execute(
+                f"""
+select observer_id, observation_date, count(distinct common_name)
+from ebird
+join (select distinct observer_id, observation_date from {DELTA_TABLE}) d
+    using (observer_id, observation_date)
+where {filters}
+group by 1, 2
+"""
+            )
+            days = cursor.fetchall()
+            cursor.execute(
+                f"""
+select observation_date, count(distinct observer_id), count(distinct common_name)
+from ebird
+where {filters}
+  and observation_date in (select distinct observation_date from {DELTA_TABLE})
+group by 1
+"""
+            )
+            everyone = cursor.fetchall()
+            cursor.execute(f"drop table {DELTA_TABLE}")
+            args["rows"] = len(species)
+
+        logger.info(
+            f"Merging {len(species)} list entries and {len(days)} days edited since {self.watermark}"
+        )
+        self.species = merge_species(self.species, species)
+        self.media = merge_species(self.media, media)
+        self.days = merge_days(self.days, days, everyone)
+        self.as_of = as_of
+        if latest is not None:
+            latest = latest.isoformat(sep=" ")
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+        return self
+
+    def save(self, path):
+        meta = {
+            "version": STATE_VERSION,
+            "region_where_clause": self.region_where_clause,
+            "year": self.year,
+            "as_of": self.as_of,
+            "watermark": self.watermark,
+        }
+        arrays = {}
+        for name, bm in (("species", self.species), ("media", self.media)):
+            meta[name] = {
+                "observers": bm.observers,
+                "observer_names": bm.observer_names,
+                "species": bm.species,
+            }
+            arrays[f"{name}.name_rank"] = bm.name_rank
+            for f in SPECIES_FIELDS:
+                arrays[f"{name}.{f}"] = getattr(bm, f).astype(np.int32)
+        meta["days"] = {
+            "observers": self.days.observers,
+            "observer_names": self.days.observer_names,
+        }
+        arrays["days.name_rank"] = self.days.name_rank
+        arrays["days.days"] = self.days.days
+        arrays["days.everyone"] = self.days.everyone
+        with open(path, "wb") as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+        logger.info(f'Saved year-to-date state "{path}"')
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != STATE_VERSION:
+                raise RuntimeError(
+                    f"Year-to-date state version {meta.get('version')} is not {STATE_VERSION}; rebuild it."
+                )
+            bitmaps = {}
+            for name in ("species", "media"):
+                m = meta[name]
+                bitmaps[name] = SpeciesBitmaps(
+                    m["observers"],
+                    m["observer_names"],
+                    data[f"{name}.name_rank"],
+                    m["species"],
+                    {f: data[f"{name}.{f}"] for f in SPECIES_FIELDS},
+                )
+            days = DayLists(
+                meta["days"]["observers"],
+                meta["days"]["observer_names"],
+                data["days.name_rank"],
+                data["days.days"],
+                data["days.everyone"],
+            )
+        return cls(
+            meta["region_where_clause"],
+            meta["year"],
+            meta["as_of"],
+            meta["watermark"],
+            bitmaps["species"],
+            bitmaps["media"],
+            days,
+        )
+
+
+def load_or_refresh(path, region_where_clause, as_of, rebuild=False):
+    """The state at `path` refreshed up to `as_of`, or a new one if there is
+    none, it's for another region or year, or `rebuild`; saved to `path`."""
+    year = int(as_of[:4])
+    state = None
+    if path and os.path.exists(path) and not rebuild:
+        state = YTDState.load(path)
+        if state.region_where_clause != region_where_clause or state.year != year:
+            logger.info(f"{path} is for another region or year, rebuilding it")
+            state = None
+    if state is None:
+        state = YTDState.build(region_where_clause, year, as_of)
+    else:
+        state.refresh(as_of)
+    if path:
+        state.save(path)
+    return state
@@ -16,6 +16,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from ebirdcore import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('report/<str:region_code>/<int:year>/', views.report_html),
 ]